@@ -1,28 +1,48 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 import jieba
 from search.core import SearchEngine
-from search import SpellChecker
-from config.settings import WEB_CONFIG
+from config.settings import WEB_CONFIG, SEARCH_CONFIG
 from utils.language import detect_language
+from utils.metrics import metrics
+from utils.lazy import Components
 import time
 from pathlib import Path
-from chat.rag import conv_manager, get_rag_response
+from chat.rag import conv_manager, get_rag_chain, get_rag_response
 from chat.agent import get_agent_response
-from chat.ReAct.Agent import ReAct, DeepSeekChat
 import uuid
 
-react = ReAct(DeepSeekChat())
-
 app = Flask(__name__,
             template_folder=WEB_CONFIG['template_dir'],
             static_folder=WEB_CONFIG['static_dir'])
 
-# 初始化搜索引擎
-try:
-    search_engine = SearchEngine()
-except Exception as e:
-    print(f"Failed to initialize search engine: {str(e)}")
-    search_engine = None
+
+def _load_jieba():
+    jieba.initialize()
+    return jieba
+
+
+def _load_agent():
+    # ReAct 依赖 torch / transformers，导入较慢
+    from chat.ReAct.Agent import ReAct, DeepSeekChat
+    return ReAct(DeepSeekChat())
+
+
+# 各子系统在首次使用时初始化，并在后台线程中按 WEB_CONFIG['warm_up'] 的顺序预热，
+# 启动后搜索接口无需等待 RAG、Agent 等加载完成
+components = Components()
+components.register('search_engine', SearchEngine)
+components.register('jieba', _load_jieba)
+components.register('agent', _load_agent)
+components.register('rag', get_rag_chain)
+components.warm_up(WEB_CONFIG['warm_up'])
+
+
+def _search_engine():
+    """搜索引擎实例（尚在加载时等待加载完成），初始化失败时返回 None"""
+    try:
+        return components.get('search_engine')
+    except RuntimeError:
+        return None
 
 
 @app.route('/')
@@ -43,6 +63,8 @@ def chat_api():
         return jsonify({'error': 'Message cannot be empty'}), 400
     
     try:
+        components.get('rag')
+
         # Add user message to history
         conv_manager.add_message(session_id, "user", message)
         
@@ -80,7 +102,7 @@ def agent_api():
         history = conv_manager.get_history(session_id)
         
         # Get agent response
-        response = get_agent_response(react, text=message, history=history)
+        response = get_agent_response(components.get('agent'), text=message, history=history)
 
         # Add messages to history
         conv_manager.add_message(session_id, "user", message)
@@ -99,8 +121,32 @@ def agent_api():
         }), 500
 
 
+def _search_body(search_engine, query, results, page, per_page, elapsed_time):
+    """按语言分类并分页，只为当前页的结果生成摘要"""
+    zh_results = [r for r in results if r.get('language') == 'zh']
+    en_results = [r for r in results if r.get('language') != 'zh']
+
+    start_idx = (page - 1) * per_page
+    end_idx = start_idx + per_page
+    return {
+        'query': query,
+        'time': elapsed_time,
+        'results': {
+            'zh': search_engine.add_snippets(zh_results[start_idx:end_idx], query),
+            'en': search_engine.add_snippets(en_results[start_idx:end_idx], query)
+        },
+        'count': len(results),
+        'zh_count': len(zh_results),
+        'en_count': len(en_results),
+        'page': page,
+        'per_page': per_page,
+        'total_pages': max(1, (len(results) + per_page - 1) // per_page)
+    }
+
+
 @app.route('/search')
 def search():
+    search_engine = _search_engine()
     if not search_engine:
         return jsonify({'error': 'Search engine not available'}), 500
 
@@ -111,39 +157,97 @@ def search():
     # 获取分页参数
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 10))
-    
+
+    # debug=timings 时在响应中附带各阶段耗时（毫秒）；检索与摘要使用同一代索引
+    with metrics.trace() as timings, search_engine.snapshot():
+        start_time = time.time()
+        # 可选的语言、主题过滤
+        results = search_engine.search(query, with_snippets=False,
+                                       language=request.args.get('lang') or None,
+                                       category=request.args.get('category') or None)
+
+        body = _search_body(search_engine, query, results, page, per_page, time.time() - start_time)
+        if request.args.get('debug') == 'timings':
+            # 序列化在附带耗时之后进行，其耗时只计入 /metrics
+            body['timings'] = {stage: seconds * 1000 for stage, seconds in timings.items()}
+        with metrics.timer('serialize'):
+            response = jsonify(body)
+    metrics.observe('request', time.time() - start_time)
+    return response
+
+@app.route('/search/batch', methods=['POST'])
+def search_batch():
+    """批量搜索：{"queries": ["q1", {"q": "q2", "lang": "zh", "category": "..."}], "page": 1, "per_page": 10}
+
+    lang / category 可在顶层给出默认值；每条查询的结果与 /search 的响应相同，
+    其中 time 为整批的耗时。
+    """
+    search_engine = _search_engine()
+    if not search_engine:
+        return jsonify({'error': 'Search engine not available'}), 500
+
+    data = request.get_json(silent=True) or {}
+    entries = data.get('queries')
+    if not isinstance(entries, list):
+        return jsonify({'error': 'queries must be a list'}), 400
+    max_queries = SEARCH_CONFIG['batch']['max_queries']
+    if len(entries) > max_queries:
+        return jsonify({'error': f'At most {max_queries} queries per batch'}), 400
+
+    queries = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'q': entry}
+        if not isinstance(entry, dict) or not str(entry.get('q', '')).strip():
+            return jsonify({'error': 'Each query must be a non-empty string or an object with q'}), 400
+        query = {'query': str(entry['q']).strip()}
+        for key, field in (('lang', 'language'), ('category', 'category')):
+            if entry.get(key):
+                query[field] = entry[key]
+        queries.append(query)
+
+    page = int(data.get('page', 1))
+    per_page = int(data.get('per_page', 10))
+
     start_time = time.time()
-    results = search_engine.search(query)
-    elapsed_time = time.time() - start_time
+    with search_engine.snapshot():
+        batch_results = search_engine.search_many(queries, with_snippets=False,
+                                                  language=data.get('lang') or None,
+                                                  category=data.get('category') or None)
+        elapsed_time = time.time() - start_time
 
-    # 按语言分类结果
-    zh_results = [r for r in results if r.get('language') == 'zh']
-    en_results = [r for r in results if r.get('language') != 'zh']
+        bodies = [_search_body(search_engine, query['query'], results, page, per_page, elapsed_time)
+                  for query, results in zip(queries, batch_results)]
+    return jsonify({'results': bodies, 'time': time.time() - start_time})
 
-    # 计算分页
-    start_idx = (page - 1) * per_page
-    end_idx = start_idx + per_page
+@app.route('/metrics')
+def metrics_endpoint():
+    # 搜索引擎尚未加载完成时不等待，只输出已有的指标
+    if not components['search_engine'].loaded:
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
-    return jsonify({
-        'query': query,
-        'time': elapsed_time,
-        'results': {
-            'zh': zh_results[start_idx:end_idx],
-            'en': en_results[start_idx:end_idx]
-        },
-        'count': len(results),
-        'zh_count': len(zh_results),
-        'en_count': len(en_results),
-        'page': page,
-        'per_page': per_page,
-        'total_pages': max(1, (len(results) + per_page - 1) // per_page)
-    })
+    return Response(components.get('search_engine').render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/ready')
+def ready():
+    """就绪检查：搜索引擎加载完成即就绪（HTTP 200，否则 503），附带各组件的加载状态"""
+    is_ready = components['search_engine'].loaded
+    return jsonify({'ready': is_ready, 'components': components.status()}), 200 if is_ready else 503
+
+@app.route('/cache/stats')
+def cache_stats():
+    search_engine = _search_engine()
+    if not search_engine:
+        return jsonify({'error': 'Search engine not available'}), 500
+
+    return jsonify(search_engine.cache_stats())
 
 @app.route('/spellcheck/suggest')
 def spell_suggest():
-    spell_checker = SpellChecker()
+    search_engine = _search_engine()
     if not search_engine:
         return jsonify({'error': 'Search engine not available'}), 500
+    spell_checker = search_engine.spellchecker  # 复用已建好的拼写索引
 
     query = request.args.get('q', '').strip()
     if not query:
@@ -163,10 +267,24 @@ def spell_suggest():
             'suggestions': []
         })
 
+@app.route('/suggest/complete')
+def suggest_complete():
+    """查询补全：以最后一个词为前缀，返回文档频率最高的词项"""
+    search_engine = _search_engine()
+    if not search_engine:
+        return jsonify({'error': 'Search engine not available'}), 500
+
+    query = request.args.get('q', '')
+    limit = int(request.args.get('limit', SEARCH_CONFIG['complete']['limit']))
+    limit = max(1, min(limit, SEARCH_CONFIG['complete']['max_limit']))
+    return jsonify({
+        'query': query,
+        'completions': search_engine.complete(query, limit) if query.strip() else []
+    })
+
 @app.route('/synonyms/suggest')
 def synonym_suggest():
-    from search.synonym_expander import SynonymExpander
-    synonym_expander = SynonymExpander()
+    search_engine = _search_engine()
     if not search_engine:
         return jsonify({'error': 'Search engine not available'}), 500
 
@@ -175,28 +293,9 @@ def synonym_suggest():
         return jsonify({'synonyms': []})
 
     try:
-        # 获取同义词建议
-        language = detect_language(query)
-        if language == 'zh':
-            words = [w for w in jieba.cut(query) if w.strip()]
-        else:
-            words = query.split()
-
-        synonyms = []
-        for word in words:
-            if language == 'zh':
-                word_synonyms = synonym_expander.thesaurus['zh'].get(word, [])[:3]
-            else:
-                word_synonyms = synonym_expander.thesaurus['en'].get(word.lower(), [])[:3]
-            
-            if word_synonyms:
-                synonyms.append({
-                    'word': word,
-                    'synonyms': word_synonyms
-                })
-
+        # 获取同义词建议（复用已编译的同义词词典，多词短语按最长匹配）
         return jsonify({
-            'synonyms': synonyms
+            'synonyms': search_engine.synonym_expander.suggest(query, limit=3)
         })
     except Exception as e:
         return jsonify({
@@ -0,0 +1,9 @@
+"""Benchmark Module
+
+python -m benchmark.run 执行完整的基准测试（run 不在此导入，以免 -m 执行时重复加载）
+"""
+from .corpus import Vocabulary, build_vocabularies, generate_documents, generate_corpus
+from .queries import generate_queries, load_query_log, save_query_log
+
+__all__ = ['Vocabulary', 'build_vocabularies', 'generate_documents', 'generate_corpus',
+           'generate_queries', 'load_query_log', 'save_query_log']
@@ -0,0 +1,198 @@
+import json
+import re
+from pathlib import Path
+import numpy as np
+import jieba
+from config.settings import INDEX_CONFIG, SEARCH_CONFIG, BENCHMARK_CONFIG
+from utils.helpers import load_stopwords
+
+
+# 合成英文词的音节表
+_ONSETS = ['b', 'c', 'd', 'f', 'g', 'h', 'k', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'w', 'z',
+           'br', 'ch', 'cl', 'dr', 'gr', 'pl', 'pr', 'sh', 'st', 'th', 'tr']
+_VOWELS = ['a', 'e', 'i', 'o', 'u', 'ai', 'ea', 'io', 'ou']
+_CODAS = ['', '', 'n', 'r', 's', 't', 'l', 'm', 'x']
+
+# 文档时间戳起点（固定值，保证语料可复现）
+_BASE_TIMESTAMP = 1700000000
+
+# 生成算法的版本，修改生成逻辑时递增，使已生成的语料不再被复用
+CORPUS_VERSION = 1
+
+
+class Vocabulary:
+    """一种语言的合成词表
+
+    词按排名服从 Zipf 分布抽取；排名靠后的词中为每个主题划出一段主题词，文档的
+    一部分词从所属主题中抽取，使同主题的词在文档中共现（AND 查询才有非空交集）。
+    """
+
+    def __init__(self, language, words, stopwords, num_topics, seed, exponent=1.1):
+        self.language = language
+        self.words = words
+        self.stopwords = stopwords
+
+        weights = 1.0 / np.arange(1, len(words) + 1) ** exponent
+        self.cdf = np.cumsum(weights) / weights.sum()
+
+        # 跳过最高频的词，其余随机划分为各主题的词段
+        rng = np.random.default_rng(seed)
+        head = min(100, len(words) // 10)
+        ranks = rng.permutation(np.arange(head, len(words)))
+        per_topic = max(1, min(50, len(ranks) // num_topics))
+        self.topics = [ranks[i * per_topic:(i + 1) * per_topic] for i in range(num_topics)]
+
+    def sample(self, rng, n, topic=None, topic_share=0.0):
+        """按 Zipf 分布抽取 n 个词，其中约 topic_share 比例来自主题 topic"""
+        ranks = np.searchsorted(self.cdf, rng.random(n))
+        if topic is not None and topic_share > 0:
+            topical = rng.random(n) < topic_share
+            topic_ranks = self.topics[topic]
+            ranks[topical] = topic_ranks[rng.integers(0, len(topic_ranks), int(topical.sum()))]
+        return [self.words[r] for r in ranks]
+
+
+def _english_words(vocab_size, stopwords, seed):
+    """拼写词典中的真实词在前，其余由音节随机拼接补足"""
+    words = []
+    with open(SEARCH_CONFIG['spellcheck']['en_dict'], 'r', encoding='utf-8') as f:
+        for line in f:
+            word = line.strip().lower()
+            if word and not word.startswith('#') and re.fullmatch(r'[a-z]{2,}', word):
+                words.append(word)
+
+    rng = np.random.default_rng(seed)
+    seen = set(words) | stopwords
+    words = list(dict.fromkeys(w for w in words if w not in stopwords))
+    while len(words) < vocab_size:
+        word = ''.join(_ONSETS[rng.integers(len(_ONSETS))] + _VOWELS[rng.integers(len(_VOWELS))]
+                       for _ in range(rng.integers(1, 4)))
+        word += _CODAS[rng.integers(len(_CODAS))]
+        if len(word) > 2 and word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words[:vocab_size]
+
+
+def _chinese_words(vocab_size, stopwords):
+    """拼写词典中的词在前，其余取 jieba 词典中按词频排序的 2~4 字词"""
+    words = []
+    with open(SEARCH_CONFIG['spellcheck']['zh_dict'], 'r', encoding='utf-8') as f:
+        for line in f:
+            word = line.strip()
+            if word and not word.startswith('#'):
+                words.append(word)
+
+    entries = []
+    with jieba.get_dict_file() as f:
+        for line in f:
+            parts = line.decode('utf-8').split()
+            if len(parts) >= 2 and re.fullmatch(r'[一-龥]{2,4}', parts[0]):
+                entries.append((-int(parts[1]), parts[0]))
+    entries.sort()
+    words.extend(word for _, word in entries[:vocab_size * 2])
+
+    words = [w for w in dict.fromkeys(words) if w not in stopwords]
+    return words[:vocab_size]
+
+
+def build_vocabularies(seed=None, vocab_size=None, num_topics=None):
+    """按种子构造中英文词表 {language: Vocabulary}，相同参数得到相同词表"""
+    seed = BENCHMARK_CONFIG['seed'] if seed is None else seed
+    vocab_size = vocab_size or BENCHMARK_CONFIG['vocab_size']
+    num_topics = num_topics or BENCHMARK_CONFIG['num_topics']
+
+    stopwords = {lang: load_stopwords(path) for lang, path in INDEX_CONFIG['stopwords'].items()}
+    # 正文中穿插的停用词（取排序后靠前的常见形式，保证可复现）
+    fillers = {
+        'en': sorted(w for w in stopwords['en'] if re.fullmatch(r'[a-z]{2,}', w))[:60],
+        'zh': sorted(w for w in stopwords['zh'] if re.fullmatch(r'[一-龥]{1,2}', w))[:60]
+    }
+
+    return {
+        'en': Vocabulary('en', _english_words(vocab_size, stopwords['en'], seed),
+                         fillers['en'], num_topics, seed),
+        'zh': Vocabulary('zh', _chinese_words(vocab_size, stopwords['zh']),
+                         fillers['zh'], num_topics, seed + 1)
+    }
+
+
+def _make_text(vocab, rng, num_words, topic, topic_share):
+    """按句拼接正文：英文以空格分词、句点结尾，中文直接连写、句号结尾"""
+    words = vocab.sample(rng, num_words, topic, topic_share)
+    if vocab.stopwords:
+        # 约四分之一位置插入停用词
+        for i in np.flatnonzero(rng.random(num_words) < 0.25):
+            words[i] = vocab.stopwords[rng.integers(len(vocab.stopwords))]
+
+    sentences = []
+    start = 0
+    while start < len(words):
+        end = start + int(rng.integers(8, 17))
+        chunk = words[start:end]
+        if vocab.language == 'zh':
+            sentences.append(''.join(chunk) + '。')
+        else:
+            sentences.append(' '.join(chunk).capitalize() + '.')
+        start = end
+    return (' ' if vocab.language == 'en' else '').join(sentences)
+
+
+def generate_documents(num_docs, seed=None, zh_ratio=None, vocabularies=None):
+    """逐个生成合成文档（爬虫原始 JSON 的格式），相同参数得到相同语料"""
+    seed = BENCHMARK_CONFIG['seed'] if seed is None else seed
+    zh_ratio = BENCHMARK_CONFIG['zh_ratio'] if zh_ratio is None else zh_ratio
+    vocabularies = vocabularies or build_vocabularies(seed)
+
+    rng = np.random.default_rng(seed)
+    num_topics = len(vocabularies['en'].topics)
+    for i in range(num_docs):
+        language = 'zh' if rng.random() < zh_ratio else 'en'
+        vocab = vocabularies[language]
+        topic = int(rng.integers(num_topics))
+
+        # 文档长度近似对数正态分布
+        length = int(np.clip(rng.lognormal(4.8, 0.6), 20, 2000))
+        yield {
+            'url': f"https://bench.example.com/{language}/{i}",
+            'title': _make_text(vocab, rng, int(rng.integers(4, 9)), topic, 0.6).rstrip('.。'),
+            'content': _make_text(vocab, rng, length, topic, 0.3),
+            'language': language,
+            'timestamp': _BASE_TIMESTAMP + i
+        }
+
+
+def generate_corpus(output_dir, num_docs, seed=None, zh_ratio=None, vocabularies=None):
+    """将合成文档写为爬虫格式的 JSON 文件，并记录生成参数到 corpus.meta
+
+    已存在参数相同的语料时直接复用。返回文档数。
+    """
+    seed = BENCHMARK_CONFIG['seed'] if seed is None else seed
+    zh_ratio = BENCHMARK_CONFIG['zh_ratio'] if zh_ratio is None else zh_ratio
+    vocabularies = vocabularies or build_vocabularies(seed)
+    output_dir = Path(output_dir)
+    manifest_path = output_dir / 'corpus.meta'  # 不用 .json 后缀，以免被当作文档索引
+    params = {'version': CORPUS_VERSION, 'num_docs': num_docs, 'seed': seed, 'zh_ratio': zh_ratio,
+              'vocab_size': len(vocabularies['en'].words),
+              'num_topics': len(vocabularies['en'].topics)}
+
+    if manifest_path.exists():
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            if json.load(f) == params:
+                return num_docs
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if manifest_path.exists():
+        manifest_path.unlink()
+    for path in output_dir.glob('*.json'):
+        path.unlink()
+
+    for i, document in enumerate(generate_documents(num_docs, seed, zh_ratio, vocabularies)):
+        # 文件名前缀为补零的序号，便于与生成顺序对照
+        with open(output_dir / f"{i:07d}_{document['timestamp']}.json", 'w', encoding='utf-8') as f:
+            json.dump(document, f, ensure_ascii=False)
+
+    # 参数最后写出，中途中断的语料不会被复用
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(params, f)
+    return num_docs
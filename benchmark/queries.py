@@ -0,0 +1,79 @@
+import json
+from pathlib import Path
+import numpy as np
+from config.settings import BENCHMARK_CONFIG
+
+
+def _topic_words(vocab, rng, n):
+    """从同一随机主题中抽取 n 个不同的词"""
+    topic = vocab.topics[rng.integers(len(vocab.topics))]
+    ranks = rng.choice(topic, size=min(n, len(topic)), replace=False)
+    return [vocab.words[r] for r in ranks]
+
+
+def _zipf_word(vocab, rng):
+    return vocab.sample(rng, 1)[0]
+
+
+def _make_query(query_type, vocabularies, rng):
+    language = 'zh' if rng.random() < 0.5 else 'en'
+    vocab = vocabularies[language]
+
+    if query_type == 'term_en':
+        return _zipf_word(vocabularies['en'], rng)
+    if query_type == 'term_zh':
+        return _zipf_word(vocabularies['zh'], rng)
+    if query_type == 'and':
+        a, b = _topic_words(vocab, rng, 2)
+        return f"{a} AND {b}"
+    if query_type == 'or':
+        return f"{_zipf_word(vocab, rng)} OR {_zipf_word(vocab, rng)}"
+    if query_type == 'not':
+        # 主题词排除一个高频词
+        return f"{_topic_words(vocab, rng, 1)[0]} NOT {_zipf_word(vocab, rng)}"
+    if query_type == 'zh_multi':
+        # 多个中文词直接连写，由分词切分后隐式 AND
+        return ''.join(_topic_words(vocabularies['zh'], rng, int(rng.integers(2, 4))))
+    raise ValueError(f"未知的查询类型: {query_type}")
+
+
+def generate_queries(vocabularies, num_queries=None, seed=None, mix=None):
+    """按查询类型占比生成查询集 [{'type', 'query'}]，相同参数得到相同查询
+
+    单词查询按 Zipf 分布抽词（与真实查询日志一样以高频词为主）；AND 与中文多词
+    查询取同一主题的词，保证结果非空。
+    """
+    num_queries = num_queries or BENCHMARK_CONFIG['num_queries']
+    seed = BENCHMARK_CONFIG['seed'] if seed is None else seed
+    mix = mix or BENCHMARK_CONFIG['query_mix']
+
+    rng = np.random.default_rng(seed + 1000)
+    types = list(mix)
+    weights = np.array([mix[t] for t in types], dtype=np.float64)
+    choices = rng.choice(len(types), size=num_queries, p=weights / weights.sum())
+    return [{'type': types[i], 'query': _make_query(types[i], vocabularies, rng)} for i in choices]
+
+
+def load_query_log(path):
+    """读取查询日志：每行一个 JSON 对象 {'query', 'type'}，或一行一条纯文本查询（类型记为 log）"""
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                entry = json.loads(line)
+                queries.append({'type': entry.get('type', 'log'), 'query': entry['query']})
+            else:
+                queries.append({'type': 'log', 'query': line})
+    return queries
+
+
+def save_query_log(queries, path):
+    """将查询集写为 JSON Lines，可用 load_query_log 读回重放"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for entry in queries:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
@@ -0,0 +1,289 @@
+"""可复现的检索基准测试
+
+生成合成中英文语料 -> 用 MultilingualIndexer 建索引 -> 加载 SearchEngine ->
+重放查询集，输出建索引耗时、索引大小、加载耗时、内存与各类查询延迟分位数（JSON）。
+
+    python -m benchmark.run --docs 100000 --output report.json
+    python -m benchmark.run --docs 100000 --query-log queries.jsonl
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+import numpy as np
+from config.settings import BASE_DIR, INDEX_CONFIG, SEARCH_CONFIG, BENCHMARK_CONFIG
+from .corpus import build_vocabularies, generate_corpus
+from .queries import generate_queries, load_query_log, save_query_log
+
+
+def _paths(work_dir):
+    work_dir = Path(work_dir)
+    return {
+        'raw_dir': work_dir / 'raw',
+        'index_dir': work_dir / 'index',
+        'documents_path': work_dir / 'processed' / 'documents.json',
+        'docstore_dir': work_dir / 'processed' / 'docstore'
+    }
+
+
+def _rss_bytes():
+    """当前进程常驻内存（字节），非 Linux 时为 None"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def _peak_rss_bytes():
+    """当前进程的峰值常驻内存（字节），Linux 上 ru_maxrss 以 KB 计"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _dir_size(path):
+    path = Path(path)
+    if path.is_file():
+        return path.stat().st_size
+    if not path.exists():
+        return 0
+    return sum(p.stat().st_size for p in path.rglob('*') if p.is_file())
+
+
+def _postings_bytes(index_dir):
+    """倒排记录文件（不含位置）的实际字节数，以及同样记录按定长 uint32 存放时的字节数"""
+    from indexer.binary_index import (SHARDED_FORMAT_VERSION, POSTINGS_FILE, BLOCK_OFFSETS_FILE,
+                                      BLOCK_WIDTHS_FILE, DOC_IDS_FILE, TFS_FILE, TITLE_TFS_FILE, load_meta)
+
+    meta = load_meta(index_dir)
+    if meta['format'] == SHARDED_FORMAT_VERSION:
+        index_dirs = [Path(index_dir) / name for name in meta['shards']]
+    else:
+        index_dirs = [Path(index_dir)]
+
+    actual = uncompressed = 0
+    for shard_dir in index_dirs:
+        shard_meta = load_meta(shard_dir)
+        streams = 3 if 'title' in shard_meta.get('fields', []) else 2
+        uncompressed += shard_meta['num_postings'] * 4 * streams
+        if shard_meta.get('compression') == 'packed':
+            names = (POSTINGS_FILE, BLOCK_OFFSETS_FILE, BLOCK_WIDTHS_FILE)
+        else:
+            names = (DOC_IDS_FILE, TFS_FILE, TITLE_TFS_FILE)
+        actual += sum(_dir_size(shard_dir / name) for name in names)
+    return actual, uncompressed
+
+
+def _build_index(raw_dir, index_dir, documents_path, docstore_dir, shards, compression):
+    """在独立进程中建索引，返回 (耗时秒数, 峰值内存字节)，避免建索引的内存计入查询进程"""
+    from indexer import MultilingualIndexer
+
+    INDEX_CONFIG['shards'] = shards
+    INDEX_CONFIG['compression'] = compression
+    start = time.perf_counter()
+    # 建索引的进度输出转到标准错误，标准输出只留给报告
+    with contextlib.redirect_stdout(sys.stderr):
+        indexer = MultilingualIndexer(index_dir, documents_path, docstore_dir)
+        indexer.build_from_raw_data(raw_dir)
+    return time.perf_counter() - start, _peak_rss_bytes()
+
+
+def _latency_stats(latencies, hits):
+    latencies = np.asarray(latencies) * 1000
+    return {
+        'count': len(latencies),
+        'mean_ms': float(latencies.mean()),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'max_ms': float(latencies.max()),
+        'avg_hits': float(np.mean(hits))
+    }
+
+
+def _git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR,
+                                capture_output=True, text=True, timeout=10)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def replay(engine, queries, warmup=0, page_size=10):
+    """按 /search 的方式执行查询（检索后只为第一页生成摘要），返回各类型的延迟统计"""
+    from utils.metrics import metrics
+
+    for entry in queries[:warmup]:
+        engine.add_snippets(engine.search(entry['query'], with_snippets=False)[:page_size], entry['query'])
+    metrics.reset()
+
+    by_type = {}
+    start = time.perf_counter()
+    for entry in queries:
+        query_start = time.perf_counter()
+        results = engine.search(entry['query'], with_snippets=False)
+        engine.add_snippets(results[:page_size], entry['query'])
+        latencies, hits = by_type.setdefault(entry['type'], ([], []))
+        latencies.append(time.perf_counter() - query_start)
+        hits.append(len(results))
+    elapsed = time.perf_counter() - start
+
+    all_latencies = [t for latencies, _ in by_type.values() for t in latencies]
+    all_hits = [n for _, hits in by_type.values() for n in hits]
+    return {
+        'total': _latency_stats(all_latencies, all_hits),
+        'qps': len(queries) / elapsed if elapsed else 0.0,
+        'by_type': {t: _latency_stats(*by_type[t]) for t in sorted(by_type)},
+        # 各检索阶段的耗时（来自 utils.metrics，分位数为直方图估计值）
+        'stages_ms': {
+            stage: {k: (v * 1000 if k != 'count' else v) for k, v in stats.items()}
+            for stage, stats in sorted(metrics.snapshot().items())
+        }
+    }
+
+
+def run_benchmark(num_docs=None, num_queries=None, seed=None, zh_ratio=None, work_dir=None,
+                  query_log=None, save_queries=None, warmup=None, shards=None, cache=False,
+                  compression=None):
+    """执行完整的基准测试并返回报告字典
+
+    compression 为倒排存储方式（'packed' 或 'none'），缺省取 INDEX_CONFIG['compression']。
+    """
+    num_docs = num_docs or BENCHMARK_CONFIG['num_docs']
+    num_queries = num_queries or BENCHMARK_CONFIG['num_queries']
+    seed = BENCHMARK_CONFIG['seed'] if seed is None else seed
+    zh_ratio = BENCHMARK_CONFIG['zh_ratio'] if zh_ratio is None else zh_ratio
+    warmup = BENCHMARK_CONFIG['warmup_queries'] if warmup is None else warmup
+    shards = shards or INDEX_CONFIG['shards']
+    compression = compression or INDEX_CONFIG['compression'] or 'none'
+    paths = _paths(work_dir or BENCHMARK_CONFIG['work_dir'])
+
+    # 1. 合成语料（参数相同时复用已生成的语料）
+    start = time.perf_counter()
+    vocabularies = build_vocabularies(seed)
+    generate_corpus(paths['raw_dir'], num_docs, seed, zh_ratio, vocabularies)
+    corpus_seconds = time.perf_counter() - start
+
+    # 2. 建索引（独立进程，单独统计峰值内存）
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+        build_seconds, build_peak = pool.submit(
+            _build_index, str(paths['raw_dir']), str(paths['index_dir']),
+            str(paths['documents_path']), str(paths['docstore_dir']), shards,
+            None if compression == 'none' else compression).result()
+
+    # 3. 加载
+    from search.core import SearchEngine
+    from search.cache import QueryCache
+
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    engine = SearchEngine(paths['index_dir'], paths['documents_path'], paths['docstore_dir'])
+    load_seconds = time.perf_counter() - start
+    rss_loaded = _rss_bytes()
+    if not cache:
+        # 默认关闭结果缓存，测量的是每条查询的实际检索耗时
+        engine.cache = QueryCache(max_entries=0)
+
+    # 4. 重放查询
+    if query_log:
+        queries = load_query_log(query_log)
+    else:
+        queries = generate_queries(vocabularies, num_queries, seed)
+    if save_queries:
+        save_query_log(queries, save_queries)
+
+    try:
+        query_report = replay(engine, queries, warmup)
+    finally:
+        engine.close()
+
+    # 只统计当前一代（目录中还保留着上一代）
+    from indexer.generations import resolve_generation
+    _, index_dir, docstore_dir = resolve_generation(paths['index_dir'], paths['docstore_dir'])
+    index_bytes = _dir_size(index_dir)
+    docstore_bytes = _dir_size(docstore_dir)
+    postings_bytes, uncompressed_postings_bytes = _postings_bytes(index_dir)
+    documents_bytes = _dir_size(paths['documents_path'])
+    return {
+        'params': {
+            'num_docs': num_docs,
+            'num_queries': len(queries),
+            'query_log': str(query_log) if query_log else None,
+            'seed': seed,
+            'zh_ratio': zh_ratio,
+            'warmup_queries': warmup,
+            'shards': shards,
+            'cache': cache,
+            'compression': compression,
+            'positions': INDEX_CONFIG['positions'],
+            'top_k_pruning': SEARCH_CONFIG['top_k_pruning'],
+            'bm25f': SEARCH_CONFIG['bm25f']['enabled']
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'git_commit': _git_commit()
+        },
+        'corpus': {'seconds': corpus_seconds},
+        'build': {'seconds': build_seconds, 'peak_rss_bytes': build_peak},
+        'index_size': {
+            'index_bytes': index_bytes,
+            'postings_bytes': postings_bytes,
+            'uncompressed_postings_bytes': uncompressed_postings_bytes,
+            'postings_ratio': postings_bytes / uncompressed_postings_bytes if uncompressed_postings_bytes else None,
+            'docstore_bytes': docstore_bytes,
+            'documents_json_bytes': documents_bytes,
+            'total_bytes': index_bytes + docstore_bytes + documents_bytes
+        },
+        'load': {
+            'seconds': load_seconds,
+            'rss_bytes': rss_loaded,
+            'rss_delta_bytes': rss_loaded - rss_before if rss_before is not None else None
+        },
+        'queries': query_report,
+        'memory': {'rss_bytes': _rss_bytes(), 'peak_rss_bytes': _peak_rss_bytes()}
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='检索基准测试：合成语料、建索引并重放查询，输出 JSON 报告')
+    parser.add_argument('--docs', type=int, default=BENCHMARK_CONFIG['num_docs'], help='合成文档数')
+    parser.add_argument('--queries', type=int, default=BENCHMARK_CONFIG['num_queries'], help='生成的查询数')
+    parser.add_argument('--seed', type=int, default=BENCHMARK_CONFIG['seed'], help='随机种子')
+    parser.add_argument('--zh-ratio', type=float, default=BENCHMARK_CONFIG['zh_ratio'], help='中文文档占比')
+    parser.add_argument('--work-dir', default=str(BENCHMARK_CONFIG['work_dir']), help='语料与索引目录')
+    parser.add_argument('--query-log', help='重放的查询日志（JSON Lines 或每行一条查询）')
+    parser.add_argument('--save-queries', help='将本次使用的查询集保存为 JSON Lines')
+    parser.add_argument('--warmup', type=int, default=BENCHMARK_CONFIG['warmup_queries'], help='预热查询数')
+    parser.add_argument('--shards', type=int, default=INDEX_CONFIG['shards'], help='索引分片数')
+    parser.add_argument('--cache', action='store_true', help='开启查询结果缓存')
+    parser.add_argument('--compression', choices=['packed', 'none'], help='倒排存储方式（缺省取配置）')
+    parser.add_argument('--output', help='报告输出路径，缺省时打印到标准输出')
+    args = parser.parse_args(argv)
+
+    # 运行过程中的输出转到标准错误，标准输出只留给报告
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmark(args.docs, args.queries, args.seed, args.zh_ratio, args.work_dir,
+                               args.query_log, args.save_queries, args.warmup, args.shards, args.cache,
+                               args.compression)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n', encoding='utf-8')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
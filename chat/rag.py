@@ -1,13 +1,6 @@
-import json
 import os
-from langchain import hub
-from langchain_chroma import Chroma
-from langchain_openai import ChatOpenAI
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_core.documents import Document
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
+import threading
+from indexer.docstore import open_docstore
 
 
 class ConversationManager:
@@ -25,67 +18,28 @@ class ConversationManager:
 conv_manager = ConversationManager()
 
 
-with open('data/processed/documents.json', 'r', encoding='utf-8') as f:
-    data = json.load(f)
+def load_documents():
+    """从与搜索共用的文档存储逐篇读取文档（附带元数据）"""
+    from langchain_core.documents import Document
+
+    for id, doc in open_docstore().items():
+        yield Document(
+            page_content=doc['content'],
+            metadata={
+                'id': str(id),
+                'title': doc.get('title', ''),
+                'url': doc.get('url', ''),
+                'language': doc.get('language', ''),
+                "topic_name": doc.get('topic_name', ''),
+            }
+        )
 
-# Prepare documents with metadata
-documents = []
-for id, doc in data.items():
-    documents.append(Document(
-        page_content=doc['content'],
-        metadata={
-            'id': id,
-            'title': doc.get('title', ''),
-            'url': doc.get('url', ''),
-            'language': doc.get('language', ''),
-            "topic_name": doc.get('topic_name', ''),
-        }
-    ))
 
 # Configure local model path
 model_name = "all-MiniLM-L6-v2"
 model_path = os.path.join("models", model_name)
-
-# Load or download model
-if not os.path.exists(model_path):
-    os.makedirs("models", exist_ok=True)
-    # Download and save model
-    embeddings = HuggingFaceEmbeddings(model_name=model_name)
-    embeddings.client.save(model_path)
-else:
-    # Load from local
-    embeddings = HuggingFaceEmbeddings(model_name=model_path)
-
-# Check if vectorstore exists
 vectorstore_path = "data/vectorstore"
-if os.path.exists(vectorstore_path):
-    # Load existing vectorstore
-    vectorstore = Chroma(
-        persist_directory=vectorstore_path,
-        embedding_function=embeddings
-    )
-else:
-    # Create new vectorstore
-    vectorstore = Chroma.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        persist_directory=vectorstore_path
-    )
-
-retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 10})
 
-
-api_key = os.environ["DEEPSEEK_API_KEY"]
-
-llm = ChatOpenAI(
-    model="deepseek-chat",
-    temperature=1,
-    max_tokens=None,
-    timeout=None,
-    max_retries=3,
-    api_key=api_key,
-    base_url="https://api.deepseek.com",
-)
 system_prompt = (
     "You are an assistant for question-answering tasks. "
     "Use the following pieces of retrieved context to answer "
@@ -99,22 +53,83 @@ system_prompt = (
     "{context}"
 )
 
-prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", system_prompt),
-        *[("human" if msg["role"] == "user" else "ai", msg["content"]) 
-          for msg in []],  # Placeholder for history
-        ("human", "{input}"),
-    ]
-)
+# 嵌入模型、向量库与 LLM 加载较慢，首次使用时才构建 RAG 链
+_rag_chain = None
+_rag_lock = threading.Lock()
+
+
+def get_rag_chain():
+    """返回 RAG 链，首次调用时加载嵌入模型、向量库与 LLM（线程安全，只构建一次）"""
+    global _rag_chain
+    with _rag_lock:
+        if _rag_chain is None:
+            _rag_chain = _build_rag_chain()
+    return _rag_chain
+
+
+def _build_rag_chain():
+    from langchain_chroma import Chroma
+    from langchain_openai import ChatOpenAI
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from langchain.chains import create_retrieval_chain
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain_core.prompts import ChatPromptTemplate
+
+    # Load or download model
+    if not os.path.exists(model_path):
+        os.makedirs("models", exist_ok=True)
+        # Download and save model
+        embeddings = HuggingFaceEmbeddings(model_name=model_name)
+        embeddings.client.save(model_path)
+    else:
+        # Load from local
+        embeddings = HuggingFaceEmbeddings(model_name=model_path)
+
+    # Check if vectorstore exists
+    if os.path.exists(vectorstore_path):
+        # Load existing vectorstore
+        vectorstore = Chroma(
+            persist_directory=vectorstore_path,
+            embedding_function=embeddings
+        )
+    else:
+        # Create new vectorstore
+        vectorstore = Chroma.from_documents(
+            documents=list(load_documents()),
+            embedding=embeddings,
+            persist_directory=vectorstore_path
+        )
+
+    retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 10})
+
+    api_key = os.environ["DEEPSEEK_API_KEY"]
+
+    llm = ChatOpenAI(
+        model="deepseek-chat",
+        temperature=1,
+        max_tokens=None,
+        timeout=None,
+        max_retries=3,
+        api_key=api_key,
+        base_url="https://api.deepseek.com",
+    )
+
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", system_prompt),
+            *[("human" if msg["role"] == "user" else "ai", msg["content"])
+              for msg in []],  # Placeholder for history
+            ("human", "{input}"),
+        ]
+    )
 
+    question_answer_chain = create_stuff_documents_chain(llm, prompt)
+    return create_retrieval_chain(retriever, question_answer_chain)
 
-question_answer_chain = create_stuff_documents_chain(llm, prompt)
-rag_chain = create_retrieval_chain(retriever, question_answer_chain)
 
 def get_rag_response(session_id, message):
     history = conv_manager.get_history(session_id)
-    response = rag_chain.invoke({
+    response = get_rag_chain().invoke({
         "input": message,
         "history": "\n".join(
             f"{msg['role']}: {msg['content']}" 
@@ -31,6 +31,43 @@ CRAWLER_CONFIG = {
 INDEX_CONFIG = {
     'index_dir': BASE_DIR / 'data/index',
     'documents_path': BASE_DIR / 'data/processed/documents.json',
+    # 按需解压的文档存储：每块压缩的文档数与解压块的 LRU 缓存容量
+    'docstore': {
+        'dir': BASE_DIR / 'data/processed/docstore',
+        'block_size': 16,
+        'cache_blocks': 256,
+        # 为这些字段的每个取值预建文档位图，用于按语言/主题过滤
+        'facets': ['language', 'topic_name']
+    },
+    # 按文档ID划分的分片数，大于 1 时查询并发分发到各分片
+    'shards': 1,
+    # 每次重建写入新的一代目录（gen_xxxxxx）后原子切换清单；保留最新的几代，
+    # 上一代须保留到查询进程排空为止
+    'keep_generations': 2,
+    # 构建索引的进程数，大于 1 时按文件分段并行分词建索引后归并（结果与串行相同）
+    'build_workers': 1,
+    # 外存（SPIMI）构建的内存预算（字节）：内存中的倒排达到预算时排序写成磁盘上的 run，文档记录
+    # 逐篇写出，最后流式归并各 run；为 None 时在内存中建完整个索引后一次写出
+    'memory_budget': None,
+    # 增量索引（MultilingualIndexer.add_documents）：每批新文档写成一个不可变的段，查询时合并各段统计量；
+    # 后台按分层策略合并段：文档数同在一层（min_docs * merge_factor^t 到 ^(t+1)，不足 min_docs 的都在
+    # 最底层）的相邻段达到 merge_factor 个时合并为一段，合并结果超过 max_merged_docs 的不再合并
+    'segments': {
+        'merge_factor': 4,
+        'min_docs': 1000,
+        'max_merged_docs': 5000000,
+        'background_merge': True
+    },
+    # 倒排记录的存储方式：'packed' 按 128 条一块做差分位压缩（块可单独解码），
+    # None 为定长 uint32 数组
+    'compression': 'packed',
+    # 压缩格式下缓存的已解码倒排条数（按词项 LRU）
+    'postings_cache': 256,
+    # 是否写入词位置（短语与 NEAR/k 查询需要；关闭时二者退化为 AND）
+    'positions': True,
+    # 是否为每个同义词组（SEARCH_CONFIG['synonyms'] 的词典）写入合并的倒排；同义词词典变化后
+    # 须重建（MultilingualIndexer.rebuild_from_documents），否则查询时不使用组倒排
+    'synonym_groups': False,
     'stopwords': {
         'en': BASE_DIR / 'config/stopwords/en_stopwords.txt',
         'zh': BASE_DIR / 'config/stopwords/zh_stopwords.txt'
@@ -40,15 +77,47 @@ INDEX_CONFIG = {
 # 搜索配置
 SEARCH_CONFIG = {
     'spellcheck': {
+        # 词典每行一个词，可在词后以空白分隔给出词频（用于同距离候选的排序）
         'en_dict': BASE_DIR / 'config/spellcheck/en_dict.txt',
-        'zh_dict': BASE_DIR / 'config/spellcheck/zh_dict.txt'
+        'zh_dict': BASE_DIR / 'config/spellcheck/zh_dict.txt',
+        # 英文建议的对称删除索引：最大编辑距离与参与删除的前缀长度
+        'max_distance': 2,
+        'prefix_length': 7,
+        # 中文近音词最多允许的不同音节数（同时不超过词长的一半）
+        'max_syllable_mismatches': 2,
+        # 预建索引的磁盘缓存目录，词典不变时直接读取；为 None 时不缓存
+        'cache_dir': BASE_DIR / 'data/spellcheck'
     },
     'synonyms': {
         'en': BASE_DIR / 'config/synonyms/en_thesaurus.txt',
-        'zh': BASE_DIR / 'config/synonyms/zh_thesaurus.txt'
+        'zh': BASE_DIR / 'config/synonyms/zh_thesaurus.txt',
+        # 同义词扩展结果的 LRU 缓存容量（按查询）
+        'cache_size': 1024
     },
     'default_results': 100,
-    'max_snippet_length': 200
+    'max_snippet_length': 200,
+    'bm25': {'k1': 1.5, 'b': 0.75},
+    # BM25F：标题与正文分字段归一化后按权重合并词频（需按字段建立的索引）；
+    # 开启后不使用块最大得分剪枝
+    'bm25f': {
+        'enabled': False,
+        'weights': {'title': 2.0, 'content': 1.0},
+        'b': {'title': 0.5, 'content': 0.75}
+    },
+    # 只取前 top_n 时使用块最大得分剪枝跳过不可能进入结果的倒排块（结果与完整排序相同）；
+    # 默认的 NumPy 批量计分在当前语料规模下更快
+    'top_k_pruning': False,
+    # 检索分片索引的工作进程数，None 表示每个分片一个进程
+    'shard_workers': None,
+    # 查询结果缓存：最多缓存的查询数与过期秒数，索引代号变化时自动失效
+    'cache': {'max_entries': 1024, 'ttl': 300},
+    # 批量检索：executor 为 None（当前线程）、'thread' 或 'process'（分片索引总是使用
+    # 分片的进程池），workers 为空时取 CPU 核数；max_queries 为单个批量请求的查询数上限
+    'batch': {'executor': None, 'workers': None, 'max_queries': 1000},
+    # 查询补全：默认与最多返回的补全数
+    'complete': {'limit': 8, 'max_limit': 50},
+    # 热加载：每隔 interval 秒检查索引清单，发现新一代时在后台加载并切换；为 0 时不检查
+    'reload': {'interval': 5}
 }
 
 # Web配置
@@ -57,5 +126,28 @@ WEB_CONFIG = {
     'port': 5000,
     'debug': True,
     'template_dir': BASE_DIR / 'templates',
-    'static_dir': BASE_DIR / 'static'
-}
\ No newline at end of file
+    'static_dir': BASE_DIR / 'static',
+    # 启动后在后台依次预热的组件（其余组件在首次使用时加载）
+    'warm_up': ['search_engine', 'jieba', 'agent', 'rag']
+}
+# 基准测试配置：合成语料规模、查询数与随机种子（相同种子生成相同的语料与查询）
+BENCHMARK_CONFIG = {
+    'work_dir': BASE_DIR / 'data/benchmark',
+    'num_docs': 10000,
+    'num_queries': 2000,
+    'warmup_queries': 100,
+    'seed': 42,
+    # 中文文档占比、每种语言的词表大小与主题数
+    'zh_ratio': 0.5,
+    'vocab_size': 20000,
+    'num_topics': 50,
+    # 查询类型及其在查询集中的占比
+    'query_mix': {
+        'term_en': 0.2,
+        'term_zh': 0.2,
+        'and': 0.2,
+        'or': 0.15,
+        'not': 0.1,
+        'zh_multi': 0.15
+    }
+}
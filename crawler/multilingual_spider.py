@@ -16,8 +16,7 @@ class MultilingualSpider(BaseSpider):
         for lang, urls in CRAWLER_CONFIG['seed_urls'].items():
             self.urls_to_visit.update(urls)
 
-        # 初始化中文分词器
-        jieba.initialize()
+        # 自定义词（jieba 在首次使用时加载词典）
         for keyword in ['人工智能', '机器学习', '深度学习']:
             jieba.add_word(keyword)
 
@@ -1,4 +1,13 @@
 """Indexing Module"""
 from .multilingual_indexer import MultilingualIndexer
+from .binary_index import IndexReader, IndexWriter, TermDictionary, write_index, convert_legacy_index
+from .docstore import (DocStore, DocStoreWriter, build_docstore, extend_docstore, open_docstore, close_docstore,
+                       load_saved_documents)
+from .generations import current_generation, resolve_generation, publish_generation, prune_generations
+from .segments import SegmentedIndex, open_index, current_segments, merge_segments, plan_merge
 
-__all__ = ['MultilingualIndexer']
\ No newline at end of file
+__all__ = ['MultilingualIndexer', 'IndexReader', 'IndexWriter', 'write_index', 'convert_legacy_index',
+           'DocStore', 'DocStoreWriter', 'build_docstore', 'extend_docstore', 'open_docstore', 'close_docstore',
+           'load_saved_documents',
+           'current_generation', 'resolve_generation', 'publish_generation', 'prune_generations',
+           'SegmentedIndex', 'open_index', 'current_segments', 'merge_segments', 'plan_merge']
\ No newline at end of file
@@ -0,0 +1,878 @@
+import json
+import mmap
+import shutil
+from array import array
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+from config.settings import INDEX_CONFIG, SEARCH_CONFIG
+
+
+FORMAT_VERSION = 'binary-v1'
+SHARDED_FORMAT_VERSION = 'sharded-v1'  # 顶层 meta.json 只记录全局统计量与分片目录
+BLOCK_SIZE = 128  # 每个倒排块的记录数，块内保存最大词频等剪枝信息
+PACK_CHUNK_BLOCKS = 64  # 位压缩每批处理的块数
+
+# 索引目录中的文件
+LEXICON_FILE = 'lexicon.bin'            # 按字典序拼接的 UTF-8 词项
+TERM_OFFSETS_FILE = 'term_offsets.bin'  # uint64，词项 i 在 lexicon 中的字节区间
+POST_OFFSETS_FILE = 'post_offsets.bin'  # uint64，词项 i 的倒排记录区间
+TERM_DFS_FILE = 'term_dfs.bin'          # uint32，按词项编号索引的（全局）文档频率，供前缀补全排序
+DOC_IDS_FILE = 'doc_ids.bin'            # uint32，连续存放的文档ID（未压缩格式）
+TFS_FILE = 'tfs.bin'                    # uint32，与 doc_ids 一一对应的词频（未压缩格式）
+POSTINGS_FILE = 'postings.bin'          # 压缩格式：按块位压缩的文档ID差分、词频与标题词频
+BLOCK_OFFSETS_FILE = 'block_offsets.bin'  # uint64，第 i 块在 postings 中的起始字节（末尾多一项）
+BLOCK_WIDTHS_FILE = 'block_widths.bin'  # uint8，每块各数据流的位宽
+DOC_LENGTHS_FILE = 'doc_lengths.bin'    # uint32，按整数文档ID索引的文档长度
+TERM_BLOCKS_FILE = 'term_blocks.bin'    # uint64，词项 i 的倒排块区间
+BLOCK_LAST_DOC_FILE = 'block_last_doc.bin'  # uint32，每块最后一个文档ID
+BLOCK_MAX_TF_FILE = 'block_max_tf.bin'      # uint32，每块最大词频
+BLOCK_MIN_LEN_FILE = 'block_min_len.bin'    # uint32，每块最短文档长度
+BLOCK_MAX_SCORE_FILE = 'block_max_score.bin'  # float32，每块按建索引时 BM25 参数算出的最大词项得分（不含IDF）
+IDF_FILE = 'idf.bin'                    # float32，按词项编号索引的 IDF
+NORMS_FILE = 'norms.bin'                # float32，按文档ID索引的 k1 * (1 - b + b * len / avgdl)
+POSITIONS_FILE = 'positions.bin'        # 可选，每条倒排记录的词位置（差分后按 varint 编码）
+POS_OFFSETS_FILE = 'pos_offsets.bin'    # uint64，第 i 条倒排记录在 positions 中的字节区间
+TITLE_TFS_FILE = 'title_tfs.bin'        # 可选，uint32，与 doc_ids 一一对应的标题字段词频（正文词频 = tfs - title_tfs；未压缩格式）
+TITLE_LENGTHS_FILE = 'title_lengths.bin'  # uint32，按文档ID索引的标题长度
+META_FILE = 'meta.json'
+LEGACY_INDEX_FILE = 'inverted_index.json'
+
+
+def bm25_idf(df, total_docs):
+    """BM25 的 IDF，df 可为标量或数组"""
+    return np.log((total_docs - df + 0.5) / (df + 0.5)) + 1.0
+
+
+def bm25_norms(doc_lengths, avg_doc_length, k1, b):
+    """BM25 的文档长度归一化项 k1 * (1 - b + b * len / avgdl)"""
+    return k1 * (1 - b + b * np.asarray(doc_lengths, dtype=np.float64) / max(avg_doc_length, 1e-9))
+
+
+def encode_varints(values):
+    """把非负整数数组编码为 varint 字节串（每字节低 7 位存数据，最高位表示后续还有字节）"""
+    values = np.asarray(values, dtype=np.uint64)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += values >= (1 << (7 * k))
+
+    starts = np.concatenate(([0], np.cumsum(nbytes)[:-1]))
+    out = np.zeros(int(nbytes.sum()), dtype=np.uint8)
+    for k in range(int(nbytes.max(initial=0))):
+        has = nbytes > k
+        byte = (values[has] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        more = np.where(nbytes[has] > k + 1, 0x80, 0)
+        out[starts[has] + k] = byte.astype(np.uint8) | more.astype(np.uint8)
+    return out
+
+
+def decode_varints(data):
+    """解码 varint 字节数组，返回 int64 数组"""
+    data = np.asarray(data, dtype=np.uint8)
+    if len(data) == 0:
+        return np.empty(0, dtype=np.int64)
+    last = (data & 0x80) == 0
+    value_ids = np.concatenate(([0], np.cumsum(last)[:-1]))
+    value_starts = np.flatnonzero(np.concatenate(([True], last[:-1])))
+    shifts = 7 * (np.arange(len(data)) - value_starts[value_ids])
+    parts = (data & 0x7f).astype(np.int64) << shifts
+    return np.bincount(value_ids, weights=parts).astype(np.int64)
+
+
+def _block_layout(count, widths):
+    """按块位压缩的布局
+
+    count 条记录按 BLOCK_SIZE 分块，widths 为 (块数, 数据流数) 的位宽。块内依次存放
+    各数据流，每段按字节对齐。返回 (每条记录各数据流的起始位, 对应位宽, 总字节数)，
+    前两者均为 (记录数, 数据流数)。
+    """
+    num_blocks = len(widths)
+    sizes = np.full(num_blocks, BLOCK_SIZE, dtype=np.int64)
+    sizes[-1] = count - (num_blocks - 1) * BLOCK_SIZE
+    segment_bytes = (sizes[:, None] * widths + 7) // 8
+    ends = np.cumsum(segment_bytes.ravel())
+    segment_starts = (ends - segment_bytes.ravel()).reshape(widths.shape)
+
+    if num_blocks == 1:
+        value_widths = np.broadcast_to(widths, (count, widths.shape[1]))
+        local = np.arange(count)
+        starts = segment_starts
+    else:
+        value_widths = np.repeat(widths, sizes, axis=0)
+        local = np.tile(np.arange(BLOCK_SIZE), num_blocks)[:count]
+        starts = np.repeat(segment_starts, sizes, axis=0)
+    return starts * 8 + local[:, None] * value_widths, value_widths, int(ends[-1])
+
+
+def pack_blocks(streams):
+    """把若干等长的非负整数数据流按 BLOCK_SIZE 分块位压缩
+
+    每块每个数据流的位宽取块内最大值所需的位数（至多 32 位）。块按字节对齐，
+    每次只处理 PACK_CHUNK_BLOCKS 块，长倒排的中间数组大小有上界。
+    返回 (字节数组, 各块字节数, 位宽 (块数, 数据流数) uint8)。
+    """
+    streams = [np.asarray(v) for v in streams]
+    count = len(streams[0]) if streams else 0
+    if count == 0:
+        return np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.int64), np.empty((0, len(streams)), dtype=np.uint8)
+
+    step = PACK_CHUNK_BLOCKS * BLOCK_SIZE
+    chunks = [_pack_chunk([v[start:start + step] for v in streams]) for start in range(0, count, step)]
+    if len(chunks) == 1:
+        return chunks[0]
+    data, block_bytes, widths = zip(*chunks)
+    return np.concatenate(data), np.concatenate(block_bytes), np.concatenate(widths)
+
+
+def _pack_chunk(streams):
+    """对连续若干块做位压缩，返回值同 pack_blocks"""
+    values = np.stack([v.astype(np.int64) for v in streams], axis=1)
+    count = len(values)
+
+    block_max = np.maximum.reduceat(values, np.arange(0, count, BLOCK_SIZE), axis=0)
+    widths = np.frexp(block_max.astype(np.float64))[1].astype(np.int64)  # 二进制位数，0 为 0 位
+    offsets, value_widths, total = _block_layout(count, widths)
+
+    ks = np.arange(int(widths.max()))
+    used = ks < value_widths[:, :, None]
+    bits = np.zeros(total * 8, dtype=np.uint8)
+    bits[(offsets[:, :, None] + ks)[used]] = ((values[:, :, None] >> ks) & 1)[used]
+
+    block_starts = (offsets[::BLOCK_SIZE, 0] // 8).tolist() + [total]
+    return np.packbits(bits, bitorder='little'), np.diff(block_starts), widths.astype(np.uint8)
+
+
+def unpack_blocks(data, count, widths):
+    """pack_blocks 的逆运算：data 为若干连续块的字节，count 为其中的记录数
+
+    返回 (记录数, 数据流数) 的 int64 数组。数据按小端 32 位字读出，每个值（至多 32 位）
+    落在相邻两个字内，拼成 64 位后右移、掩码得到，整批一次完成。
+    """
+    widths = np.asarray(widths, dtype=np.int64)
+    if count == 0:
+        return np.empty((0, widths.shape[1]), dtype=np.int64)
+
+    offsets, value_widths, _ = _block_layout(count, widths)
+    padded = np.zeros((len(data) + 11) // 4 * 4, dtype=np.uint8)
+    padded[:len(data)] = data
+    words = padded.view('<u4').astype(np.int64)
+    index = offsets >> 5
+    value = words[index] | (words[index + 1] << 32)
+    return (value >> (offsets & 31)) & ((np.int64(1) << value_widths) - 1)
+
+
+def _open_array(path, dtype):
+    """以只读方式内存映射一个定长数组文件
+
+    返回普通 ndarray 视图（仍由 mmap 支撑），避免 np.memmap 子类在切片时的额外开销。
+    """
+    if Path(path).stat().st_size == 0:
+        return np.empty(0, dtype=dtype)
+    return np.asarray(np.memmap(path, dtype=dtype, mode='r'))
+
+
+class IndexWriter:
+    """二进制倒排索引写入器，词项须按字典序依次写入
+
+    doc_lengths 为按整数文档ID索引的文档长度数组，用于计算块级剪枝信息。
+    positions 为真时额外写入位置信息，add_term 须同时给出每条记录的词位置；
+    给出 title_lengths（按文档ID索引的标题长度）时按字段写入标题词频，供 BM25F 使用。
+    写分片时 avg_doc_length、total_docs、avg_title_length 与 add_term 的 df 均传入全局值，
+    doc_base 为分片内文档ID 0 对应的全局文档ID。generation 为空时按目录中已有索引的代号递增。
+    synonyms 为写入了同义词组词项时所用同义词词典的摘要，记入 meta 供查询时核对。
+    倒排存储方式取 INDEX_CONFIG['compression']：'packed' 按块位压缩，None 为定长 uint32 数组。
+    """
+
+    def __init__(self, index_dir, doc_lengths, avg_doc_length, total_docs, positions=False,
+                 title_lengths=None, avg_title_length=None, doc_base=0, generation=None, synonyms=None):
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.uint32)
+        self.avg_doc_length = avg_doc_length
+        self.total_docs = total_docs
+
+        # 精确块上界按当前配置的 BM25 参数预先计算
+        self.k1 = SEARCH_CONFIG['bm25']['k1']
+        self.b = SEARCH_CONFIG['bm25']['b']
+        self._norms = bm25_norms(self.doc_lengths, avg_doc_length, self.k1, self.b)
+
+        self.compression = INDEX_CONFIG['compression']
+        if self.compression not in (None, 'packed'):
+            raise ValueError(f"未知的倒排压缩方式: {self.compression!r}")
+
+        self._lexicon = open(self.index_dir / LEXICON_FILE, 'wb')
+        if self.compression == 'packed':
+            self._postings = open(self.index_dir / POSTINGS_FILE, 'wb')
+            self._block_widths = open(self.index_dir / BLOCK_WIDTHS_FILE, 'wb')
+            self._block_offsets = array('Q', [0])
+        else:
+            self._doc_ids = open(self.index_dir / DOC_IDS_FILE, 'wb')
+            self._tfs = open(self.index_dir / TFS_FILE, 'wb')
+        self._block_last_doc = open(self.index_dir / BLOCK_LAST_DOC_FILE, 'wb')
+        self._block_max_tf = open(self.index_dir / BLOCK_MAX_TF_FILE, 'wb')
+        self._block_min_len = open(self.index_dir / BLOCK_MIN_LEN_FILE, 'wb')
+        self._block_max_score = open(self.index_dir / BLOCK_MAX_SCORE_FILE, 'wb')
+        self._idf = open(self.index_dir / IDF_FILE, 'wb')
+
+        # 位置偏移表与倒排记录一样多，边写边落盘，不在内存中累积
+        self.positions = positions
+        self._positions = self._pos_offsets = None
+        self._pos_end = 0
+        if positions:
+            self._positions = open(self.index_dir / POSITIONS_FILE, 'wb')
+            self._pos_offsets = open(self.index_dir / POS_OFFSETS_FILE, 'wb')
+            np.zeros(1, dtype=np.uint64).tofile(self._pos_offsets)
+
+        self.doc_base = doc_base
+        self.synonyms = synonyms
+        self.title_lengths = None
+        self.avg_title_length = avg_title_length
+        self.has_fields = title_lengths is not None
+        if self.has_fields:
+            self.title_lengths = np.asarray(title_lengths, dtype=np.uint32)
+            if self.compression is None:
+                self._title_tfs = open(self.index_dir / TITLE_TFS_FILE, 'wb')
+
+        self._term_offsets = array('Q', [0])
+        self._term_dfs = array('I')
+        self._post_offsets = array('Q', [0])
+        self._term_blocks = array('Q', [0])
+        self._last_term = None
+
+        # 索引代号：同一目录每次重建递增，供查询缓存等判断索引是否已更换
+        self.generation = generation or 1
+        meta_path = self.index_dir / META_FILE
+        if generation is None and meta_path.exists():
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                self.generation = json.load(f).get('generation', 0) + 1
+
+    def add_term(self, term, doc_ids, tfs, positions=None, title_tfs=None, df=None):
+        """写入一个词项的倒排记录
+
+        doc_ids 须升序；positions 为每条记录的升序位置列表；title_tfs 为每条记录的标题词频；
+        df 为计算 IDF 用的文档频率，默认为本索引中的记录数。
+        """
+        if self._last_term is not None and term <= self._last_term:
+            raise ValueError(f"词项未按字典序写入: {term!r}")
+        self._last_term = term
+
+        encoded = term.encode('utf-8')
+        self._lexicon.write(encoded)
+        self._term_offsets.append(self._term_offsets[-1] + len(encoded))
+
+        doc_ids = np.asarray(doc_ids, dtype=np.uint32)
+        tfs = np.asarray(tfs, dtype=np.uint32)
+        if self.has_fields:
+            if title_tfs is None or len(title_tfs) != len(tfs):
+                raise ValueError("按字段索引需要为每条倒排记录提供标题词频")
+            title_tfs = np.minimum(np.asarray(title_tfs, dtype=np.uint32), tfs)
+
+        if self.compression == 'packed':
+            self._add_packed(doc_ids, tfs, title_tfs)
+        else:
+            doc_ids.tofile(self._doc_ids)
+            tfs.tofile(self._tfs)
+            if self.has_fields:
+                title_tfs.tofile(self._title_tfs)
+        self._post_offsets.append(self._post_offsets[-1] + len(doc_ids))
+        df = len(doc_ids) if df is None else df
+        self._term_dfs.append(df)
+        np.float32(bm25_idf(df, self.total_docs)).tofile(self._idf)
+
+        # 块级信息：最后文档ID（跳表）、最大词频与最短文档长度（得分上界）
+        starts = np.arange(0, len(doc_ids), BLOCK_SIZE)
+        if len(starts):
+            doc_ids[np.minimum(starts + BLOCK_SIZE, len(doc_ids)) - 1].tofile(self._block_last_doc)
+            np.maximum.reduceat(tfs, starts).astype(np.uint32).tofile(self._block_max_tf)
+            np.minimum.reduceat(self.doc_lengths[doc_ids], starts).astype(np.uint32).tofile(self._block_min_len)
+            scores = tfs * (self.k1 + 1) / (tfs + self._norms[doc_ids])
+            np.maximum.reduceat(scores, starts).astype(np.float32).tofile(self._block_max_score)
+        self._term_blocks.append(self._term_blocks[-1] + len(starts))
+
+        if self.positions:
+            self._add_positions(positions, tfs)
+
+    def _add_packed(self, doc_ids, tfs, title_tfs):
+        """按块位压缩写入：文档ID存相邻差值减 1、词频存 tf - 1（稠密词项与全为 1 的词频占 0 位），
+        标题词频原样存放。块起点由上一块的最后文档ID（block_last_doc）还原，可直接跳到任一块解码。
+        """
+        doc_ids = doc_ids.astype(np.int64)
+        streams = [np.diff(doc_ids, prepend=-1) - 1, tfs.astype(np.int64) - 1]
+        if self.has_fields:
+            streams.append(title_tfs)
+        data, block_bytes, widths = pack_blocks(streams)
+        data.tofile(self._postings)
+        widths.tofile(self._block_widths)
+        self._block_offsets.extend((np.cumsum(block_bytes) + self._block_offsets[-1]).tolist())
+
+    def _add_positions(self, positions, tfs):
+        """每条记录的位置差分编码（首个位置保留原值），按记录顺序连续写入"""
+        if positions is None or len(positions) != len(tfs):
+            raise ValueError("位置索引需要为每条倒排记录提供词位置")
+        if len(positions) == 0:
+            return
+        flat = np.concatenate([np.asarray(p, dtype=np.int64) for p in positions])
+        counts = np.array([len(p) for p in positions], dtype=np.int64)
+        if not np.array_equal(counts, tfs):
+            raise ValueError("词位置个数与词频不一致")
+
+        deltas = np.diff(flat, prepend=0)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        deltas[starts] = flat[starts]
+        encoded = encode_varints(deltas)
+        encoded.tofile(self._positions)
+
+        # 每条记录的编码字节数
+        value_bytes = np.ones(len(deltas), dtype=np.int64)
+        for k in range(1, 10):
+            value_bytes += deltas >= (1 << (7 * k))
+        ends = np.cumsum(np.add.reduceat(value_bytes, starts)) + self._pos_end
+        ends.astype(np.uint64).tofile(self._pos_offsets)
+        self._pos_end = int(ends[-1])
+
+    def finish(self):
+        """写入偏移表、文档长度与元数据"""
+        for f in (self._lexicon, self._block_last_doc, self._block_max_tf, self._block_min_len,
+                  self._block_max_score, self._idf):
+            f.close()
+        if self.compression == 'packed':
+            self._postings.close()
+            self._block_widths.close()
+            with open(self.index_dir / BLOCK_OFFSETS_FILE, 'wb') as f:
+                self._block_offsets.tofile(f)
+        else:
+            self._doc_ids.close()
+            self._tfs.close()
+        if self.positions:
+            self._positions.close()
+            self._pos_offsets.close()
+        fields = []
+        avg_title_length = 0
+        if self.has_fields:
+            if self.compression is None:
+                self._title_tfs.close()
+            self.title_lengths.tofile(self.index_dir / TITLE_LENGTHS_FILE)
+            fields = ['title']
+            if self.avg_title_length is not None:
+                avg_title_length = self.avg_title_length
+            elif self.total_docs:
+                avg_title_length = float(self.title_lengths.sum()) / self.total_docs
+
+        with open(self.index_dir / TERM_OFFSETS_FILE, 'wb') as f:
+            self._term_offsets.tofile(f)
+        with open(self.index_dir / POST_OFFSETS_FILE, 'wb') as f:
+            self._post_offsets.tofile(f)
+        with open(self.index_dir / TERM_DFS_FILE, 'wb') as f:
+            self._term_dfs.tofile(f)
+        with open(self.index_dir / TERM_BLOCKS_FILE, 'wb') as f:
+            self._term_blocks.tofile(f)
+        self.doc_lengths.tofile(self.index_dir / DOC_LENGTHS_FILE)
+        self._norms.astype(np.float32).tofile(self.index_dir / NORMS_FILE)
+
+        with open(self.index_dir / META_FILE, 'w', encoding='utf-8') as f:
+            json.dump({
+                'format': FORMAT_VERSION,
+                'generation': self.generation,
+                'num_terms': len(self._term_offsets) - 1,
+                'num_postings': self._post_offsets[-1],
+                'block_size': BLOCK_SIZE,
+                'compression': self.compression,
+                'bm25': {'k1': self.k1, 'b': self.b},
+                'avg_doc_length': self.avg_doc_length,
+                'total_docs': self.total_docs,
+                'positions': self.positions,
+                'fields': fields,
+                'avg_title_length': avg_title_length,
+                'doc_base': self.doc_base,
+                'synonyms': self.synonyms
+            }, f, ensure_ascii=False, indent=2)
+
+
+def _dense(values_by_doc):
+    """{doc_id: value} 转为按整数文档ID索引的 uint32 数组"""
+    values = {int(doc_id): value for doc_id, value in values_by_doc.items()}
+    dense = np.zeros(max(values, default=-1) + 1, dtype=np.uint32)
+    for doc_id, value in values.items():
+        dense[doc_id] = value
+    return dense
+
+
+def _dense_title_lengths(num_docs, title_lengths):
+    if title_lengths is None:
+        return None
+    dense = np.zeros(num_docs, dtype=np.uint32)
+    titles = _dense(title_lengths)
+    dense[:len(titles)] = titles
+    return dense
+
+
+def _dict_postings(inverted_index, positions, title_tfs):
+    """内存中的 {term: {doc_id: ...}} 按字典序产生 (词项, 文档ID, 词频, 位置, 标题词频)"""
+    for term in sorted(inverted_index):
+        postings = sorted((int(doc_id), doc_id, tf) for doc_id, tf in inverted_index[term].items())
+        term_positions = None
+        if positions is not None:
+            term_positions = [positions[term][doc_id] for _, doc_id, _ in postings]
+        term_title_tfs = None
+        if title_tfs is not None:
+            term_title_tfs = [title_tfs[term].get(doc_id, 0) for _, doc_id, _ in postings]
+        yield term, [d for d, _, _ in postings], [tf for _, _, tf in postings], term_positions, term_title_tfs
+
+
+def _write_terms(writer, term_postings, doc_range=None, dictionary=None):
+    """按字典序写入全部词项
+
+    doc_range 为 (lo, hi) 时只写入该区间的文档，文档ID改写为相对 lo 的分片内ID，IDF 仍按全局 df。
+    给出 dictionary（列表）时把每个词项的 (词项, 全局 df) 追加到其中。
+    """
+    for term, doc_ids, tfs, positions, title_tfs in term_postings:
+        df = len(doc_ids)
+        if dictionary is not None:
+            dictionary.append((term, df))
+        if doc_range is not None:
+            lo, hi = doc_range
+            first, last = np.searchsorted(np.asarray(doc_ids, dtype=np.int64), [lo, hi])
+            if first == last:
+                continue
+            doc_ids = np.asarray(doc_ids[first:last], dtype=np.int64) - lo
+            tfs = tfs[first:last]
+            positions = None if positions is None else positions[first:last]
+            title_tfs = None if title_tfs is None else title_tfs[first:last]
+        writer.add_term(term, doc_ids, tfs, positions, title_tfs, df)
+
+
+def write_index(index_dir, inverted_index, doc_lengths, avg_doc_length, positions=None,
+                title_tfs=None, title_lengths=None, shards=1, generation=None, synonyms=None):
+    """将内存中的 {term: {doc_id: tf}} 倒排索引写成二进制格式
+
+    doc_lengths 为 {doc_id: length}，doc_id 可为整数或数字字符串。
+    positions 为可选的 {term: {doc_id: [pos, ...]}}，给出时写入位置信息。
+    title_tfs 为可选的 {term: {doc_id: 标题词频}}，与 title_lengths（{doc_id: 标题长度}）
+    一起给出时按字段写入。shards 大于 1 时写成分片索引（见 write_sharded_index）。
+    generation 为空时按目录中已有索引的代号递增。synonyms 为同义词组词项所用词典的摘要。
+    """
+    write_postings(index_dir, lambda: _dict_postings(inverted_index, positions, title_tfs),
+                   doc_lengths, avg_doc_length, positions is not None,
+                   title_lengths if title_tfs is not None else None, shards, generation, synonyms)
+
+
+def write_postings(index_dir, term_postings, doc_lengths, avg_doc_length, positions=False,
+                   title_lengths=None, shards=1, generation=None, synonyms=None):
+    """把按词项依次给出的倒排写成二进制格式（参数含义同 write_index）
+
+    term_postings() 每次调用返回一个新的迭代器，按字典序产生 (词项, 文档ID, 词频, 位置, 标题词频)，
+    文档ID升序；positions 为假时位置为 None，未给出 title_lengths 时标题词频为 None。
+    分片索引的每个分片各遍历一次。
+    """
+    if shards > 1:
+        write_sharded_index(index_dir, shards, term_postings, doc_lengths, avg_doc_length,
+                            positions, title_lengths, generation, synonyms)
+        return
+
+    dense_lengths = _dense(doc_lengths)
+    writer = IndexWriter(index_dir, dense_lengths, avg_doc_length, len(doc_lengths),
+                         positions=positions,
+                         title_lengths=_dense_title_lengths(len(dense_lengths), title_lengths),
+                         generation=generation, synonyms=synonyms)
+    _write_terms(writer, term_postings())
+    writer.finish()
+
+
+def write_sharded_index(index_dir, num_shards, term_postings, doc_lengths, avg_doc_length,
+                        positions=False, title_lengths=None, generation=None, synonyms=None):
+    """按文档ID区间划分为 num_shards 个分片，每个分片是 index_dir 下一个独立的二进制索引
+
+    各分片文档数大致相等，区间起点按 64 对齐（过滤位图可按字直接切片）；分片内使用
+    相对起点的文档ID，数组大小只与分片规模有关，分片 meta 中的 doc_base 记录起点。
+    分片中的 IDF、长度归一化与块最大得分都按全局文档数、全局 df 与全局平均长度计算，
+    各分片的得分与不分片时完全一致。顶层 meta.json 记录分片目录与全局统计量。
+    """
+    index_dir = Path(index_dir)
+    dense_lengths = _dense(doc_lengths)
+    dense_title_lengths = _dense_title_lengths(len(dense_lengths), title_lengths)
+    total_docs = len(doc_lengths)
+    avg_title_length = None
+    if dense_title_lengths is not None and total_docs:
+        avg_title_length = float(dense_title_lengths.sum()) / total_docs
+
+    if generation is None:
+        generation = (load_meta(index_dir) or {}).get('generation', 0) + 1
+
+    # 按有效文档数均分，区间起点向下对齐到 64
+    live = np.flatnonzero(dense_lengths)
+    bases = [0] + [int(live[len(live) * i // num_shards]) // 64 * 64 for i in range(1, num_shards)]
+    bounds = list(zip(bases, bases[1:] + [len(dense_lengths)]))
+
+    shard_names = []
+    dictionary = []
+    for shard, (lo, hi) in enumerate(bounds):
+        name = f'shard_{shard}'
+        writer = IndexWriter(index_dir / name, dense_lengths[lo:hi], avg_doc_length, total_docs,
+                             positions=positions,
+                             title_lengths=None if dense_title_lengths is None else dense_title_lengths[lo:hi],
+                             avg_title_length=avg_title_length, doc_base=lo, generation=generation,
+                             synonyms=synonyms)
+        _write_terms(writer, term_postings(), (lo, hi), dictionary if shard == 0 else None)
+        writer.finish()
+        shard_names.append(name)
+
+    # 顶层词典：全部词项与全局文档频率，供前缀补全使用
+    write_term_dictionary(index_dir, [term for term, _ in dictionary], [df for _, df in dictionary])
+
+    with open(index_dir / META_FILE, 'w', encoding='utf-8') as f:
+        json.dump({
+            'format': SHARDED_FORMAT_VERSION,
+            'generation': generation,
+            'shards': shard_names,
+            'avg_doc_length': avg_doc_length,
+            'total_docs': total_docs,
+            'synonyms': synonyms
+        }, f, ensure_ascii=False, indent=2)
+
+
+def write_term_dictionary(index_dir, terms, dfs):
+    """写入按字典序排列的词项表（lexicon + term_offsets）与对应的文档频率"""
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    encoded = [term.encode('utf-8') for term in terms]
+    with open(index_dir / LEXICON_FILE, 'wb') as f:
+        f.write(b''.join(encoded))
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    offsets.tofile(index_dir / TERM_OFFSETS_FILE)
+    np.asarray(dfs, dtype=np.uint32).tofile(index_dir / TERM_DFS_FILE)
+
+
+# 按词项区间拼接部分索引时各文件的处理方式：偏移表（uint64，后续部分去掉开头的 0 并加上
+# 前面各部分的末值）、按词项 / 倒排记录 / 块的顺序直接拼接、各部分相同只取一份
+_OFFSET_FILES = [TERM_OFFSETS_FILE, POST_OFFSETS_FILE, TERM_BLOCKS_FILE, BLOCK_OFFSETS_FILE, POS_OFFSETS_FILE]
+_CONCAT_FILES = [LEXICON_FILE, TERM_DFS_FILE, DOC_IDS_FILE, TFS_FILE, TITLE_TFS_FILE, POSTINGS_FILE,
+                 BLOCK_WIDTHS_FILE, BLOCK_LAST_DOC_FILE, BLOCK_MAX_TF_FILE, BLOCK_MIN_LEN_FILE,
+                 BLOCK_MAX_SCORE_FILE, IDF_FILE, POSITIONS_FILE]
+_SHARED_FILES = [DOC_LENGTHS_FILE, NORMS_FILE, TITLE_LENGTHS_FILE]
+
+
+def concat_indexes(index_dir, part_dirs):
+    """把按词项区间依次写出的部分索引拼接为一个索引，结果与一次写出全部词项相同
+
+    各部分须按相同的文档长度、参数与代号写出，词项区间互不重叠且按字典序先后排列。
+    分片索引逐个分片拼接，顶层词典同样拼接。
+    """
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    part_dirs = [Path(part_dir) for part_dir in part_dirs]
+    meta = load_meta(part_dirs[0])
+    if meta.get('format') == SHARDED_FORMAT_VERSION:
+        for name in meta['shards']:
+            concat_indexes(index_dir / name, [part_dir / name for part_dir in part_dirs])
+    else:
+        metas = [load_meta(part_dir) for part_dir in part_dirs]
+        meta['num_terms'] = sum(m['num_terms'] for m in metas)
+        meta['num_postings'] = sum(m['num_postings'] for m in metas)
+
+    for name in _OFFSET_FILES + _CONCAT_FILES + _SHARED_FILES:
+        paths = [part_dir / name for part_dir in part_dirs]
+        if not paths[0].exists():
+            continue
+        if name in _SHARED_FILES:
+            shutil.copyfile(paths[0], index_dir / name)
+        elif name in _OFFSET_FILES:
+            parts = [np.fromfile(path, dtype=np.uint64) for path in paths]
+            combined = [parts[0]]
+            base = parts[0][-1]
+            for offsets in parts[1:]:
+                combined.append(offsets[1:] + base)
+                base += offsets[-1]
+            np.concatenate(combined).tofile(index_dir / name)
+        else:
+            with open(index_dir / name, 'wb') as out:
+                for path in paths:
+                    with open(path, 'rb') as f:
+                        shutil.copyfileobj(f, out)
+
+    with open(index_dir / META_FILE, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+
+def load_meta(index_dir):
+    """读取索引目录的 meta.json，不存在时返回 None"""
+    meta_path = Path(index_dir) / META_FILE
+    if not meta_path.exists():
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def convert_legacy_index(index_dir):
+    """把旧版 inverted_index.json + meta.json 转换为二进制格式"""
+    index_dir = Path(index_dir)
+    with open(index_dir / LEGACY_INDEX_FILE, 'r', encoding='utf-8') as f:
+        inverted_index = json.load(f)
+    with open(index_dir / META_FILE, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+
+    write_index(index_dir, inverted_index, meta['doc_lengths'], meta['avg_doc_length'])
+
+
+class _Lexicon:
+    """内存映射的有序词项表，支持 bisect 按下标取词"""
+
+    def __init__(self, lexicon_path, offsets):
+        self._offsets = offsets
+        if Path(lexicon_path).stat().st_size == 0:
+            self._data = b''
+        else:
+            with open(lexicon_path, 'rb') as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._data[int(self._offsets[i]):int(self._offsets[i + 1])]
+
+    def lower_bound(self, key):
+        """第一个不小于 key（UTF-8 字节串）的词项下标"""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+class TermDictionary:
+    """按字典序排列的词项表与文档频率，支持前缀查找
+
+    单个索引直接使用其 lexicon；分片索引使用建索引时写在顶层目录的全局词典。
+    UTF-8 字节序与码点序一致，以某前缀开头的词项在表中连续，两次二分即可定位。
+    local 为真时文档频率取本索引中的倒排记录数（分片的词典文件中是全局值）。
+    """
+
+    def __init__(self, index_dir, local=False):
+        index_dir = Path(index_dir)
+        self._lexicon = _Lexicon(index_dir / LEXICON_FILE, _open_array(index_dir / TERM_OFFSETS_FILE, np.uint64))
+        if (index_dir / TERM_DFS_FILE).exists() and not local:
+            self.dfs = _open_array(index_dir / TERM_DFS_FILE, np.uint32)
+        else:
+            # 早于词典文件的单个索引：文档频率即各词项的倒排记录数
+            self.dfs = np.diff(_open_array(index_dir / POST_OFFSETS_FILE, np.uint64)).astype(np.uint32)
+
+    @staticmethod
+    def exists(index_dir):
+        """目录中是否有可用的词典（早于顶层词典的分片索引没有）"""
+        return (Path(index_dir) / LEXICON_FILE).exists()
+
+    def __len__(self):
+        return len(self._lexicon)
+
+    def prefix_range(self, prefix):
+        """以 prefix 开头的词项编号区间 [lo, hi)"""
+        key = prefix.encode('utf-8')
+        # UTF-8 中不会出现 0xff 字节，key + 0xff 大于所有以 key 开头的词项
+        return self._lexicon.lower_bound(key), self._lexicon.lower_bound(key + b'\xff')
+
+    def complete(self, prefix, limit):
+        """以 prefix 开头、文档频率最高的 limit 个词项 [(term, df)]，同频时按字典序"""
+        lo, hi = self.prefix_range(prefix)
+        if lo >= hi or limit <= 0:
+            return []
+        dfs = self.dfs[lo:hi]
+        if hi - lo > limit:
+            top = np.argpartition(-dfs.astype(np.int64), limit - 1)[:limit]
+        else:
+            top = np.arange(hi - lo)
+        top = top[np.lexsort((top, -dfs[top].astype(np.int64)))]
+        return [(self._lexicon[lo + i].decode('utf-8'), int(dfs[i])) for i in top.tolist()]
+
+
+class IndexReader:
+    """只读的二进制倒排索引，所有数组均为内存映射，按词项惰性读取"""
+
+    def __init__(self, index_dir):
+        self.index_dir = Path(index_dir)
+        with open(self.index_dir / META_FILE, 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        self.total_docs = self.meta['total_docs']
+        self.avg_doc_length = self.meta['avg_doc_length']
+        self.generation = self.meta.get('generation', 0)
+        self.doc_base = self.meta.get('doc_base', 0)  # 分片索引中文档ID的全局偏移
+
+        self._post_offsets = _open_array(self.index_dir / POST_OFFSETS_FILE, np.uint64)
+        self._lexicon = _Lexicon(self.index_dir / LEXICON_FILE,
+                                 _open_array(self.index_dir / TERM_OFFSETS_FILE, np.uint64))
+        self.doc_lengths = _open_array(self.index_dir / DOC_LENGTHS_FILE, np.uint32)
+
+        self._term_blocks = _open_array(self.index_dir / TERM_BLOCKS_FILE, np.uint64)
+        self._block_last_doc = _open_array(self.index_dir / BLOCK_LAST_DOC_FILE, np.uint32)
+        self._block_max_tf = _open_array(self.index_dir / BLOCK_MAX_TF_FILE, np.uint32)
+        self._block_min_len = _open_array(self.index_dir / BLOCK_MIN_LEN_FILE, np.uint32)
+        self._block_max_score = _open_array(self.index_dir / BLOCK_MAX_SCORE_FILE, np.float32)
+
+        # 预计算的 IDF 表与文档长度归一化数组
+        self.idf = _open_array(self.index_dir / IDF_FILE, np.float32)
+        self.norms = _open_array(self.index_dir / NORMS_FILE, np.float32)
+
+        # 可选的位置信息，旧索引或关闭位置索引时不存在
+        self.has_positions = bool(self.meta.get('positions'))
+        if self.has_positions:
+            self._positions = _open_array(self.index_dir / POSITIONS_FILE, np.uint8)
+            self._pos_offsets = _open_array(self.index_dir / POS_OFFSETS_FILE, np.uint64)
+
+        # 可选的字段信息（标题词频与标题长度）
+        self.has_fields = 'title' in self.meta.get('fields', [])
+        self.avg_title_length = self.meta.get('avg_title_length', 0)
+        if self.has_fields:
+            self.title_lengths = _open_array(self.index_dir / TITLE_LENGTHS_FILE, np.uint32)
+
+        # 倒排记录：按块位压缩，或旧版的定长 uint32 数组
+        self.compression = self.meta.get('compression')
+        if self.compression == 'packed':
+            self._postings = _open_array(self.index_dir / POSTINGS_FILE, np.uint8)
+            self._block_offsets = _open_array(self.index_dir / BLOCK_OFFSETS_FILE, np.uint64)
+            self._block_widths = _open_array(self.index_dir / BLOCK_WIDTHS_FILE, np.uint8).reshape(
+                -1, 3 if self.has_fields else 2)
+            # 最近解码的整条倒排（同一查询的布尔过滤与排序、相邻查询中的常用词共用）
+            self._unpack_term = lru_cache(maxsize=INDEX_CONFIG['postings_cache'])(self._unpack)
+        else:
+            self._doc_ids = _open_array(self.index_dir / DOC_IDS_FILE, np.uint32)
+            self._tfs = _open_array(self.index_dir / TFS_FILE, np.uint32)
+            if self.has_fields:
+                self._title_tfs = _open_array(self.index_dir / TITLE_TFS_FILE, np.uint32)
+
+    @staticmethod
+    def exists(index_dir):
+        """目录中是否已有二进制索引"""
+        meta_path = Path(index_dir) / META_FILE
+        if not meta_path.exists():
+            return False
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('format') == FORMAT_VERSION
+
+    def __len__(self):
+        return len(self._lexicon)
+
+    def __contains__(self, term):
+        return self.term_id(term) >= 0
+
+    def term_id(self, term):
+        """二分查找词项编号，不存在时返回 -1"""
+        key = term.encode('utf-8')
+        lo = self._lexicon.lower_bound(key)
+        if lo < len(self._lexicon) and self._lexicon[lo] == key:
+            return lo
+        return -1
+
+    def term(self, term_id):
+        """按编号取词项"""
+        return self._lexicon[term_id].decode('utf-8')
+
+    def df(self, term):
+        """文档频率"""
+        term_id = self.term_id(term)
+        if term_id < 0:
+            return 0
+        return self.df_by_id(term_id)
+
+    def df_by_id(self, term_id):
+        """按词项编号取文档频率"""
+        return int(self._post_offsets[term_id + 1] - self._post_offsets[term_id])
+
+    def postings(self, term):
+        """返回 (doc_ids, tfs) 两个只读数组视图，词项不存在时为空数组"""
+        term_id = self.term_id(term)
+        if term_id < 0:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint32)
+        return self.postings_by_id(term_id)
+
+    def postings_by_id(self, term_id):
+        """按词项编号返回 (doc_ids, tfs)"""
+        if self.compression == 'packed':
+            return self._unpack_term(term_id)[:2]
+        start, end = int(self._post_offsets[term_id]), int(self._post_offsets[term_id + 1])
+        return self._doc_ids[start:end], self._tfs[start:end]
+
+    def field_postings_by_id(self, term_id):
+        """按词项编号返回 (doc_ids, tfs, title_tfs)，同一区间一次取出"""
+        if self.compression == 'packed':
+            return self._unpack_term(term_id)
+        start, end = int(self._post_offsets[term_id]), int(self._post_offsets[term_id + 1])
+        return self._doc_ids[start:end], self._tfs[start:end], self._title_tfs[start:end]
+
+    def block_postings_by_id(self, term_id, block):
+        """词项第 block 块（每块 BLOCK_SIZE 条记录）的 (doc_ids, tfs)，压缩格式下只解码这一块"""
+        if self.compression == 'packed':
+            return self._unpack(term_id, block, block + 1)[:2]
+        start = int(self._post_offsets[term_id]) + block * BLOCK_SIZE
+        end = min(start + BLOCK_SIZE, int(self._post_offsets[term_id + 1]))
+        return self._doc_ids[start:end], self._tfs[start:end]
+
+    def _unpack(self, term_id, first=0, last=None):
+        """解码词项第 [first, last) 块，返回只读的 (doc_ids, tfs, title_tfs)，无字段信息时 title_tfs 为 None"""
+        term_start = int(self._term_blocks[term_id])
+        num_blocks = int(self._term_blocks[term_id + 1]) - term_start
+        last = num_blocks if last is None else min(last, num_blocks)
+        if first >= last:
+            empty = np.empty(0, dtype=np.uint32)
+            return empty, empty, empty if self.has_fields else None
+
+        count = min(last * BLOCK_SIZE, self.df_by_id(term_id)) - first * BLOCK_SIZE
+        lo, hi = term_start + first, term_start + last
+        data = self._postings[int(self._block_offsets[lo]):int(self._block_offsets[hi])]
+        values = unpack_blocks(data, count, self._block_widths[lo:hi])
+
+        # 差分还原：起点为上一块的最后文档ID（首块为 -1）
+        base = int(self._block_last_doc[lo - 1]) if first > 0 else -1
+        doc_ids = (np.cumsum(values[:, 0] + 1) + base).astype(np.uint32)
+        tfs = (values[:, 1] + 1).astype(np.uint32)
+        title_tfs = values[:, 2].astype(np.uint32) if self.has_fields else None
+        for decoded in (doc_ids, tfs, title_tfs):
+            if decoded is not None:
+                decoded.flags.writeable = False
+        return doc_ids, tfs, title_tfs
+
+    def blocks_by_id(self, term_id):
+        """按词项编号返回块级信息 (last_doc, max_tf, min_len, max_score)，每块 BLOCK_SIZE 条记录"""
+        start, end = int(self._term_blocks[term_id]), int(self._term_blocks[term_id + 1])
+        return (self._block_last_doc[start:end],
+                self._block_max_tf[start:end],
+                self._block_min_len[start:end],
+                self._block_max_score[start:end])
+
+    def matches_bm25(self, k1, b, avg_doc_length):
+        """norms 与块最大得分是否按相同的 BM25 参数与平均文档长度计算"""
+        return (self.meta.get('bm25') == {'k1': k1, 'b': b}
+                and self.avg_doc_length == avg_doc_length)
+
+    def positions(self, term, doc_ids):
+        """词项在给定文档中的位置，doc_ids 须升序且均包含该词项
+
+        只解码这些文档对应的位置记录，返回等长的 (docs, positions) 两个 int64 数组，
+        按 (文档, 位置) 升序排列。
+        """
+        term_id = self.term_id(term)
+        if term_id < 0 or not self.has_positions:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        term_docs, term_tfs = self.postings_by_id(term_id)
+        within = np.searchsorted(term_docs, doc_ids)
+        records = int(self._post_offsets[term_id]) + within
+        byte_starts = self._pos_offsets[records].astype(np.int64)
+        byte_lengths = self._pos_offsets[records + 1].astype(np.int64) - byte_starts
+
+        # 把各记录的字节区间拼成一个下标数组一次取出
+        total = int(byte_lengths.sum())
+        segment_starts = np.cumsum(byte_lengths) - byte_lengths
+        gather = np.repeat(byte_starts - segment_starts, byte_lengths) + np.arange(total)
+        deltas = decode_varints(self._positions[gather])
+
+        # 差分还原：每条记录内求前缀和
+        counts = term_tfs[within].astype(np.int64)
+        positions = np.cumsum(deltas)
+        record_starts = np.cumsum(counts) - counts
+        before = np.concatenate(([0], positions))[record_starts]
+        positions -= np.repeat(before, counts)
+        return np.repeat(np.asarray(doc_ids, dtype=np.int64), counts), positions
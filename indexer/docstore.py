@@ -0,0 +1,349 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+from array import array
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+from config.settings import INDEX_CONFIG
+from indexer.binary_index import _open_array
+from indexer.generations import resolve_generation
+
+
+# 正文字段单独成段，列表页只需解码体积很小的元数据段
+BODY_FIELDS = ('content', 'sentences')
+
+TABLE_FILE = 'doc_table.bin'           # int32 (block, slot) 对，按整数文档ID索引，-1 表示不存在
+HEADS_FILE = 'heads.bin'               # 压缩的元数据块
+BODIES_FILE = 'bodies.bin'             # 压缩的正文块
+HEAD_OFFSETS_FILE = 'head_offsets.bin'  # uint64，元数据块的字节区间
+BODY_OFFSETS_FILE = 'body_offsets.bin'  # uint64，正文块的字节区间
+FACETS_FILE = 'facets.bin'             # uint64 位图，按字段取值列出包含的文档（语言、主题等过滤用）
+META_FILE = 'meta.json'
+
+
+class DocStoreWriter:
+    """文档存储写入器：文档按ID升序写入，每 block_size 篇压缩为一块
+
+    append 为真时在目录中已有的文档存储之后追加（新文档ID须大于已有的），已有的块不变。
+    """
+
+    def __init__(self, store_dir, block_size=None, append=False):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.block_size = block_size or INDEX_CONFIG['docstore']['block_size']
+
+        mode = 'ab' if append else 'wb'
+        self._heads = open(self.store_dir / HEADS_FILE, mode)
+        self._bodies = open(self.store_dir / BODIES_FILE, mode)
+        self._head_offsets = array('Q', [0])
+        self._body_offsets = array('Q', [0])
+        self._table = array('i')
+        self._pending = []
+        self._last_id = -1
+
+        # 过滤字段：{field: {value: [doc_id, ...]}}
+        self.facet_fields = INDEX_CONFIG['docstore']['facets']
+        self._facets = {field: {} for field in self.facet_fields}
+        if append:
+            self._load_existing()
+
+    def _load_existing(self):
+        """读入已有的偏移表、ID表与过滤位图，之后的块接在其后"""
+        with open(self.store_dir / META_FILE, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.block_size = meta['block_size']
+        for name, offsets in ((HEAD_OFFSETS_FILE, self._head_offsets), (BODY_OFFSETS_FILE, self._body_offsets)):
+            with open(self.store_dir / name, 'rb') as f:
+                offsets.frombytes(f.read()[8:])
+        with open(self.store_dir / TABLE_FILE, 'rb') as f:
+            self._table.frombytes(f.read())
+        live = np.flatnonzero(np.frombuffer(self._table, dtype=np.int32)[::2] >= 0)
+        self._last_id = int(live[-1]) if len(live) else -1
+
+        num_words = meta.get('facet_words', 0)
+        bitmaps = _open_array(self.store_dir / FACETS_FILE, np.uint64) if num_words else None
+        for field, values in meta.get('facets', {}).items():
+            if field not in self._facets:
+                continue
+            for value, i in values.items():
+                words = np.array(bitmaps[i * num_words:(i + 1) * num_words])
+                bits = np.unpackbits(words.view(np.uint8), bitorder='little')
+                self._facets[field][value] = np.flatnonzero(bits).tolist()
+
+    def add(self, doc_id, record):
+        """写入一篇文档"""
+        doc_id = int(doc_id)
+        if doc_id <= self._last_id:
+            raise ValueError(f"文档ID未按升序写入: {doc_id}")
+        self._last_id = doc_id
+
+        # 补齐跳过的ID
+        self._table.extend([-1, -1] * (doc_id - len(self._table) // 2))
+        self._table.extend([len(self._head_offsets) - 1, len(self._pending)])
+        self._pending.append(record)
+        for field in self.facet_fields:
+            if record.get(field) is not None:
+                self._facets[field].setdefault(str(record[field]), []).append(doc_id)
+        if len(self._pending) >= self.block_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        heads = [{k: v for k, v in r.items() if k not in BODY_FIELDS} for r in self._pending]
+        bodies = [{k: r[k] for k in BODY_FIELDS if k in r} for r in self._pending]
+        for records, f, offsets in ((heads, self._heads, self._head_offsets),
+                                    (bodies, self._bodies, self._body_offsets)):
+            data = zlib.compress(json.dumps(records, ensure_ascii=False).encode('utf-8'))
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+        self._pending = []
+
+    def finish(self, extra_meta=None):
+        """写出最后一块、偏移表与元数据"""
+        self._flush()
+        self._heads.close()
+        self._bodies.close()
+
+        with open(self.store_dir / TABLE_FILE, 'wb') as f:
+            self._table.tofile(f)
+        with open(self.store_dir / HEAD_OFFSETS_FILE, 'wb') as f:
+            self._head_offsets.tofile(f)
+        with open(self.store_dir / BODY_OFFSETS_FILE, 'wb') as f:
+            self._body_offsets.tofile(f)
+
+        # 每个过滤取值一张覆盖全部文档ID的位图，依次写入，meta 中记录其序号
+        num_words = (len(self._table) // 2 + 63) // 64
+        facets = {field: {} for field in self._facets}
+        with open(self.store_dir / FACETS_FILE, 'wb') as f:
+            bitmaps = 0
+            for field, values in self._facets.items():
+                for value, doc_ids in values.items():
+                    mask = np.zeros(num_words * 64, dtype=bool)
+                    mask[doc_ids] = True
+                    np.packbits(mask, bitorder='little').tofile(f)
+                    facets[field][value] = bitmaps
+                    bitmaps += 1
+        with open(self.store_dir / META_FILE, 'w', encoding='utf-8') as f:
+            json.dump(dict(extra_meta or {},
+                           block_size=self.block_size,
+                           num_docs=int(np.count_nonzero(np.frombuffer(self._table, dtype=np.int32)[::2] >= 0)),
+                           num_blocks=len(self._head_offsets) - 1,
+                           facets=facets,
+                           facet_words=num_words),
+                      f, ensure_ascii=False, indent=2)
+
+
+def build_docstore(documents, store_dir, extra_meta=None):
+    """由 {doc_id: record} 构建文档存储"""
+    writer = DocStoreWriter(store_dir)
+    for doc_id in sorted(documents, key=int):
+        writer.add(doc_id, documents[doc_id])
+    writer.finish(extra_meta)
+
+
+def extend_docstore(src_dir, store_dir, documents):
+    """复制 src_dir 的文档存储到 store_dir 并追加 {doc_id: record}（ID须大于已有文档）
+
+    已有的压缩块原样复制，不必重新压缩全部文档。
+    """
+    shutil.copytree(src_dir, store_dir)
+    writer = DocStoreWriter(store_dir, append=True)
+    for doc_id in sorted(documents, key=int):
+        writer.add(doc_id, documents[doc_id])
+    writer.finish()
+
+
+def added_documents_dir(documents_path):
+    """增量加入的各批文档所在目录：documents.json 旁的 documents.d/，每批一个文件，写成后不再修改"""
+    return Path(documents_path).with_suffix('.d')
+
+
+def write_added_documents(documents_path, name, documents):
+    """把增量加入的一批文档 {doc_id: record} 写成 documents.d/<name>.json（先写临时文件再 rename）"""
+    added_dir = added_documents_dir(documents_path)
+    added_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = added_dir / f'.{name}.json.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(documents, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, added_dir / f'{name}.json')
+
+
+def load_saved_documents(documents_path):
+    """已保存的全部文档 {doc_id(int): record}：documents.json 与其后增量加入的各批"""
+    documents_path = Path(documents_path)
+    paths = [documents_path] if documents_path.exists() else []
+    paths += sorted(added_documents_dir(documents_path).glob('*.json'))
+
+    documents = {}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            documents.update((int(doc_id), record) for doc_id, record in json.load(f).items())
+    return documents
+
+
+class DocStore:
+    """只读文档存储：偏移表与数据均为内存映射，按需解压所在块"""
+
+    def __init__(self, store_dir):
+        self.store_dir = Path(store_dir)
+        with open(self.store_dir / META_FILE, 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        self._table = _open_array(self.store_dir / TABLE_FILE, np.int32).reshape(-1, 2)
+        self._heads = _open_array(self.store_dir / HEADS_FILE, np.uint8)
+        self._bodies = _open_array(self.store_dir / BODIES_FILE, np.uint8)
+        self._head_offsets = _open_array(self.store_dir / HEAD_OFFSETS_FILE, np.uint64)
+        self._body_offsets = _open_array(self.store_dir / BODY_OFFSETS_FILE, np.uint64)
+        self._facets = None
+        if (self.store_dir / FACETS_FILE).exists():
+            self._facets = _open_array(self.store_dir / FACETS_FILE, np.uint64)
+
+        # 最近解压的块缓存在内存中，常驻内存与语料规模无关
+        cache_blocks = INDEX_CONFIG['docstore']['cache_blocks']
+        self._head_block = lru_cache(maxsize=cache_blocks)(self._decode_head_block)
+        self._body_block = lru_cache(maxsize=cache_blocks)(self._decode_body_block)
+
+    @staticmethod
+    def exists(store_dir):
+        return (Path(store_dir) / META_FILE).exists()
+
+    def __len__(self):
+        return self.meta['num_docs']
+
+    def __contains__(self, doc_id):
+        return self._locate(doc_id) is not None
+
+    def _locate(self, doc_id):
+        doc_id = int(doc_id)
+        if doc_id < 0 or doc_id >= len(self._table):
+            return None
+        block, slot = self._table[doc_id]
+        if block < 0:
+            return None
+        return int(block), int(slot)
+
+    def _decode_head_block(self, block):
+        start, end = int(self._head_offsets[block]), int(self._head_offsets[block + 1])
+        return json.loads(zlib.decompress(self._heads[start:end]))
+
+    def _decode_body_block(self, block):
+        start, end = int(self._body_offsets[block]), int(self._body_offsets[block + 1])
+        return json.loads(zlib.decompress(self._bodies[start:end]))
+
+    def get_head(self, doc_id):
+        """文档元数据（标题、URL、语言等，不含正文），不存在时返回 None"""
+        location = self._locate(doc_id)
+        if location is None:
+            return None
+        block, slot = location
+        return dict(self._head_block(block)[slot])
+
+    def get(self, doc_id):
+        """完整文档记录，不存在时返回 None"""
+        location = self._locate(doc_id)
+        if location is None:
+            return None
+        block, slot = location
+        return dict(self._head_block(block)[slot], **self._body_block(block)[slot])
+
+    def __getitem__(self, doc_id):
+        doc = self.get(doc_id)
+        if doc is None:
+            raise KeyError(doc_id)
+        return doc
+
+    def facet(self, field, value):
+        """字段取值为 value 的文档位图（uint64，第 i 位对应文档 i），未建立该过滤时返回 None"""
+        facets = self.meta.get('facets', {})
+        if self._facets is None or field not in facets:
+            return None
+        num_words = self.meta['facet_words']
+        i = facets[field].get(str(value))
+        if i is None:
+            return np.zeros(num_words, dtype=np.uint64)
+        return self._facets[i * num_words:(i + 1) * num_words]
+
+    def facet_values(self, field):
+        """某过滤字段的全部取值"""
+        return sorted(self.meta.get('facets', {}).get(field, {}))
+
+    def doc_ids(self):
+        """全部文档ID（升序）"""
+        return np.flatnonzero(self._table[:, 0] >= 0)
+
+    def items(self):
+        """按ID顺序遍历 (doc_id, record)，逐块解压"""
+        for doc_id in self.doc_ids().tolist():
+            yield doc_id, self.get(doc_id)
+
+
+_open_stores = {}
+_open_lock = threading.Lock()
+
+
+def open_docstore(store_dir=None, documents_path=None):
+    """打开文档存储，同一进程内共享同一实例
+
+    已有的文档存储可能正被其他进程内存映射，这里从不改写：它比 documents.json 旧时（例如 LDA
+    写回了主题字段）给出警告并继续使用已发布的内容，由索引器重建并发布新的一代。缺少文档存储时
+    （如旧版布局）由已保存的文档构建在临时目录中，完成后改名就位。
+    未指定 store_dir 时打开索引清单所指的当前一代文档存储。
+    """
+    if store_dir is None:
+        _, _, store_dir = resolve_generation(INDEX_CONFIG['index_dir'], INDEX_CONFIG['docstore']['dir'])
+    store_dir = Path(store_dir)
+    documents_path = Path(documents_path or INDEX_CONFIG['documents_path'])
+
+    with _open_lock:
+        store = _open_stores.get(store_dir)
+        if store is not None:
+            return store
+
+        if not DocStore.exists(store_dir):
+            _build_missing(store_dir, documents_path)
+        elif _is_stale(store_dir, documents_path):
+            print(f"文档存储 {store_dir} 早于 {documents_path}，继续使用已发布的文档存储；"
+                  "请重建索引（python -m indexer.multilingual_indexer --rebuild）")
+
+        store = _open_stores[store_dir] = DocStore(store_dir)
+        return store
+
+
+def _build_missing(store_dir, documents_path):
+    """构建缺失的文档存储：写在同级以 . 开头的临时目录中（清理代目录时跳过），完成后改名就位"""
+    store_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix='.build-', dir=store_dir.parent))
+    try:
+        build_docstore(load_saved_documents(documents_path), tmp_dir)
+        try:
+            os.rename(tmp_dir, store_dir)
+        except OSError:
+            # 其他进程已先建好
+            if not DocStore.exists(store_dir):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def close_docstore(store_dir):
+    """移出进程内共享的文档存储实例，最后一个引用释放后内存映射随之释放"""
+    with _open_lock:
+        _open_stores.pop(Path(store_dir), None)
+
+
+def _is_stale(store_dir, documents_path):
+    """文档存储是否早于 documents.json（或缺少过滤位图）"""
+    meta_path = Path(store_dir) / META_FILE
+    if not meta_path.exists():
+        return True
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        if 'facets' not in json.load(f) and documents_path.exists():
+            return True
+    if not documents_path.exists():
+        return False
+    return documents_path.stat().st_mtime > meta_path.stat().st_mtime
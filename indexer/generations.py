@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from .binary_index import load_meta
+
+
+# 索引根目录下的清单，指向当前生效的一代索引
+MANIFEST_FILE = 'manifest.json'
+GENERATION_PREFIX = 'gen_'
+# 增量段所在的子目录（见 indexer.segments），段被多代共用，写成后不再修改
+SEGMENTS_DIR = 'segments'
+
+
+def generation_name(generation):
+    """第 generation 代索引（与文档存储）的子目录名"""
+    return f'{GENERATION_PREFIX}{generation:06d}'
+
+
+def read_manifest(index_dir):
+    """读取清单 {'generation', 'name', 'docstore'}，不存在时返回 None"""
+    manifest_path = Path(index_dir) / MANIFEST_FILE
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def current_generation(index_dir):
+    """当前生效的索引代号；没有清单（旧版就地写入的索引）时取 meta.json 中的代号"""
+    manifest = read_manifest(index_dir)
+    if manifest is not None:
+        return manifest['generation']
+    meta = load_meta(index_dir)
+    return meta.get('generation', 0) if meta else 0
+
+
+def resolve_generation(index_dir, docstore_dir):
+    """返回当前一代的 (代号, 索引目录, 文档存储目录)
+
+    有清单时两者都是各自根目录下的代目录，文档存储默认与索引同名（只合并索引段的一代
+    沿用此前的文档存储）；否则为旧版布局，直接使用根目录。
+    """
+    index_dir, docstore_dir = Path(index_dir), Path(docstore_dir)
+    manifest = read_manifest(index_dir)
+    if manifest is None:
+        return current_generation(index_dir), index_dir, docstore_dir
+    return (manifest['generation'], index_dir / manifest['name'],
+            docstore_dir / manifest.get('docstore', manifest['name']))
+
+
+def current_docstore(index_dir):
+    """当前一代所用文档存储的代目录名，没有清单时返回 None"""
+    manifest = read_manifest(index_dir)
+    if manifest is None:
+        return None
+    return manifest.get('docstore', manifest['name'])
+
+
+def publish_generation(index_dir, generation, docstore=None):
+    """原子地切换清单到第 generation 代（先写临时文件再 rename），查询进程据此热加载
+
+    docstore 为该代沿用的文档存储代目录名，为空时使用同名的文档存储。
+    """
+    index_dir = Path(index_dir)
+    name = generation_name(generation)
+    tmp_path = index_dir / (MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'generation': generation, 'name': name, 'docstore': docstore or name}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, index_dir / MANIFEST_FILE)
+
+
+def prune_generations(root, keep):
+    """删除 root 下较旧的代目录，只保留最新的 keep 代
+
+    上一代通常仍被正在排空的查询进程内存映射；POSIX 上删除已映射的文件不影响
+    已打开的映射，因此保留两代即可。保留的分段索引（meta 中的 segments）引用的段与代目录
+    一并保留，其余的段删除（以 . 开头的为正在写入的合并结果，跳过）。
+    """
+    root = Path(root)
+    if not root.exists():
+        return
+    generations = sorted(path for path in root.iterdir()
+                         if path.is_dir() and path.name.startswith(GENERATION_PREFIX))
+    kept = generations[-keep:] if keep > 0 else []
+    referenced = {Path(segment) for path in kept for segment in (load_meta(path) or {}).get('segments', [])}
+    in_use = {segment.parts[0] for segment in referenced if segment.parts}
+    for path in generations[:-keep] if keep > 0 else generations:
+        if path.name not in in_use:
+            shutil.rmtree(path, ignore_errors=True)
+
+    segments_root = root / SEGMENTS_DIR
+    if segments_root.exists():
+        for path in segments_root.iterdir():
+            if path.is_dir() and not path.name.startswith('.') and Path(SEGMENTS_DIR, path.name) not in referenced:
+                shutil.rmtree(path, ignore_errors=True)
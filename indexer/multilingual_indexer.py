@@ -1,16 +1,38 @@
 import json
+import os
+import shutil
+import tempfile
+import threading
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
+import jieba
 from tqdm import tqdm  # 进度条库
 from config.settings import INDEX_CONFIG
 from utils.tokenizer import tokenize
-from utils.helpers import load_stopwords
+from utils.helpers import load_stopwords, sentence_offsets, JsonObjectWriter
+from indexer.binary_index import write_index
+from indexer.parallel_build import PartialIndex, build_partial, write_merged, write_part
+from indexer.synonym_groups import SynonymGroups
+from indexer.segments import SegmentMerger, current_segments, publish_segments, segment_path, write_segment
+from indexer.docstore import (DocStore, DocStoreWriter, added_documents_dir, build_docstore, extend_docstore,
+                              load_saved_documents, write_added_documents, _is_stale)
+from indexer.generations import (current_generation, generation_name, publish_generation, prune_generations,
+                                 resolve_generation)
+
+# 外存构建估算内存中倒排的大小：每条倒排记录（倒排、位置与标题词频字典中的表项，摊入词项本身）
+# 与每个词位置大致占用的字节数（CPython 实测）
+POSTING_BYTES = 200
+POSITION_BYTES = 24
 
 
 class MultilingualIndexer:
-    def __init__(self):
-        self.index_dir = Path(INDEX_CONFIG['index_dir'])
-        self.documents_path = Path(INDEX_CONFIG['documents_path'])
+    def __init__(self, index_dir=None, documents_path=None, docstore_dir=None):
+        # 默认使用配置中的路径，基准测试等场景可指定其他目录
+        self.index_dir = Path(index_dir or INDEX_CONFIG['index_dir'])
+        self.documents_path = Path(documents_path or INDEX_CONFIG['documents_path'])
+        self.docstore_dir = Path(docstore_dir or INDEX_CONFIG['docstore']['dir'])
         self.stopwords = {
             lang: load_stopwords(path)
             for lang, path in INDEX_CONFIG['stopwords'].items()
@@ -18,9 +40,20 @@ class MultilingualIndexer:
 
         # 数据结构
         self.inverted_index = defaultdict(dict)
+        self.positions = defaultdict(dict) if INDEX_CONFIG['positions'] else None
+        self.title_tfs = defaultdict(dict)
         self.documents = {}
         self.doc_lengths = {}
         self.avg_doc_length = 0
+        self.buffered_postings = 0   # 内存中倒排的记录数与词位置数，外存构建据此估计内存占用
+        self.buffered_positions = 0
+
+        # 可选：为每个同义词组写入合并的倒排（组词项），查询时同义词扩展只读一条倒排
+        self.synonym_groups = SynonymGroups() if INDEX_CONFIG['synonym_groups'] else None
+
+        # 发布新一代（整体构建、增量段、后台合并）互斥；合并段在后台线程中进行
+        self._publish_lock = threading.Lock()
+        self.merger = SegmentMerger(self.index_dir, self.docstore_dir, self._publish_lock)
 
         # 创建目录（如果不存在）
         self.index_dir.mkdir(parents=True, exist_ok=True)
@@ -42,15 +75,33 @@ class MultilingualIndexer:
             if not tokens:
                 return 0  # 跳过空内容文档
 
-            # 词频统计（过滤停用词和短词）
-            term_freq = defaultdict(int)
-            for token in tokens:
+            # 词频与词位置统计（过滤停用词和短词，位置按分词结果中的下标计）
+            term_positions = defaultdict(list)
+            for position, token in enumerate(tokens):
                 if len(token) > 1 and token not in self.stopwords[language]:
-                    term_freq[token] += 1
+                    term_positions[token].append(position)
+
+            # 同义词组词项：组内任一成员（词或短语）出现即记一次，位置为成员首词位置
+            if self.synonym_groups is not None:
+                term_positions.update(self.synonym_groups.scan(tokens))
+
+            # 标题字段词频，供 BM25F 加权
+            title_tokens = tokenize(document['title'], language)
+            for token in title_tokens:
+                if token in term_positions:
+                    self.title_tfs[token][doc_id] = self.title_tfs[token].get(doc_id, 0) + 1
+            if self.synonym_groups is not None:
+                for term, positions in self.synonym_groups.scan(title_tokens).items():
+                    if term in term_positions:
+                        self.title_tfs[term][doc_id] = len(positions)
 
             # 更新倒排索引
-            for term, tf in term_freq.items():
-                self.inverted_index[term][doc_id] = tf
+            for term, positions in term_positions.items():
+                self.inverted_index[term][doc_id] = len(positions)
+                if self.positions is not None:
+                    self.positions[term][doc_id] = positions
+            self.buffered_postings += len(term_positions)
+            self.buffered_positions += sum(map(len, term_positions.values()))
 
             # 存储文档元数据
             self.documents[doc_id] = {
@@ -58,7 +109,10 @@ class MultilingualIndexer:
                 'title': document['title'],
                 'content': document['content'],
                 'language': language,
-                'length': len(tokens)
+                'length': len(tokens),
+                'title_length': len(title_tokens),
+                # 句子起始偏移，查询时据此直接截取摘要
+                'sentences': sentence_offsets(document['content'], language)
             }
 
             return len(tokens)
@@ -67,12 +121,25 @@ class MultilingualIndexer:
             print(f"\n处理文档 {doc_id} 时出错: {str(e)}")
             return 0
 
-    def build_from_raw_data(self, raw_data_dir):
-        """从原始数据构建索引"""
+    def build_from_raw_data(self, raw_data_dir, workers=None):
+        """从原始数据构建索引
+
+        workers（默认取 INDEX_CONFIG['build_workers']）大于 1 时用多进程并行构建，结果与串行相同。
+        设置了 INDEX_CONFIG['memory_budget'] 时改用内存受限的单遍外存构建（结果同样相同）。
+        """
         files = list(Path(raw_data_dir).glob('*.json'))
         if not files:
             raise FileNotFoundError(f"未找到JSON文件于: {raw_data_dir}")
 
+        if INDEX_CONFIG['memory_budget']:
+            self._build_external(files)
+            return
+
+        workers = workers or INDEX_CONFIG['build_workers']
+        if workers > 1 and len(files) > 1:
+            self._build_parallel(files, workers)
+            return
+
         total_length = 0
 
         # 使用tqdm进度条
@@ -103,31 +170,245 @@ class MultilingualIndexer:
 
         self.save_index()
 
-    def save_index(self):
-        """保存索引到文件"""
-        # 保存倒排索引
-        with open(self.index_dir / 'inverted_index.json', 'w', encoding='utf-8') as f:
-            json.dump(self.inverted_index, f, ensure_ascii=False, indent=2)
+    def _build_parallel(self, files, workers):
+        """多进程构建（map-reduce）
+
+        map：文件按顺序切成若干段分给进程池，各进程分词并建出一段的部分索引（词项按段内
+        字典序编号）。reduce：按词项区间把各部分索引再分给进程池，各进程 k 路归并、编码并
+        写出一个区间，最后按词项顺序拼接。文档ID仍为文件序号，各段的文档ID区间依次递增，
+        写出的索引与文档存储与串行构建完全相同。
+        """
+        # 段数多于进程数，各进程负载更均衡；主进程先加载 jieba 词典，fork 出的进程直接共用
+        chunk_size = max(1, -(-len(files) // (workers * 4)))
+        starts = list(range(0, len(files), chunk_size))
+        jieba.initialize()
+
+        paths = {'index_dir': self.index_dir, 'documents_path': self.documents_path,
+                 'docstore_dir': self.docstore_dir}
+        partials = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            with tqdm(total=len(files), desc="🔄 构建索引", unit="doc",
+                      bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]") as pbar:
+                futures = [pool.submit(build_partial, paths, start, files[start:start + chunk_size])
+                           for start in starts]
+                for start, future in zip(starts, futures):
+                    partials.append(future.result())
+                    pbar.update(len(files[start:start + chunk_size]))
+
+            total_length = 0
+            for part in partials:
+                self.documents.update(part.documents)
+                total_length += part.total_length
+
+            # 计算平均文档长度
+            if len(self.documents) > 0:
+                self.avg_doc_length = total_length / len(self.documents)
+
+            self.save_index(partial(write_merged, pool, workers, partials))
+
+    def _build_external(self, files):
+        """单遍外存构建（SPIMI）
+
+        倒排在内存中累积，估计大小达到 INDEX_CONFIG['memory_budget'] 时按词项排序写成磁盘上的
+        一个 run 并清空；文档记录逐篇写入 documents.json 与文档存储，内存中只留各文档的长度。
+        最后对各 run（内存映射）做流式 k 路归并写出索引，峰值内存约为预算加上单个词项的倒排。
+        """
+        budget = INDEX_CONFIG['memory_budget']
+        runs_root = Path(tempfile.mkdtemp(prefix='.runs-', dir=self.index_dir))
+        self.docstore_dir.mkdir(parents=True, exist_ok=True)
+        store_dir = Path(tempfile.mkdtemp(prefix='.build-', dir=self.docstore_dir))
+        documents_tmp = self.documents_path.with_name(self.documents_path.name + '.tmp')
+        runs, lengths, total_length = [], {}, 0
+        try:
+            store = DocStoreWriter(store_dir)
+            with open(documents_tmp, 'w', encoding='utf-8') as f:
+                records = JsonObjectWriter(f)
+                with tqdm(files, desc="🔄 构建索引", unit="doc",
+                          bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]") as pbar:
+                    for doc_id, filepath in enumerate(pbar):
+                        try:
+                            with open(filepath, 'r', encoding='utf-8') as doc_file:
+                                document = json.load(doc_file)
+                            total_length += self.process_document(doc_id, document)
+                        except json.JSONDecodeError:
+                            pbar.write(f"⚠️ 文件解析失败: {filepath.name}")
+                        except Exception as e:
+                            pbar.write(f"⚠️ 处理 {filepath.name} 时出错: {str(e)}")
+
+                        record = self.documents.pop(doc_id, None)
+                        if record is not None:
+                            records.write(doc_id, record)
+                            store.add(doc_id, record)
+                            lengths[doc_id] = {'length': record['length'], 'title_length': record['title_length']}
+
+                        if self.buffered_postings * POSTING_BYTES + self.buffered_positions * POSITION_BYTES >= budget:
+                            runs.append(self._flush_run(runs_root / f'run_{len(runs)}'))
+                            pbar.set_postfix({'runs': len(runs)})
+                    if self.inverted_index:
+                        runs.append(self._flush_run(runs_root / f'run_{len(runs)}'))
+                records.close()
+            # 文档存储须晚于 documents.json 写完，否则会被判定为过期
+            store.finish()
+
+            self.documents = lengths
+            if len(self.documents) > 0:
+                self.avg_doc_length = total_length / len(self.documents)
+            self.save_index(lambda index_dir, *args: write_part(index_dir, runs, *args), (documents_tmp, store_dir))
+        finally:
+            shutil.rmtree(runs_root, ignore_errors=True)
+            shutil.rmtree(store_dir, ignore_errors=True)
+            documents_tmp.unlink(missing_ok=True)
+
+    def _flush_run(self, run_dir):
+        """把内存中的倒排按词项排序写成一个 run 并清空，返回其内存映射的 PartialIndex"""
+        PartialIndex.from_indexer(self, 0).save(run_dir)
+        self.inverted_index = defaultdict(dict)
+        self.positions = defaultdict(dict) if INDEX_CONFIG['positions'] else None
+        self.title_tfs = defaultdict(dict)
+        self.buffered_postings = self.buffered_positions = 0
+        return PartialIndex.load(run_dir)
+
+    def rebuild_from_documents(self):
+        """由已保存的文档（documents.json 与增量加入的各批）重新建索引并发布为新的一代
+
+        同义词词典变化后用它重建同义词组倒排（查询时发现索引中的组与当前词典不一致，
+        会退回不使用组词项）。documents.json 中的其他字段（如 LDA 写入的主题）原样保留。
+        """
+        documents = load_saved_documents(self.documents_path)
+
+        total_length = 0
+        for doc_id, document in tqdm(documents.items(), desc="🔄 重建索引", unit="doc"):
+            total_length += self.process_document(doc_id, document)
+            if doc_id in self.documents:
+                for key, value in document.items():
+                    self.documents[doc_id].setdefault(key, value)
+
+        if len(self.documents) > 0:
+            self.avg_doc_length = total_length / len(self.documents)
+
+        self.save_index()
+
+    def add_documents(self, documents, merge=None):
+        """把新抓取的一批文档（与原始数据相同的 {'title', 'content', 'url'} 记录）增量加入索引
+
+        新文档接在已有文档ID之后编号，写成一个不可变的段，与当前一代的各段一起发布为新的一代，
+        查询进程热加载后即可检索，无需重建整个索引。新文档的记录单独写成一批（documents.d/ 下，
+        documents.json 不变），文档存储在当前一代之后追加，每批的写入量只与新文档有关。
+        merge（默认取 INDEX_CONFIG['segments']['background_merge']）为真时随后在后台线程中
+        按分层策略合并段（merger.wait() 等待其结束）。返回新文档的ID列表。
+        """
+        with self._publish_lock:
+            self.documents = {}
+            self.inverted_index = defaultdict(dict)
+            self.positions = defaultdict(dict) if INDEX_CONFIG['positions'] else None
+            self.title_tfs = defaultdict(dict)
+
+            start = self._next_doc_id()
+            for doc_id, document in enumerate(tqdm(documents, desc="➕ 增量索引", unit="doc"), start):
+                self.process_document(doc_id, document)
+            added = self.documents
+            if not added:
+                print("\n没有可加入索引的新文档")
+                return []
+
+            generation = current_generation(self.index_dir) + 1
+            path = segment_path(generation)
+            write_segment(self.index_dir / path, self.inverted_index,
+                          {doc_id: doc['length'] for doc_id, doc in added.items()}, start,
+                          self.positions, self.title_tfs,
+                          {doc_id: doc['title_length'] for doc_id, doc in added.items()}, generation,
+                          self.synonym_groups.digest if self.synonym_groups is not None else None)
+
+            # 当前文档存储未过期时只追加新文档，已过期（如 LDA 写回了主题）时由全部文档重建
+            name = generation_name(generation)
+            write_added_documents(self.documents_path, name, added)
+            _, _, docstore_dir = resolve_generation(self.index_dir, self.docstore_dir)
+            if DocStore.exists(docstore_dir) and not _is_stale(docstore_dir, self.documents_path):
+                extend_docstore(docstore_dir, self.docstore_dir / name, added)
+            else:
+                build_docstore(load_saved_documents(self.documents_path), self.docstore_dir / name)
+
+            publish_segments(self.index_dir, self.docstore_dir, current_segments(self.index_dir) + [path], generation)
+            print(f"\n✅ 新增 {len(added)} 篇文档: {self.index_dir / path}")
+
+        if INDEX_CONFIG['segments']['background_merge'] if merge is None else merge:
+            self.merger.schedule()
+        return sorted(added)
+
+    def _next_doc_id(self):
+        """新文档的起始ID：当前一代文档存储（没有时为已保存的文档）中最大的文档ID加一"""
+        _, _, docstore_dir = resolve_generation(self.index_dir, self.docstore_dir)
+        if DocStore.exists(docstore_dir):
+            doc_ids = DocStore(docstore_dir).doc_ids()
+            return int(doc_ids[-1]) + 1 if len(doc_ids) else 0
+        return max(load_saved_documents(self.documents_path), default=-1) + 1
+
+    def save_index(self, write=None, stored=None):
+        """保存索引到文件
+
+        每次写入新的一代目录，写完后原子切换索引清单，正在运行的查询进程据此热加载；
+        旧的代目录只保留 INDEX_CONFIG['keep_generations'] 代。整体重建后此前的增量段不再使用，随旧代清理；
+        增量加入的各批文档已写入（或不再属于）新的 documents.json，一并删除。
+        write 为并行构建时写出索引的函数（参数同 write_postings，不含 term_postings），
+        为空时写入内存中的倒排索引。stored 为外存构建时已逐篇写出的
+        (documents.json 临时文件, 文档存储临时目录)，此时 self.documents 只有各文档的长度。
+        """
+        with self._publish_lock:
+            generation = current_generation(self.index_dir) + 1
+            name = generation_name(generation)
+
+            # 保存倒排索引与元数据（内存映射的二进制格式）
+            doc_lengths = {doc_id: doc['length'] for doc_id, doc in self.documents.items()}
+            title_lengths = {doc_id: doc['title_length'] for doc_id, doc in self.documents.items()}
+            synonyms = self.synonym_groups.digest if self.synonym_groups is not None else None
+            if write is None:
+                write_index(self.index_dir / name, self.inverted_index, doc_lengths, self.avg_doc_length,
+                            self.positions, self.title_tfs, title_lengths, INDEX_CONFIG['shards'],
+                            generation, synonyms)
+            else:
+                write(self.index_dir / name, doc_lengths, self.avg_doc_length, self.positions is not None,
+                      title_lengths, INDEX_CONFIG['shards'], generation, synonyms)
+
+            if stored is None:
+                # 保存文档数据（先写临时文件再 rename，中途失败不影响原有的 documents.json）
+                documents_tmp = self.documents_path.with_name(self.documents_path.name + '.tmp')
+                with open(documents_tmp, 'w', encoding='utf-8') as f:
+                    json.dump(self.documents, f, ensure_ascii=False, indent=2)
+                os.replace(documents_tmp, self.documents_path)
+                shutil.rmtree(added_documents_dir(self.documents_path), ignore_errors=True)
 
-        # 保存元数据
-        with open(self.index_dir / 'meta.json', 'w', encoding='utf-8') as f:
-            json.dump({
-                'doc_lengths': {doc_id: doc['length']
-                                for doc_id, doc in self.documents.items()},
-                'avg_doc_length': self.avg_doc_length,
-                'total_docs': len(self.documents)
-            }, f, ensure_ascii=False, indent=2)
+                # 查询与 RAG 共用的文档存储（须晚于 documents.json 写出，否则会被判定为过期）
+                build_docstore(self.documents, self.docstore_dir / name)
+            else:
+                documents_tmp, store_dir = stored
+                os.replace(documents_tmp, self.documents_path)
+                shutil.rmtree(added_documents_dir(self.documents_path), ignore_errors=True)
+                os.replace(store_dir, self.docstore_dir / name)
 
-        # 保存文档数据
-        with open(self.documents_path, 'w', encoding='utf-8') as f:
-            json.dump(self.documents, f, ensure_ascii=False, indent=2)
+            publish_generation(self.index_dir, generation)
+            prune_generations(self.index_dir, INDEX_CONFIG['keep_generations'])
+            prune_generations(self.docstore_dir, INDEX_CONFIG['keep_generations'])
 
-        print(f"\n✅ 索引构建完成！保存到: {self.index_dir}")
+        print(f"\n✅ 索引构建完成！保存到: {self.index_dir / name}")
 
 
 if __name__ == "__main__":
+    import sys
     try:
         indexer = MultilingualIndexer()
-        indexer.build_from_raw_data('../data/raw_clean')  # 修改为您的实际路径
+        if '--rebuild' in sys.argv:
+            # 由 documents.json 重建（如同义词词典变化后）
+            indexer.rebuild_from_documents()
+        elif '--add' in sys.argv:
+            # 增量加入新抓取的一批文档：python -m indexer.multilingual_indexer --add <目录>
+            files = sorted(Path(sys.argv[sys.argv.index('--add') + 1]).glob('*.json'))
+            documents = []
+            for filepath in files:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    documents.append(json.load(f))
+            indexer.add_documents(documents)
+            indexer.merger.wait()  # 合并线程为守护线程，命令行等它完成再退出
+        else:
+            indexer.build_from_raw_data('../data/raw_clean')  # 修改为您的实际路径
     except Exception as e:
         print(f"❌ 索引构建失败: {str(e)}")
\ No newline at end of file
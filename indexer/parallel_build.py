@@ -0,0 +1,212 @@
+import heapq
+import json
+import shutil
+import tempfile
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+import numpy as np
+from tqdm import tqdm
+from indexer.binary_index import (BLOCK_SIZE, LEXICON_FILE, TERM_OFFSETS_FILE, concat_indexes, write_postings,
+                                  write_term_dictionary, _Lexicon, _open_array)
+
+
+# 部分索引写到磁盘（外存构建的 run）时的数组文件（.npy），词项表另存为 lexicon + term_offsets
+RUN_ARRAYS = ('offsets', 'doc_ids', 'tfs', 'title_tfs', 'positions', 'pos_offsets')
+
+
+class PartialIndex:
+    """一段文档的部分索引：词项按字典序编号，各词项的倒排按编号顺序连续存放在扁平数组中
+
+    offsets[i]:offsets[i + 1] 为词项 i 的倒排记录区间；positions 为按记录顺序拼接的词位置，
+    每条记录的位置个数等于其词频。相比嵌套字典，扁平数组在进程间传递时序列化很快，
+    也可以用 save 写到磁盘、load 内存映射读回（外存构建的 run）。
+    """
+
+    def __init__(self, terms, offsets, doc_ids, tfs, title_tfs, positions, documents, total_length,
+                 pos_offsets=None):
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.title_tfs = title_tfs
+        self.positions = positions
+        self.documents = documents
+        self.total_length = total_length
+        self._pos_offsets = pos_offsets
+        if positions is not None and pos_offsets is None:
+            self._pos_offsets = np.zeros(len(tfs) + 1, dtype=np.int64)
+            np.cumsum(tfs, out=self._pos_offsets[1:])
+
+    @classmethod
+    def from_indexer(cls, indexer, total_length):
+        """由处理完一段文档的 MultilingualIndexer 的内存结构生成"""
+        terms = sorted(indexer.inverted_index)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        doc_ids, tfs, title_tfs, positions = array('I'), array('I'), array('I'), array('I')
+        for i, term in enumerate(terms):
+            postings = sorted(indexer.inverted_index[term].items())
+            offsets[i + 1] = offsets[i] + len(postings)
+            doc_ids.extend(doc_id for doc_id, _ in postings)
+            tfs.extend(tf for _, tf in postings)
+            term_title_tfs = indexer.title_tfs.get(term, {})
+            title_tfs.extend(term_title_tfs.get(doc_id, 0) for doc_id, _ in postings)
+            if indexer.positions is not None:
+                for doc_id, _ in postings:
+                    positions.extend(indexer.positions[term][doc_id])
+
+        return cls(terms, offsets,
+                   np.frombuffer(doc_ids, dtype=np.uint32), np.frombuffer(tfs, dtype=np.uint32),
+                   np.frombuffer(title_tfs, dtype=np.uint32),
+                   np.frombuffer(positions, dtype=np.uint32) if indexer.positions is not None else None,
+                   indexer.documents, total_length)
+
+    def save(self, run_dir):
+        """把词项与倒排写到 run_dir（不含文档信息）"""
+        run_dir = Path(run_dir)
+        write_term_dictionary(run_dir, self.terms, np.diff(self.offsets))
+        arrays = {'offsets': self.offsets, 'doc_ids': self.doc_ids, 'tfs': self.tfs, 'title_tfs': self.title_tfs,
+                  'positions': self.positions,
+                  'pos_offsets': self._pos_offsets if self.positions is not None else None}
+        for name, values in arrays.items():
+            if values is not None:
+                np.save(run_dir / f'{name}.npy', values)
+
+    @classmethod
+    def load(cls, run_dir):
+        """内存映射打开 save 写出的部分索引，词项按需从词项表解码"""
+        run_dir = Path(run_dir)
+        arrays = {name: np.load(run_dir / f'{name}.npy', mmap_mode='r')
+                  for name in RUN_ARRAYS if (run_dir / f'{name}.npy').exists()}
+        return cls(_RunTerms(run_dir), arrays['offsets'], arrays['doc_ids'], arrays['tfs'], arrays['title_tfs'],
+                   arrays.get('positions'), None, 0, arrays.get('pos_offsets'))
+
+    def slice(self, lo, hi):
+        """词项在 [lo, hi) 内的部分（lo / hi 为 None 时该侧不设界），不含文档信息"""
+        first = 0 if lo is None else bisect_left(self.terms, lo)
+        last = len(self.terms) if hi is None else bisect_left(self.terms, hi)
+        a, b = self.offsets[first], self.offsets[last]
+        positions = None
+        if self.positions is not None:
+            positions = self.positions[self._pos_offsets[a]:self._pos_offsets[b]]
+        return PartialIndex(self.terms[first:last], self.offsets[first:last + 1] - a,
+                            self.doc_ids[a:b], self.tfs[a:b], self.title_tfs[a:b], positions, None, 0)
+
+    def postings(self, term_id):
+        """词项 term_id 的 (文档ID, 词频, 每条记录的位置列表或 None, 标题词频)"""
+        lo, hi = self.offsets[term_id], self.offsets[term_id + 1]
+        positions = None
+        if self.positions is not None:
+            starts = self._pos_offsets[lo:hi + 1]
+            positions = [self.positions[a:b] for a, b in zip(starts[:-1], starts[1:])]
+        return self.doc_ids[lo:hi], self.tfs[lo:hi], positions, self.title_tfs[lo:hi]
+
+
+class _RunTerms:
+    """磁盘上部分索引的有序词项表（内存映射），按下标取词"""
+
+    def __init__(self, run_dir):
+        self._lexicon = _Lexicon(run_dir / LEXICON_FILE, _open_array(run_dir / TERM_OFFSETS_FILE, np.uint64))
+
+    def __len__(self):
+        return len(self._lexicon)
+
+    def __getitem__(self, i):
+        return self._lexicon[i].decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def build_partial(paths, start, files):
+    """在工作进程中处理 files（文档ID从 start 起依次编号），返回 PartialIndex"""
+    from indexer.multilingual_indexer import MultilingualIndexer
+
+    indexer = MultilingualIndexer(**paths)
+    total_length = 0
+    for doc_id, filepath in enumerate(files, start):
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                document = json.load(f)
+            total_length += indexer.process_document(doc_id, document)
+        except json.JSONDecodeError:
+            tqdm.write(f"⚠️ 文件解析失败: {filepath.name}")
+        except Exception as e:
+            tqdm.write(f"⚠️ 处理 {filepath.name} 时出错: {str(e)}")
+    return PartialIndex.from_indexer(indexer, total_length)
+
+
+def merge_partials(partials):
+    """按词项字典序 k 路归并各部分索引，产生 (词项, 文档ID, 词频, 位置, 标题词频)
+
+    partials 须按文档ID区间先后排列（各段文档ID互不重叠且递增），同一词项各段的倒排
+    依次拼接即为升序。
+    """
+    streams = [_keyed_terms(k, partial.terms) for k, partial in enumerate(partials)]
+    current, parts = None, []
+    for term, k, term_id in heapq.merge(*streams):
+        if term != current:
+            if parts:
+                yield _concat(current, parts)
+            current, parts = term, []
+        parts.append(partials[k].postings(term_id))
+    if parts:
+        yield _concat(current, parts)
+
+
+def _keyed_terms(k, terms):
+    for term_id, term in enumerate(terms):
+        yield term, k, term_id
+
+
+def _concat(term, parts):
+    if len(parts) == 1:
+        doc_ids, tfs, positions, title_tfs = parts[0]
+        return term, doc_ids, tfs, positions, title_tfs
+    positions = None
+    if parts[0][2] is not None:
+        positions = [p for part in parts for p in part[2]]
+    return (term, np.concatenate([part[0] for part in parts]), np.concatenate([part[1] for part in parts]),
+            positions, np.concatenate([part[3] for part in parts]))
+
+
+def split_terms(partials, parts):
+    """按词项把写出的工作量（每个词项计 1，另按倒排块数计）大致均分为 parts 段，返回各段起始词项"""
+    weights = {}
+    for partial in partials:
+        for term, count in zip(partial.terms, np.diff(partial.offsets).tolist()):
+            weights[term] = weights.get(term, 0) + 1 + count / BLOCK_SIZE
+    terms = sorted(weights)
+    cumulative = np.cumsum([weights[term] for term in terms])
+    cuts = np.searchsorted(cumulative, cumulative[-1] * np.arange(1, parts) / parts) if terms else []
+    starts = [None]
+    for cut in cuts:
+        if 0 < cut < len(terms) and (starts[-1] is None or terms[cut] > starts[-1]):
+            starts.append(terms[cut])
+    return starts
+
+
+def write_part(part_dir, partials, *args):
+    """在工作进程中 k 路归并一个词项区间的部分索引并写出（其余参数同 write_postings）"""
+    write_postings(part_dir, lambda: merge_partials(partials), *args)
+
+
+def write_merged(pool, workers, partials, index_dir, *args):
+    """归并阶段同样分给进程池：按词项区间切分各部分索引，各进程归并、编码并写出一个区间，
+    最后按词项顺序拼接为完整索引（其余参数同 write_postings，不含 term_postings）
+    """
+    starts = split_terms(partials, workers)
+    bounds = list(zip(starts, starts[1:] + [None]))
+
+    index_dir = Path(index_dir)
+    parts_root = Path(tempfile.mkdtemp(prefix='.merge-', dir=index_dir.parent))
+    part_dirs = [parts_root / f'part_{i}' for i in range(len(bounds))]
+    try:
+        futures = [pool.submit(write_part, part_dir, [partial.slice(lo, hi) for partial in partials], *args)
+                   for part_dir, (lo, hi) in zip(part_dirs, bounds)]
+        for future in futures:
+            future.result()
+        concat_indexes(index_dir, part_dirs)
+    finally:
+        shutil.rmtree(parts_root, ignore_errors=True)
@@ -0,0 +1,442 @@
+import heapq
+import json
+import os
+import shutil
+import tempfile
+import threading
+from bisect import bisect_right
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+from config.settings import INDEX_CONFIG
+from indexer.binary_index import (SHARDED_FORMAT_VERSION, META_FILE, IndexReader, IndexWriter,
+                                  TermDictionary, bm25_idf, load_meta, _dense, _dense_title_lengths,
+                                  _dict_postings, _write_terms)
+from indexer.generations import (SEGMENTS_DIR, current_docstore, current_generation, generation_name,
+                                 publish_generation, prune_generations, resolve_generation)
+from indexer.parallel_build import _concat, _keyed_terms
+
+
+SEGMENTED_FORMAT_VERSION = 'segmented-v1'  # 代目录的 meta.json 只列出各段（相对索引根目录的路径）与全局统计量
+SEGMENT_PREFIX = 'seg_'
+
+
+def segment_path(generation):
+    """第 generation 代新写入的段（每代至多新增一个段）相对索引根目录的路径"""
+    return f'{SEGMENTS_DIR}/{SEGMENT_PREFIX}{generation:06d}'
+
+
+def current_segments(index_dir):
+    """当前一代由哪些段组成（相对索引根目录的路径，按文档ID区间先后排列）
+
+    整体构建的索引本身即为一段，分片索引的每个分片各为一段；还没有索引时为空列表。
+    """
+    index_dir = Path(index_dir)
+    _, generation_dir, _ = resolve_generation(index_dir, index_dir)
+    meta = load_meta(generation_dir)
+    if meta is None:
+        return []
+    name = generation_dir.relative_to(index_dir).as_posix()
+    if meta.get('format') == SEGMENTED_FORMAT_VERSION:
+        return list(meta['segments'])
+    if meta.get('format') == SHARDED_FORMAT_VERSION:
+        return [f'{name}/{shard}' for shard in meta['shards']]
+    return [name]
+
+
+def write_segment(segment_dir, inverted_index, doc_lengths, doc_base, positions=None, title_tfs=None,
+                  title_lengths=None, generation=None, synonyms=None):
+    """把内存中一批新文档的倒排索引（参数含义同 write_index）写成一个段
+
+    段是 doc_base 起的一段文档ID区间上的普通二进制索引，段内使用相对 doc_base 的文档ID；
+    IDF、长度归一化等只按本段统计，查询时由 SegmentedIndex 按全部段重新计算。
+    """
+    dense_lengths = _dense(doc_lengths)[doc_base:]
+    total_docs = len(doc_lengths)
+    dense_title_lengths = None
+    if title_tfs is not None and title_lengths is not None:
+        dense_title_lengths = _dense_title_lengths(doc_base + len(dense_lengths), title_lengths)[doc_base:]
+
+    writer = IndexWriter(segment_dir, dense_lengths, float(dense_lengths.sum()) / max(total_docs, 1), total_docs,
+                         positions=positions is not None, title_lengths=dense_title_lengths,
+                         doc_base=doc_base, generation=generation, synonyms=synonyms)
+    postings = _dict_postings(inverted_index, positions, title_tfs if dense_title_lengths is not None else None)
+    _write_terms(writer, postings, (doc_base, doc_base + len(dense_lengths)))
+    writer.finish()
+
+
+def merge_segments(segment_dir, segments, generation=None):
+    """把文档ID区间相邻的若干段（IndexReader 列表，按区间先后排列）合并为一个段
+
+    按词项字典序 k 路归并各段的词项，同一词项各段的倒排依次拼接。位置与标题词频
+    只在所有段都有时保留。
+    """
+    base = segments[0].doc_base
+    end = segments[-1].doc_base + len(segments[-1].doc_lengths)
+    has_positions = all(segment.has_positions for segment in segments)
+    has_fields = all(segment.has_fields for segment in segments)
+
+    doc_lengths = np.zeros(end - base, dtype=np.uint32)
+    title_lengths = np.zeros(end - base, dtype=np.uint32) if has_fields else None
+    for segment in segments:
+        lo = segment.doc_base - base
+        doc_lengths[lo:lo + len(segment.doc_lengths)] = segment.doc_lengths
+        if has_fields:
+            title_lengths[lo:lo + len(segment.title_lengths)] = segment.title_lengths
+
+    total_docs = int(np.count_nonzero(doc_lengths))
+    synonyms = {segment.meta.get('synonyms') for segment in segments}
+    writer = IndexWriter(segment_dir, doc_lengths, float(doc_lengths.sum()) / max(total_docs, 1), total_docs,
+                         positions=has_positions, title_lengths=title_lengths, doc_base=base,
+                         generation=generation, synonyms=synonyms.pop() if len(synonyms) == 1 else None)
+    _write_terms(writer, _merged_postings(segments, has_positions, has_fields), (base, end))
+    writer.finish()
+
+
+def _merged_postings(segments, has_positions, has_fields):
+    """按字典序产生各段合并后的 (词项, 全局文档ID, 词频, 位置, 标题词频)"""
+    streams = [_keyed_terms(k, _terms(segment)) for k, segment in enumerate(segments)]
+    current, parts = None, []
+    for term, k, term_id in heapq.merge(*streams):
+        if term != current:
+            if parts:
+                yield _concat(current, parts)
+            current, parts = term, []
+        parts.append(_segment_postings(segments[k], term, term_id, has_positions, has_fields))
+    if parts:
+        yield _concat(current, parts)
+
+
+def _terms(segment):
+    for term_id in range(len(segment)):
+        yield segment.term(term_id)
+
+
+def _segment_postings(segment, term, term_id, has_positions, has_fields):
+    doc_ids, tfs, title_tfs = segment.field_postings_by_id(term_id)
+    positions = None
+    if has_positions:
+        _, flat = segment.positions(term, doc_ids)
+        positions = np.split(flat, np.cumsum(tfs, dtype=np.int64)[:-1])
+    return (doc_ids.astype(np.int64) + segment.doc_base, tfs, positions,
+            title_tfs if has_fields else None)
+
+
+def num_docs(segment):
+    """段中的文档数（分片 meta 中的 total_docs 是全局文档数，这里按文档长度数组计）"""
+    return int(np.count_nonzero(segment.doc_lengths))
+
+
+def write_segmented_meta(index_dir, segments, generation):
+    """写出由 segments（相对索引根目录的段路径）组成的一代：只有 meta.json，记录全局统计量
+
+    全部段写入同义词组倒排时所用词典一致时才记录其摘要，否则查询不使用组词项。
+    """
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    total_docs, total_length, synonyms = 0, 0, set()
+    for path in segments:
+        segment = IndexReader(index_dir.parent / path)
+        total_docs += num_docs(segment)
+        total_length += int(segment.doc_lengths.sum())
+        synonyms.add(segment.meta.get('synonyms'))
+
+    with open(index_dir / META_FILE, 'w', encoding='utf-8') as f:
+        json.dump({
+            'format': SEGMENTED_FORMAT_VERSION,
+            'generation': generation,
+            'segments': list(segments),
+            'avg_doc_length': total_length / total_docs if total_docs else 0,
+            'total_docs': total_docs,
+            'synonyms': synonyms.pop() if len(synonyms) == 1 else None
+        }, f, ensure_ascii=False, indent=2)
+
+
+def publish_segments(index_dir, docstore_dir, segments, generation, docstore=None):
+    """把 segments 组成的一代写出并原子发布，再清理不再使用的旧代与旧段
+
+    docstore 为沿用的文档存储代目录名（合并段时文档不变），为空时使用同名的新一代文档存储。
+    """
+    write_segmented_meta(Path(index_dir) / generation_name(generation), segments, generation)
+    publish_generation(index_dir, generation, docstore)
+    prune_generations(index_dir, INDEX_CONFIG['keep_generations'])
+    prune_generations(docstore_dir, INDEX_CONFIG['keep_generations'])
+
+
+def plan_merge(sizes, config=None):
+    """分层（LSM 式）合并策略：sizes 为按文档ID区间排列的各段文档数，返回应合并的段区间 [start, end) 或 None
+
+    段按文档数分层：小于 min_docs 的都在第 0 层，第 t 层为 [min_docs * f^t, min_docs * f^(t+1))，
+    f 为 merge_factor。同一层相邻的 f 个段合并为一段（约升一层），优先合并最低层；
+    合并结果超过 max_merged_docs 的不合并，已很大的段不会被反复重写。
+    """
+    config = config or INDEX_CONFIG['segments']
+    factor, min_docs = config['merge_factor'], config['min_docs']
+    tiers = [_tier(size, factor, min_docs) for size in sizes]
+
+    best = None
+    for start in range(len(sizes) - factor + 1):
+        window = set(tiers[start:start + factor])
+        if len(window) > 1 or sum(sizes[start:start + factor]) > config['max_merged_docs']:
+            continue
+        if best is None or tiers[start] < tiers[best]:
+            best = start
+    return None if best is None else (best, best + factor)
+
+
+def _tier(size, factor, min_docs):
+    """文档数为 size 的段所在的层（整数运算，恰为 min_docs * f^t 的段归入第 t 层）"""
+    tier = 0
+    while size >= min_docs * factor:
+        size //= factor
+        tier += 1
+    return tier
+
+
+def open_index(index_dir):
+    """打开一代（或一个分片）的单个二进制索引或分段索引"""
+    meta = load_meta(index_dir)
+    if meta is not None and meta.get('format') == SEGMENTED_FORMAT_VERSION:
+        return SegmentedIndex(index_dir, meta)
+    return IndexReader(index_dir)
+
+
+class SegmentedIndex:
+    """由若干不可变段组成的一代索引，对检索器表现为一个覆盖全部文档的 IndexReader
+
+    各段按文档ID区间先后排列。词项编号在首次查找时分配，记下其在各段中的编号；
+    df 为各段之和，IDF 按全部段的文档数重新计算，倒排与块信息由各段拼接并换算为
+    全局文档ID。段内的长度归一化与块最大得分只按本段统计，因此 matches_bm25 恒为假：
+    检索器按全局平均长度重算长度归一化，块剪枝使用宽松上界，得分与整体重建时一致。
+    """
+
+    def __init__(self, index_dir, meta=None):
+        self.index_dir = Path(index_dir)
+        self.meta = meta or load_meta(index_dir)
+        self.generation = self.meta['generation']
+        self.doc_base = 0
+        self.segments = [IndexReader(self.index_dir.parent / path) for path in self.meta['segments']]
+        self.total_docs = self.meta['total_docs']
+        self.avg_doc_length = self.meta['avg_doc_length']
+        self.has_positions = all(segment.has_positions for segment in self.segments)
+        self.has_fields = all(segment.has_fields for segment in self.segments)
+
+        # 全局的文档长度与标题长度数组（段间的空档补 0）
+        num_docs = max((s.doc_base + len(s.doc_lengths) for s in self.segments), default=0)
+        self.doc_lengths = np.zeros(num_docs, dtype=np.uint32)
+        self.title_lengths = np.zeros(num_docs, dtype=np.uint32) if self.has_fields else None
+        for segment in self.segments:
+            lo, hi = segment.doc_base, segment.doc_base + len(segment.doc_lengths)
+            self.doc_lengths[lo:hi] = segment.doc_lengths
+            if self.has_fields:
+                self.title_lengths[lo:hi] = segment.title_lengths
+        self.avg_title_length = 0
+        if self.has_fields and self.total_docs:
+            self.avg_title_length = float(self.title_lengths.sum()) / self.total_docs
+
+        # 已查找过的词项：编号 -> [(段, 段内编号)]、全局 df、IDF 与各段块数的累计
+        self._term_ids = {}
+        self._terms = []
+        self._locations = []
+        self._dfs = []
+        self.idf = []
+        self._block_starts = []
+        self._lock = threading.Lock()
+        self._field_postings = lru_cache(maxsize=INDEX_CONFIG['postings_cache'])(self._concat_postings)
+
+    @staticmethod
+    def exists(index_dir):
+        meta = load_meta(index_dir)
+        return meta is not None and meta.get('format') == SEGMENTED_FORMAT_VERSION
+
+    def __contains__(self, term):
+        return self.term_id(term) >= 0
+
+    def term_id(self, term):
+        """词项编号，各段都没有时返回 -1"""
+        term_id = self._term_ids.get(term)
+        if term_id is not None:
+            return term_id
+
+        locations = []
+        for segment in self.segments:
+            local_id = segment.term_id(term)
+            if local_id >= 0:
+                locations.append((segment, local_id))
+        if not locations:
+            return -1
+
+        with self._lock:
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                df = sum(segment.df_by_id(local_id) for segment, local_id in locations)
+                blocks = [len(segment.blocks_by_id(local_id)[0]) for segment, local_id in locations]
+                self._terms.append(term)
+                self._locations.append(locations)
+                self._dfs.append(df)
+                self.idf.append(np.float32(bm25_idf(df, self.total_docs)))
+                self._block_starts.append(np.cumsum([0] + blocks).tolist())
+                term_id = self._term_ids[term] = len(self._terms) - 1
+        return term_id
+
+    def term(self, term_id):
+        return self._terms[term_id]
+
+    def df(self, term):
+        term_id = self.term_id(term)
+        return 0 if term_id < 0 else self._dfs[term_id]
+
+    def df_by_id(self, term_id):
+        return self._dfs[term_id]
+
+    def postings(self, term):
+        term_id = self.term_id(term)
+        if term_id < 0:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint32)
+        return self.postings_by_id(term_id)
+
+    def postings_by_id(self, term_id):
+        return self._field_postings(term_id)[:2]
+
+    def field_postings_by_id(self, term_id):
+        return self._field_postings(term_id)
+
+    def _concat_postings(self, term_id):
+        """各段倒排拼接为全局文档ID的只读 (doc_ids, tfs, title_tfs)"""
+        parts = [segment.field_postings_by_id(local_id) if self.has_fields
+                 else segment.postings_by_id(local_id) + (None,)
+                 for segment, local_id in self._locations[term_id]]
+        doc_ids = np.concatenate([np.asarray(docs, dtype=np.uint32) + np.uint32(segment.doc_base)
+                                  for (segment, _), (docs, _, _) in zip(self._locations[term_id], parts)])
+        tfs = np.concatenate([tfs for _, tfs, _ in parts])
+        title_tfs = np.concatenate([title_tfs for _, _, title_tfs in parts]) if self.has_fields else None
+        for array in (doc_ids, tfs, title_tfs):
+            if array is not None:
+                array.flags.writeable = False
+        return doc_ids, tfs, title_tfs
+
+    def blocks_by_id(self, term_id):
+        """各段的块级信息依次拼接，last_doc 换算为全局文档ID"""
+        parts = [(segment.doc_base, segment.blocks_by_id(local_id)) for segment, local_id in self._locations[term_id]]
+        return (np.concatenate([blocks[0].astype(np.int64) + base for base, blocks in parts]),
+                np.concatenate([blocks[1] for _, blocks in parts]),
+                np.concatenate([blocks[2] for _, blocks in parts]),
+                np.concatenate([blocks[3] for _, blocks in parts]))
+
+    def block_postings_by_id(self, term_id, block):
+        starts = self._block_starts[term_id]
+        k = bisect_right(starts, block) - 1
+        segment, local_id = self._locations[term_id][k]
+        doc_ids, tfs = segment.block_postings_by_id(local_id, block - starts[k])
+        return doc_ids.astype(np.int64) + segment.doc_base, tfs
+
+    def matches_bm25(self, k1, b, avg_doc_length):
+        return False
+
+    def positions(self, term, doc_ids):
+        """词项在给定文档（全局ID，升序）中的位置，按段拆分后分别解码"""
+        if self.term_id(term) < 0 or not self.has_positions:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        docs, positions = [], []
+        for segment in self.segments:
+            lo, hi = np.searchsorted(doc_ids, [segment.doc_base, segment.doc_base + len(segment.doc_lengths)])
+            if lo < hi:
+                segment_docs, segment_positions = segment.positions(term, doc_ids[lo:hi] - segment.doc_base)
+                docs.append(segment_docs + segment.doc_base)
+                positions.append(segment_positions)
+        if not docs:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(docs), np.concatenate(positions)
+
+    def dictionary(self):
+        """前缀补全用的合并词典"""
+        return SegmentedTermDictionary([segment.index_dir for segment in self.segments])
+
+
+class SegmentedTermDictionary:
+    """各段词典的合并视图：同一词项的文档频率为各段之和"""
+
+    def __init__(self, segment_dirs):
+        self.dictionaries = [TermDictionary(segment_dir, local=True) for segment_dir in segment_dirs]
+
+    def complete(self, prefix, limit):
+        """以 prefix 开头、文档频率最高的 limit 个词项 [(term, df)]，同频时按字典序"""
+        if limit <= 0:
+            return []
+        dfs = {}
+        for dictionary in self.dictionaries:
+            lo, hi = dictionary.prefix_range(prefix)
+            for term, df in dictionary.complete(prefix, hi - lo):
+                dfs[term] = dfs.get(term, 0) + df
+        return heapq.nsmallest(limit, dfs.items(), key=lambda item: (-item[1], item[0]))
+
+
+class SegmentMerger:
+    """后台合并：按 plan_merge 反复挑选相邻段合并，每次合并完成后发布为新的一代
+
+    合并写在段目录下以 . 开头的临时目录中（清理时跳过），写完后在 lock（索引器发布新段时
+    持有的同一把锁）内改名并发布，新段的写入不必等待合并。同一时间只运行一个合并线程。
+    """
+
+    def __init__(self, index_dir, docstore_dir, lock):
+        self.index_dir = Path(index_dir)
+        self.docstore_dir = Path(docstore_dir)
+        self.lock = lock
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def schedule(self):
+        """启动后台合并线程（已在运行时由其继续检查）"""
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            # 守护线程：进程退出时不等待合并，未完成的合并只留下临时目录，下次合并开始前删除
+            self._thread = threading.Thread(target=self._run, name='segment-merge', daemon=True)
+            self._thread.start()
+
+    def wait(self):
+        """等待进行中的合并结束"""
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        # 同一时间只有一个合并线程，此前残留的临时目录都来自被中断的合并
+        for path in (self.index_dir / SEGMENTS_DIR).glob('.merge-*'):
+            shutil.rmtree(path, ignore_errors=True)
+        try:
+            while self.merge_once():
+                pass
+        except Exception as e:
+            print(f"⚠️ 合并索引段失败: {str(e)}")
+
+    def merge_once(self):
+        """按策略合并一次，返回是否合并了段"""
+        with self.lock:
+            segments = current_segments(self.index_dir)
+            plan = plan_merge([num_docs(IndexReader(self.index_dir / path)) for path in segments])
+        if plan is None:
+            return False
+
+        start, end = plan
+        readers = [IndexReader(self.index_dir / path) for path in segments[start:end]]
+        (self.index_dir / SEGMENTS_DIR).mkdir(parents=True, exist_ok=True)
+        merge_dir = Path(tempfile.mkdtemp(prefix='.merge-', dir=self.index_dir / SEGMENTS_DIR))
+        try:
+            merge_segments(merge_dir, readers)
+            with self.lock:
+                # 合并期间只会在末尾追加新段；若已整体重建则放弃本次合并
+                current = current_segments(self.index_dir)
+                if current[start:end] != segments[start:end]:
+                    return False
+                generation = current_generation(self.index_dir) + 1
+                path = segment_path(generation)
+                os.replace(merge_dir, self.index_dir / path)
+                # 文档没有变化，新的一代沿用当前的文档存储
+                publish_segments(self.index_dir, self.docstore_dir, current[:start] + [path] + current[end:],
+                                 generation, current_docstore(self.index_dir))
+        finally:
+            shutil.rmtree(merge_dir, ignore_errors=True)
+        print(f"\n✅ 合并 {end - start} 个索引段: {self.index_dir / path}")
+        return True
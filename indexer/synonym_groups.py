@@ -0,0 +1,78 @@
+import hashlib
+from collections import defaultdict
+from config.settings import SEARCH_CONFIG
+from utils.helpers import load_thesaurus, file_digest
+from utils.tokenizer import tokenize
+
+
+# 同义词组词项的前缀（分词结果只含字母数字与汉字，不会与普通词项冲突）
+SYNONYM_PREFIX = '#syn:'
+
+# 查询扩展取每个词条的前几个同义词，同义词组倒排按同一列表建立
+MAX_EXPANSIONS = 2
+
+GROUPS_FORMAT = 'groups-v2'  # 组成员或匹配规则变化时递增，旧索引中的组倒排随之失效
+
+
+def group_term(phrase):
+    """同义词词条对应的组词项，多词词条的空格换成下划线（查询中的组词项不能含空白）"""
+    return SYNONYM_PREFIX + phrase.replace(' ', '_')
+
+
+def group_members(phrase, synonyms):
+    """词条的同义词组成员：词条本身与其前 MAX_EXPANSIONS 个同义词（去重，去掉双引号）"""
+    members = []
+    for member in [phrase] + synonyms[:MAX_EXPANSIONS]:
+        member = ' '.join(member.replace('"', ' ').split())
+        if member and member.lower() not in {m.lower() for m in members}:
+            members.append(member)
+    return members
+
+
+def phrase_pattern(text, language):
+    """text 按查询解析的规则分词：[(词, 相对首词的位置偏移)]
+
+    与索引一致跳过单字符词，被跳过的词仍占位；查询中的词（引号短语）与同义词组成员都按此匹配。
+    """
+    tokens = tokenize(text, language)
+    kept = [(t, i) for i, t in enumerate(tokens) if len(t) > 1]
+    return [(t, i - kept[0][1]) for t, i in kept]
+
+
+def thesaurus_digest():
+    """当前同义词词典与组规则的摘要，索引 meta 中记录建索引时的值，不一致时须重建同义词组倒排"""
+    digest = file_digest([SEARCH_CONFIG['synonyms']['en'], SEARCH_CONFIG['synonyms']['zh']])
+    return hashlib.sha1(f'{GROUPS_FORMAT}:{MAX_EXPANSIONS}:{digest}'.encode('utf-8')).hexdigest()
+
+
+class SynonymGroups:
+    """同义词组：词典中每个词条与查询扩展所用的同义词构成一组，建索引时为每组写入一条合并的倒排
+
+    组成员按查询解析的规则分词，文档中某位置起与成员的各词（按相对偏移）一致即记一次出现，
+    位置为成员首词位置，同一位置只计一次。因此组的倒排恰为各成员（词或引号短语）检索结果的并集，
+    查询时扩展出的 (词条 OR 同义词...) 只需读取这一条预先合并的倒排。
+    """
+
+    def __init__(self):
+        self.digest = thesaurus_digest()
+        self.patterns = defaultdict(list)  # 成员首词 -> [(其余各词与偏移, 组词项)]
+
+        for language in ('en', 'zh'):
+            for phrase, synonyms in load_thesaurus(SEARCH_CONFIG['synonyms'][language]).items():
+                term = group_term(phrase)
+                for member in group_members(phrase, synonyms):
+                    pattern = phrase_pattern(member, language)
+                    if pattern:
+                        self.patterns[pattern[0][0]].append((pattern[1:], term))
+
+    def scan(self, tokens):
+        """分词结果中各同义词组的出现位置 {组词项: [位置]}（位置升序）"""
+        occurrences = defaultdict(list)
+        for start, token in enumerate(tokens):
+            terms = set()
+            for rest, term in self.patterns.get(token, ()):
+                if all(start + offset < len(tokens) and tokens[start + offset] == word for word, offset in rest):
+                    terms.add(term)
+            for term in terms:
+                occurrences[term].append(start)
+        return occurrences
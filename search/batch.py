@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+from .searcher import IndexSearcher
+
+
+class _BatchIndex:
+    """一批查询共用的索引视图：词项编号与倒排在整批查询中只查找、读取一次
+
+    其余属性与方法直接转给底层 IndexReader。
+    """
+
+    def __init__(self, index):
+        self._index = index
+        self._term_ids = {}
+        self._postings = {}
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
+    def term_id(self, term):
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            term_id = self._term_ids[term] = self._index.term_id(term)
+        return term_id
+
+    def df(self, term):
+        term_id = self.term_id(term)
+        if term_id < 0:
+            return 0
+        return self._index.df_by_id(term_id)
+
+    def postings(self, term):
+        term_id = self.term_id(term)
+        if term_id < 0:
+            return self._index.postings(term)
+        return self.postings_by_id(term_id)
+
+    def postings_by_id(self, term_id):
+        postings = self._postings.get(term_id)
+        if postings is None:
+            postings = self._postings[term_id] = self._index.postings_by_id(term_id)
+        return postings
+
+
+class BatchSearcher(IndexSearcher):
+    """批量检索：与给定的 IndexSearcher 共用索引与长度归一化，另在整批查询内缓存
+    词项倒排、各词的得分贡献与过滤位图，同一个词在多条查询中只取一次倒排、计一次分
+    """
+
+    def __init__(self, searcher):
+        self.__dict__.update(searcher.__dict__)
+        self.index = _BatchIndex(searcher.index)
+        self._contributions = {}
+        self._facets = {}
+
+    def term_contribution(self, term_id):
+        contribution = self._contributions.get(term_id)
+        if contribution is None:
+            contribution = self._contributions[term_id] = super().term_contribution(term_id)
+        return contribution
+
+    def facet(self, field, value):
+        docs = self._facets.get((field, value))
+        if docs is None:
+            docs = self._facets[(field, value)] = super().facet(field, value)
+        return docs
+
+
+def search_batch(searcher, items, top_n, workers=None):
+    """在一个 BatchSearcher 上检索一批 (query, language, filters)
+
+    返回与 items 一一对应的 (按得分降序的全局文档ID列表, {doc_id: score})。
+    workers 大于 1 时各查询分给线程池执行（共用同一批缓存）。
+    """
+    batch = BatchSearcher(searcher)
+    if not workers or workers <= 1 or len(items) <= 1:
+        return [batch.search(query, language, top_n, filters) for query, language, filters in items]
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(lambda item: batch.search(item[0], item[1], top_n, item[2]), items))
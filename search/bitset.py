@@ -0,0 +1,168 @@
+import numpy as np
+
+
+def intersect_sorted(small, big):
+    """有序整数数组求交：small 中每个元素在 big 上二分定位（向量化的跳跃查找）"""
+    if len(small) > len(big):
+        small, big = big, small
+    if len(small) == 0:
+        return small
+    idx = np.searchsorted(big, small)
+    idx[idx == len(big)] = len(big) - 1
+    return small[big[idx] == small]
+
+
+def difference_sorted(a, b):
+    """有序整数数组求差 a - b"""
+    if len(a) == 0 or len(b) == 0:
+        return a
+    idx = np.searchsorted(b, a)
+    idx[idx == len(b)] = len(b) - 1
+    return a[b[idx] != a]
+
+
+def union_sorted(arrays):
+    """多路有序整数数组求并
+
+    拼接后做稳定排序：各输入本身有序，排序退化为对这些有序段的多路归并。
+    """
+    arrays = [a for a in arrays if len(a)]
+    if not arrays:
+        return np.empty(0, dtype=np.uint32)
+    if len(arrays) == 1:
+        return arrays[0]
+    merged = np.sort(np.concatenate(arrays), kind='stable')
+    return merged[np.concatenate(([True], merged[1:] != merged[:-1]))]
+
+
+class DocSet:
+    """文档ID集合，按密度在两种容器间选择（类似 Roaring 的数组/位图容器）
+
+    稀疏时为升序 uint32 数组，稠密时为按文档ID取位的 uint64 位图；size 为文档ID
+    空间大小。集合运算按两侧容器类型选择实现：数组与位图求交只需在位图上按位
+    查找，位图之间按字运算，NOT 是对全体有效文档位图的一次按位差。
+    """
+
+    def __init__(self, size, ids=None, words=None):
+        self.size = size
+        self._ids = ids
+        self._words = words
+
+    @classmethod
+    def from_array(cls, ids, size):
+        """由升序文档ID数组构造（不复制）"""
+        return cls(size, ids=np.asarray(ids, dtype=np.uint32))
+
+    @classmethod
+    def from_mask(cls, mask):
+        """由按文档ID索引的布尔数组构造"""
+        return cls(len(mask), words=_pack(mask))
+
+    @classmethod
+    def from_words(cls, words, size):
+        """由 uint64 位图构造，位图长度不足时补零"""
+        words = np.asarray(words, dtype=np.uint64)
+        num_words = (size + 63) // 64
+        if len(words) < num_words:
+            words = np.concatenate((words, np.zeros(num_words - len(words), dtype=np.uint64)))
+        return cls(size, words=words[:num_words])
+
+    @property
+    def is_bitmap(self):
+        return self._words is not None
+
+    def __len__(self):
+        if self._ids is not None:
+            return len(self._ids)
+        return int(np.unpackbits(self._words.view(np.uint8)).sum())
+
+    def is_empty(self):
+        if self._ids is not None:
+            return len(self._ids) == 0
+        return not self._words.any()
+
+    def to_array(self):
+        """升序的 uint32 文档ID数组"""
+        if self._ids is not None:
+            return self._ids
+        return np.flatnonzero(self.mask()).astype(np.uint32)
+
+    def mask(self):
+        """按文档ID索引的布尔数组"""
+        if self._words is not None:
+            bits = np.unpackbits(self._words.view(np.uint8), bitorder='little')
+            return bits[:self.size].view(bool)
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self._ids] = True
+        return mask
+
+    def words(self):
+        """uint64 位图"""
+        if self._words is not None:
+            return self._words
+        return _pack(self.mask())
+
+    def contains(self, ids):
+        """ids 中每个文档ID是否在集合中"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if self._words is not None:
+            inside = ids < self.size
+            hits = np.zeros(len(ids), dtype=bool)
+            ids = ids[inside]
+            hits[inside] = ((self._words[ids >> 6] >> (ids & 63).astype(np.uint64)) & np.uint64(1)).astype(bool)
+            return hits
+        if len(self._ids) == 0:
+            return np.zeros(len(ids), dtype=bool)
+        idx = np.searchsorted(self._ids, ids)
+        idx[idx == len(self._ids)] = len(self._ids) - 1
+        return self._ids[idx] == ids
+
+    def __and__(self, other):
+        if self._words is not None and other._words is not None:
+            return DocSet(self.size, words=self._words & other._words)
+        if self._ids is not None and other._ids is not None:
+            return DocSet(self.size, ids=intersect_sorted(self._ids, other._ids))
+        ids, bitmap = (self, other) if self._ids is not None else (other, self)
+        return DocSet(self.size, ids=ids._ids[bitmap.contains(ids._ids)])
+
+    def __or__(self, other):
+        return DocSet.union([self, other])
+
+    def __sub__(self, other):
+        if self._ids is not None:
+            if other._ids is not None:
+                return DocSet(self.size, ids=difference_sorted(self._ids, other._ids))
+            return DocSet(self.size, ids=self._ids[~other.contains(self._ids)])
+        return DocSet(self.size, words=self._words & ~other.words())
+
+    @staticmethod
+    def union(sets):
+        """多个集合求并：全为数组时多路合并，结果稠密或含位图时按字或运算"""
+        size = sets[0].size
+        if all(s._ids is not None for s in sets):
+            ids = union_sorted([s._ids for s in sets])
+            if len(ids) * 32 < size:
+                return DocSet(size, ids=ids)
+            return DocSet(size, words=_pack_ids(ids, size))
+        words = np.zeros((size + 63) // 64, dtype=np.uint64)
+        for s in sets:
+            words |= s.words()
+        return DocSet(size, words=words)
+
+    def __repr__(self):
+        kind = 'bitmap' if self._words is not None else 'array'
+        return f"DocSet({kind}, {len(self)}/{self.size})"
+
+
+def _pack(mask):
+    """布尔数组打包为 uint64 位图（第 i 位对应文档 i）"""
+    packed = np.packbits(np.asarray(mask, dtype=bool), bitorder='little')
+    padded = np.zeros(((len(packed) + 7) // 8) * 8, dtype=np.uint8)
+    padded[:len(packed)] = packed
+    return padded.view('<u8').astype(np.uint64)
+
+
+def _pack_ids(ids, size):
+    mask = np.zeros(size, dtype=bool)
+    mask[ids] = True
+    return _pack(mask)
@@ -0,0 +1,370 @@
+import re
+import numpy as np
+from indexer.synonym_groups import SYNONYM_PREFIX, phrase_pattern
+from .bitset import DocSet, intersect_sorted
+
+
+OPERATORS = {'AND', 'OR', 'NOT'}
+
+# 邻近操作符 NEAR/k：两侧词项相距不超过 k 个词
+_NEAR_PATTERN = re.compile(r'NEAR/(\d+)$', re.IGNORECASE)
+
+# 括号、双引号短语或不含空白/括号的词
+_TOKEN_PATTERN = re.compile(r'\(|\)|"[^"]*"|[^\s()"]+')
+
+
+def is_operator(token):
+    """token 是否为 AND / OR / NOT 或 NEAR/k 操作符（不区分大小写）"""
+    return token.upper() in OPERATORS or _NEAR_PATTERN.match(token) is not None
+
+
+class Term:
+    """单个索引词"""
+
+    def __init__(self, term):
+        self.term = term
+
+    def cost(self, index):
+        return index.df(self.term)
+
+    def evaluate(self, index, universe):
+        return DocSet.from_array(index.postings(self.term)[0], len(index.doc_lengths))
+
+    def positive_terms(self):
+        return [self.term]
+
+    def position_keys(self, index, doc_ids):
+        """doc_ids 中各次出现的 (文档 << 32 | 位置) 升序数组"""
+        docs, positions = index.positions(self.term, doc_ids)
+        return (docs << 32) | positions
+
+    def __repr__(self):
+        return self.term
+
+
+class Phrase:
+    """短语：各词须按给定的相对位置依次出现
+
+    offsets 为各词在短语分词结果中的下标，被过滤的短词仍占位。先对各词倒排求交
+    得到候选，只在候选文档上解码位置校验；索引没有位置信息时退化为 AND。
+    """
+
+    def __init__(self, terms, offsets):
+        self.terms = terms
+        self.offsets = offsets
+
+    def cost(self, index):
+        return min(index.df(t) for t in self.terms)
+
+    def _candidates(self, index):
+        postings = sorted((index.postings(t)[0] for t in self.terms), key=len)
+        result = postings[0]
+        for docs in postings[1:]:
+            if len(result) == 0:
+                break
+            result = intersect_sorted(result, docs)
+        return result
+
+    def evaluate(self, index, universe):
+        candidates = self._candidates(index)
+        if len(candidates) and index.has_positions:
+            candidates = np.unique(self.position_keys(index, candidates) >> 32).astype(np.uint32)
+        return DocSet.from_array(candidates, len(index.doc_lengths))
+
+    def position_keys(self, index, doc_ids):
+        """短语在 doc_ids 中各次出现的 (文档 << 32 | 首词位置) 升序数组"""
+        doc_ids = intersect_sorted(np.asarray(doc_ids, dtype=np.uint32), self._candidates(index))
+        keys = None
+        for term, offset in zip(self.terms, self.offsets):
+            docs, positions = index.positions(term, doc_ids)
+            # 换算为短语首词位置后求交
+            valid = positions >= offset
+            term_keys = (docs[valid] << 32) | (positions[valid] - offset)
+            keys = term_keys if keys is None else intersect_sorted(keys, term_keys)
+            if len(keys) == 0:
+                break
+        return keys
+
+    def positive_terms(self):
+        return list(self.terms)
+
+    def __repr__(self):
+        return '"' + ' '.join(self.terms) + '"'
+
+
+class Near:
+    """邻近：两侧（词或短语，短语以首词位置计）至少有一处相距不超过 k 个词
+
+    先对两侧结果求交，只在候选文档上解码位置；索引没有位置信息时退化为 AND。
+    """
+
+    def __init__(self, left, right, distance):
+        self.left = left
+        self.right = right
+        self.distance = distance
+
+    def cost(self, index):
+        return min(self.left.cost(index), self.right.cost(index))
+
+    def evaluate(self, index, universe):
+        candidates = self.left.evaluate(index, universe) & self.right.evaluate(index, universe)
+        if candidates.is_empty() or not index.has_positions:
+            return candidates
+
+        candidates = candidates.to_array()
+        left = self.left.position_keys(index, candidates)
+        right = self.right.position_keys(index, candidates)
+        # 对右侧每次出现，在左侧中二分查找 [pos - k, pos + k] 内是否有出现
+        lo = np.searchsorted(left, right - self.distance, side='left')
+        hi = np.searchsorted(left, right + self.distance, side='right')
+        return DocSet.from_array(np.unique(right[hi > lo] >> 32), len(index.doc_lengths))
+
+    def positive_terms(self):
+        return self.left.positive_terms() + self.right.positive_terms()
+
+    def __repr__(self):
+        return f"({self.left!r} NEAR/{self.distance} {self.right!r})"
+
+
+class SynonymGroup:
+    """同义词扩展出的 (组词项 OR 同义词...)：检索只读组词项的合并倒排（即各同义词结果的并集），
+    计分仍按各同义词，与不带组词项的扩展结果一致
+    """
+
+    def __init__(self, group, alternatives):
+        self.group = group
+        self.alternatives = alternatives
+
+    def cost(self, index):
+        return self.group.cost(index)
+
+    def evaluate(self, index, universe):
+        return self.group.evaluate(index, universe)
+
+    def positive_terms(self):
+        return self.alternatives.positive_terms() if self.alternatives is not None else []
+
+    def __repr__(self):
+        return f"({self.group!r} OR {self.alternatives!r})"
+
+
+class Not:
+    """取反：在 And 中作为惰性差集，单独出现时对全体有效文档的位图取补"""
+
+    def __init__(self, child):
+        self.child = child
+
+    def cost(self, index):
+        return len(index.doc_lengths)
+
+    def evaluate(self, index, universe):
+        return universe() - self.child.evaluate(index, universe)
+
+    def positive_terms(self):
+        return []
+
+    def __repr__(self):
+        return f"NOT {self.child!r}"
+
+
+class And:
+    """交集：正向子句按代价从小到大依次求交，NOT 子句最后做差"""
+
+    def __init__(self, children):
+        self.children = children
+
+    def cost(self, index):
+        costs = [c.cost(index) for c in self.children if not isinstance(c, Not)]
+        return min(costs) if costs else len(index.doc_lengths)
+
+    def evaluate(self, index, universe):
+        positives = [c for c in self.children if not isinstance(c, Not)]
+        negatives = [c.child for c in self.children if isinstance(c, Not)]
+
+        if positives:
+            positives.sort(key=lambda c: c.cost(index))
+            result = positives[0].evaluate(index, universe)
+            for child in positives[1:]:
+                if result.is_empty():
+                    return result
+                result = result & child.evaluate(index, universe)
+        else:
+            result = universe()
+
+        for child in negatives:
+            if result.is_empty():
+                break
+            result = result - child.evaluate(index, universe)
+        return result
+
+    def positive_terms(self):
+        return [t for c in self.children for t in c.positive_terms()]
+
+    def __repr__(self):
+        return '(' + ' AND '.join(repr(c) for c in self.children) + ')'
+
+
+class Or:
+    """并集：各子句结果多路合并"""
+
+    def __init__(self, children):
+        self.children = children
+
+    def cost(self, index):
+        return sum(c.cost(index) for c in self.children)
+
+    def evaluate(self, index, universe):
+        return DocSet.union([c.evaluate(index, universe) for c in self.children])
+
+    def positive_terms(self):
+        return [t for c in self.children for t in c.positive_terms()]
+
+    def __repr__(self):
+        return '(' + ' OR '.join(repr(c) for c in self.children) + ')'
+
+
+class _Parser:
+    """递归下降解析：OR 优先级最低，其次 AND（含隐式 AND），再次 NOT，NEAR/k 最高"""
+
+    def __init__(self, query, language):
+        self.tokens = _TOKEN_PATTERN.findall(query)
+        self.language = language
+        self.pos = 0
+
+    def _peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def _peek_operator(self):
+        token = self._peek()
+        if token is not None and token.upper() in OPERATORS:
+            return token.upper()
+        return None
+
+    def _peek_near(self):
+        """下一个记号为 NEAR/k 时返回 k"""
+        token = self._peek()
+        match = _NEAR_PATTERN.match(token) if token is not None else None
+        return int(match.group(1)) if match else None
+
+    def parse(self):
+        if not self.tokens:
+            return None
+        node = self._parse_or()
+        if self._peek() is not None:
+            raise ValueError(f"无法解析的查询片段: {self._peek()}")
+        return node
+
+    def _at_end(self):
+        """是否已到查询或当前括号的结尾（结尾处悬空的操作符被忽略）"""
+        return self._peek() in (None, ')')
+
+    def _parse_or(self):
+        children = [self._parse_and()]
+        while self._peek_operator() == 'OR':
+            self.pos += 1
+            if self._at_end():
+                break
+            children.append(self._parse_and())
+
+        first = children[0]
+        if len(children) > 1 and isinstance(first, Term) and first.term.startswith(SYNONYM_PREFIX):
+            return SynonymGroup(first, _combine(Or, children[1:]))
+        return _combine(Or, children)
+
+    def _parse_and(self):
+        children = [self._parse_unary()]
+        while True:
+            operator = self._peek_operator()
+            if operator == 'AND':
+                self.pos += 1
+            elif operator == 'OR':
+                break
+            if self._at_end():
+                break
+            children.append(self._parse_unary())
+        return _combine(And, children)
+
+    def _parse_unary(self):
+        if self._peek_operator() == 'NOT':
+            self.pos += 1
+            if self._at_end():
+                return None
+            child = self._parse_unary()
+            return Not(child) if child is not None else None
+        return self._parse_near()
+
+    def _parse_near(self):
+        """a NEAR/k b NEAR/k c 解释为相邻两两邻近的 AND"""
+        start = self.pos
+        node = self._parse_primary()
+        if self._peek_near() is None:
+            return node
+
+        # NEAR 的操作数为词或短语，未加引号的多词记号按短语处理
+        self.pos = start
+        left = self._parse_primary(phrase=True)
+        pairs = []
+        while self._peek_near() is not None:
+            distance = self._peek_near()
+            self.pos += 1
+            if self._at_end():
+                break
+            right = self._parse_primary(phrase=True)
+            if left is not None and right is not None:
+                pairs.append(Near(left, right, distance))
+            left = right if right is not None else left
+        if not pairs:
+            return left
+        return _combine(And, pairs)
+
+    def _parse_primary(self, phrase=False):
+        token = self._peek()
+        if token is None or token == ')' or token.upper() in OPERATORS or _NEAR_PATTERN.match(token):
+            raise ValueError("查询缺少操作数")
+        self.pos += 1
+
+        if token == '(':
+            if phrase:
+                raise ValueError("NEAR 的操作数须为词或短语")
+            node = self._parse_or()
+            if self._peek() != ')':
+                raise ValueError("括号不匹配")
+            self.pos += 1
+            return node
+
+        # 同义词扩展替换成的组词项直接对应索引中的一条合并倒排
+        if token.startswith(SYNONYM_PREFIX):
+            return Term(token)
+
+        # 与索引一致跳过单字符词；引号短语按位置匹配，普通词分词后隐式 AND
+        pattern = phrase_pattern(token.strip('"'), self.language)
+        if token.startswith('"') or phrase:
+            if len(pattern) > 1:
+                return Phrase([t for t, _ in pattern], [offset for _, offset in pattern])
+            return Term(pattern[0][0]) if pattern else None
+        return _combine(And, [Term(t) for t, _ in pattern])
+
+
+def _combine(node_type, children):
+    """合并子句，去掉空子句，只剩一个时直接返回"""
+    children = [c for c in children if c is not None]
+    if not children:
+        return None
+    if len(children) == 1:
+        return children[0]
+    # 展平同类嵌套
+    flat = []
+    for child in children:
+        flat.extend(child.children if isinstance(child, node_type) else [child])
+    return node_type(flat)
+
+
+def parse_query(query, language):
+    """把布尔查询解析为查询树，语法错误时抛出 ValueError，无有效词项时返回 None
+
+    支持 AND / OR / NOT（不区分大小写）与括号，相邻词之间为隐式 AND；
+    双引号内为短语，a NEAR/k b 要求两侧相距不超过 k 个词。
+    """
+    return _Parser(query, language).parse()
@@ -1,217 +1,318 @@
-import json
-import math
-import re
+import os
+import threading
+import jieba
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from collections import defaultdict
 from config.settings import INDEX_CONFIG, SEARCH_CONFIG
-from indexer import MultilingualIndexer
-from utils.tokenizer import tokenize
+from indexer import MultilingualIndexer, current_generation
 from utils.language import detect_language
+from utils.helpers import normalize_text, sentence_offsets
+from utils.metrics import metrics
 from .spellcheck import SpellChecker
 from .synonym_expander import SynonymExpander
+from .cache import QueryCache
+from .snippet import compile_highlighter, make_snippet
+from .searcher import query_terms
+from .batch import search_batch
+from .shards import ShardedSearcher
+from .generation import IndexGeneration
 
 
 class SearchEngine:
-    def __init__(self):
+    def __init__(self, index_dir=None, documents_path=None, docstore_dir=None):
+        # 默认使用配置中的路径，基准测试等场景可指定其他目录
+        self.index_dir = Path(index_dir or INDEX_CONFIG['index_dir'])
+        self.documents_path = Path(documents_path or INDEX_CONFIG['documents_path'])
+        self.docstore_dir = Path(docstore_dir or INDEX_CONFIG['docstore']['dir'])
+
         # 初始化组件
-        self.all_doc_ids = set( [str(i) for i in range(12500)])
         self.spellchecker = SpellChecker()
         self.synonym_expander = SynonymExpander()
-
+        self.cache = QueryCache(**SEARCH_CONFIG['cache'])
 
         # 加载索引
-        self._load_index()
+        self._lock = threading.Lock()         # 保护当前一代的读取与切换
+        self._reload_lock = threading.Lock()  # 同一时间只加载一代
+        self._local = threading.local()
+        self._retired = []
+        self._current = self._load_index()
+        metrics.set('index_generation', self._current.generation)
+
+        # 后台检查索引清单，发现新一代时热加载
+        self._stop = threading.Event()
+        interval = SEARCH_CONFIG['reload']['interval']
+        if interval:
+            threading.Thread(target=self._watch, args=(interval,), name='index-reload', daemon=True).start()
 
     def _load_index(self):
-        """加载索引数据"""
-        index_dir = Path(INDEX_CONFIG['index_dir'])
-
-        # 加载倒排索引
-        with open(index_dir / 'inverted_index.json', 'r', encoding='utf-8') as f:
-            self.inverted_index = json.load(f)
-
-        # 加载元数据
-        with open(index_dir / 'meta.json', 'r', encoding='utf-8') as f:
-            meta = json.load(f)
-            self.doc_lengths = meta['doc_lengths']
-            self.avg_doc_length = meta['avg_doc_length']
-            self.total_docs = meta['total_docs']
-
-        # 加载文档
-        with open(INDEX_CONFIG['documents_path'], 'r', encoding='utf-8') as f:
-            self.documents = json.load(f)
-
-    def preprocess_query(self, query):
-        """查询预处理：拼写纠正+同义词扩展"""
-        # 拼写纠正
-        corrected = self.spellchecker.correct(query)
-
-        # 同义词扩展
-        expanded = self.synonym_expander.expand(corrected)
-        # expanded if expanded != corrected else corrected
-        return query
-
-    def search(self, query, top_n=None):
-        """执行搜索"""
+        """加载索引清单所指的当前一代索引"""
+        current = IndexGeneration(self.index_dir, self.docstore_dir, self.documents_path)
+        if current.synonyms is not None and not self._synonym_groups(current):
+            print("索引中的同义词组倒排与当前同义词词典不一致，查询不使用组倒排；"
+                  "请重建索引（python -m indexer.multilingual_indexer --rebuild）")
+        return current
+
+    def _synonym_groups(self, current):
+        """当前一代能否使用同义词组词项：索引写入了组倒排，且与正在使用的同义词词典一致"""
+        return current.synonyms is not None and current.synonyms == self.synonym_expander.digest
+
+    # 当前一代的属性
+    index = property(lambda self: self._current.index)
+    searcher = property(lambda self: self._current.searcher)
+    documents = property(lambda self: self._current.documents)
+    generation = property(lambda self: self._current.generation)
+    avg_doc_length = property(lambda self: self._current.avg_doc_length)
+    total_docs = property(lambda self: self._current.total_docs)
+
+    @contextmanager
+    def snapshot(self):
+        """在此范围内的检索、取文档与生成摘要都使用同一代索引
+
+        热加载在范围内切换到新一代时，进行中的查询仍在旧一代上完成，
+        旧一代在最后一个这样的范围退出后关闭。可以嵌套。
+        """
+        current = getattr(self._local, 'generation', None)
+        if current is not None:
+            yield current
+            return
+
+        with self._lock:
+            current = self._current
+            current.acquire()
+        self._local.generation = current
+        try:
+            yield current
+        finally:
+            self._local.generation = None
+            current.release()
+
+    def reload(self):
+        """若索引清单指向新的一代则加载并原子切换，返回是否发生了切换"""
+        with self._reload_lock:
+            if current_generation(self.index_dir) == self._current.generation:
+                return False
+
+            start = time.perf_counter()
+            try:
+                loaded = self._load_index()
+            except Exception as e:
+                metrics.inc('reload_failures_total')
+                print(f"加载新一代索引失败: {str(e)}")
+                return False
+
+            with self._lock:
+                previous, self._current = self._current, loaded
+            self._retired = [g for g in self._retired if not g.closed] + [previous]
+            previous.retire()
+
+            metrics.observe('reload', time.perf_counter() - start)
+            metrics.inc('reloads_total')
+            metrics.set('index_generation', loaded.generation)
+            return True
+
+    def _watch(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"检查索引清单失败: {str(e)}")
+
+    def close(self):
+        """停止热加载检查并关闭当前一代"""
+        self._stop.set()
+        self._current.retire()
+
+    def preprocess_query(self, query, synonym_groups=False):
+        """查询预处理：同义词扩展
+
+        检索用原始查询扩展，拼写纠正只作为“您是不是要找”的提示（见 get_processed_query）。
+        synonym_groups 为真（索引中有同义词组倒排）时扩展出的每组带上组词项，只读一条合并的倒排，
+        检索与排序结果与不带时相同。
+        """
+        with metrics.timer('synonyms'):
+            return self.synonym_expander.expand(query, synonym_groups)
+
+    def search(self, query, top_n=None, with_snippets=True, language=None, category=None):
+        """执行搜索
+
+        with_snippets 为 False 时结果不含摘要，可只对实际返回的那一页调用
+        add_snippets，避免为全部 top_n 个结果生成摘要。language / category
+        按文档语言、主题过滤，在排序前与布尔检索结果求交。
+        """
         if top_n is None:
             top_n = SEARCH_CONFIG['default_results']
 
+        metrics.inc('queries_total')
+        with self.snapshot() as current:
+            with metrics.timer('search'):
+                # 查询结果缓存（翻页等重复查询直接命中）
+                query_language = detect_language(query)
+                filters = (('language', language), ('topic_name', category))
+                cache_key = (normalize_text(query).lower(), query_language, top_n, filters)
+                results = self.cache.get(cache_key, current.generation)
+                if results is None:
+                    results = self._search_uncached(current, query, query_language, top_n, filters)
+                    self.cache.put(cache_key, current.generation, results)
+
+            if with_snippets:
+                return self.add_snippets(results, query)
+            return list(results)
+
+    def _search_uncached(self, current, query, language, top_n, filters=()):
+        """检索并排序，结果不含摘要"""
         # 预处理查询
-        processed_query = self.preprocess_query(query)
-        language = detect_language(query)
+        processed_query = self.preprocess_query(query, self._synonym_groups(current))
+
+        # 布尔检索、过滤与相关性排序（分片索引时并发检索各分片后归并）
+        ranked_docs, scores = current.searcher.search(processed_query, language, top_n, filters)
 
-        # 布尔检索
-        doc_ids = self._boolean_search(processed_query, language)
+        return self._fetch_results(current, ranked_docs, scores, top_n)
 
-        # 相关性排序
-        ranked_docs,scores = self._rank_documents(processed_query, doc_ids, language)
-        # 准备结果
+    def _fetch_results(self, current, ranked_docs, scores, top_n):
+        """由排序结果读取文档元数据，组装不含摘要的结果列表"""
         results = []
-        for doc_id in ranked_docs[:top_n]:
-            doc = self.documents[str(doc_id)]
-            results.append({
-                'title': doc['title'],
-                'url': doc['url'],
-                'snippet': self._generate_snippet(doc['content'], processed_query, language),
-                'language': doc.get('language', 'en'),
-                'score': scores.get(doc_id, 0),
-                'category': doc.get('topic_name', '未分类'),
-
-            })
+        with metrics.timer('fetch'):
+            for doc_id in ranked_docs[:top_n]:
+                doc = current.documents.get_head(doc_id)
+                results.append({
+                    'doc_id': doc_id,
+                    'title': doc['title'],
+                    'url': doc['url'],
+                    'language': doc.get('language', 'en'),
+                    'score': scores.get(doc_id, 0),
+                    'category': doc.get('topic_name', '未分类'),
+
+                })
 
         return results
 
-    def _boolean_search(self, query, language):
-        try:
-            tokens = self._parse_simple_boolean_query(query, language)
-        except ValueError as e:
-            return []
-
-        if not tokens:
-            return []
-
-        result_docs = None
-
-        for token in tokens:
-            term = token['term']
-            operator = token['operator']
-
-            current_docs = set(self.inverted_index.get(term, {}).keys())
-            if result_docs is None:
-
-                result_docs = current_docs
-            else:
-                if operator == 'AND':
-                    result_docs &= current_docs
-                elif operator == 'OR':
-                    result_docs |= current_docs
-                elif operator == 'NOT':
-                    result_docs -= current_docs  # ✅ 正确：从现有结果中减去当前 term 的文档
+    def search_many(self, queries, top_n=None, with_snippets=True, language=None, category=None):
+        """批量搜索，返回与 queries 一一对应的结果列表（每项与 search 的返回相同）
 
-        return sorted(int(doc_id) for doc_id in result_docs) if result_docs else []
-
-    def _parse_simple_boolean_query(self, query, language):
-        """
-        修复版布尔查询解析器
-        正确处理形如 "AI OR LLM" 的查询
+        queries 中每项为查询字符串，或含 query 及可选 language / category 的字典
+        （未给出时使用参数中的默认过滤）。重复的查询只检索一次；未命中缓存的查询
+        在一个批次中共用词项倒排与得分，按 SEARCH_CONFIG['batch'] 可分给线程池或进程池。
         """
-        import re
-
-        # 使用正则分割查询
-        parts = re.split(r'\s+(AND|OR|NOT)\s+', query, flags=re.IGNORECASE)
-
-        # 检查第一个元素是否是操作符（非法情况）
-        if len(parts) > 0 and parts[0].upper() in ['AND', 'OR', 'NOT']:
-            raise ValueError("查询不能以操作符开始")
-
-        tokens = []
-        next_operator = None  # 下一个词项的操作符
-        this_operator = None
-
-        for item in parts:
-            if item.upper() in ['AND', 'OR', 'NOT']:
-                next_operator = item.upper()
-            else:
-                # 分词并添加词项
-                sub_tokens = tokenize(item, language)
-                for term in sub_tokens:
-                    tokens.append({
-                        'term': term,
-                        'operator': next_operator
-                    })
-                next_operator = None  # 重置操作符
-
-        # 第一个词项不应有操作符
-        if tokens:
-            tokens[0]['operator'] = None
-
-        return tokens
-
-    def _rank_documents(self, query, doc_ids, language):
-        """基于BM25的相关性排序"""
-        tokens = tokenize(query, language)
-        if not tokens or not doc_ids:
-            return [], {}
-
-        # BM25参数
-        k1 = 1.5
-        b = 0.75
-
-        scores = defaultdict(float)
-
-        for term in tokens:
-            if term not in self.inverted_index:
-                continue
-
-            # 计算IDF
-            df = len(self.inverted_index[term])
-            idf = math.log((self.total_docs - df + 0.5) / (df + 0.5)) + 1.0
-
-            for doc_id in doc_ids:
-                doc_id_str = str(doc_id)
-                if doc_id_str not in self.inverted_index[term]:
+        if top_n is None:
+            top_n = SEARCH_CONFIG['default_results']
+
+        metrics.inc('queries_total', len(queries))
+        metrics.inc('batches_total')
+        with self.snapshot() as current:
+            return self._search_many(current, queries, top_n, with_snippets, language, category)
+
+    def _search_many(self, current, queries, top_n, with_snippets, language, category):
+        with metrics.timer('search_batch'):
+            keys = []
+            pending = {}  # 未命中缓存的查询：cache_key -> (query, query_language, filters)
+            found = {}
+            for entry in queries:
+                if isinstance(entry, str):
+                    entry = {'query': entry}
+                query = entry['query']
+                query_language = detect_language(query)
+                filters = (('language', entry.get('language', language)),
+                           ('topic_name', entry.get('category', category)))
+                cache_key = (normalize_text(query).lower(), query_language, top_n, filters)
+                keys.append((cache_key, query))
+
+                if cache_key in found or cache_key in pending:
                     continue
+                results = self.cache.get(cache_key, current.generation)
+                if results is None:
+                    pending[cache_key] = (query, query_language, filters)
+                else:
+                    found[cache_key] = results
+
+            if pending:
+                synonym_groups = self._synonym_groups(current)
+                items = [(self.preprocess_query(query, synonym_groups), query_language, filters)
+                         for query, query_language, filters in pending.values()]
+                for cache_key, (ranked_docs, scores) in zip(pending, self._search_batch(current, items, top_n)):
+                    results = self._fetch_results(current, ranked_docs, scores, top_n)
+                    self.cache.put(cache_key, current.generation, results)
+                    found[cache_key] = results
+
+        if with_snippets:
+            return [self.add_snippets(found[cache_key], query) for cache_key, query in keys]
+        return [list(found[cache_key]) for cache_key, _ in keys]
+
+    def _search_batch(self, current, items, top_n):
+        """检索一批 (query, language, filters)，返回与之对应的 (ranked_docs, scores)"""
+        if current.index is None:
+            # 分片索引：每个分片一次处理整批
+            return current.searcher.search_many(items, top_n)
+
+        batch = SEARCH_CONFIG['batch']
+        workers = batch['workers'] or os.cpu_count()
+        if batch['executor'] == 'process':
+            if current.batch_pool is None:
+                current.batch_pool = ShardedSearcher([current.index_dir], current.docstore_dir, workers)
+            return current.batch_pool.search_many(items, top_n)
+        if batch['executor'] == 'thread':
+            return search_batch(current.searcher, items, top_n, workers)
+        return search_batch(current.searcher, items, top_n)
+
+    def add_snippets(self, results, query):
+        """为给定结果生成摘要与高亮偏移，返回新的结果列表"""
+        with self.snapshot() as current, metrics.timer('snippets'):
+            language = detect_language(query)
+            highlighter = compile_highlighter(query_terms(query, language))
+            max_len = SEARCH_CONFIG['max_snippet_length']
+
+            snippets = []
+            for result in results:
+                doc = current.documents[result['doc_id']]
+                offsets = doc.get('sentences') or sentence_offsets(doc['content'], doc.get('language', 'en'))
+                snippet, highlights = make_snippet(doc['content'], highlighter, offsets, max_len)
+                snippets.append(dict(result, snippet=snippet, highlights=highlights))
+        return snippets
+
+    def complete(self, query, limit=None):
+        """补全查询的最后一个词：返回以其为前缀、文档频率最高的词项
+
+        结果为 [{'text': 补全后的查询, 'term', 'df'}]。最后一段没有空格分隔的中文
+        整体无补全时，按分词结果只补全其中最后一个词。
+        """
+        limit = limit or SEARCH_CONFIG['complete']['limit']
+        head, _, prefix = query.lstrip().lower().rpartition(' ')
+        head = head + ' ' if head else ''
+        if not prefix:
+            return []
+
+        with self.snapshot() as current, metrics.timer('complete'):
+            if current.dictionary is None:
+                return []
+            completions = current.dictionary.complete(prefix, limit)
+            if not completions and len(prefix) > 1 and detect_language(prefix) == 'zh':
+                words = jieba.lcut(prefix)
+                if len(words) > 1:
+                    head += ''.join(words[:-1])
+                    completions = current.dictionary.complete(words[-1], limit)
 
-                tf = self.inverted_index[term][doc_id_str]
-                doc_length = self.doc_lengths[doc_id_str]
-
-                # 计算BM25分数
-                numerator = tf * (k1 + 1)
-                denominator = tf + k1 * (1 - b + b * doc_length / self.avg_doc_length)
-                scores[doc_id] += idf * numerator / denominator
-        # 按分数排序
-        return sorted(scores.keys(), key=lambda x: scores[x], reverse=True), scores
-
-    def _generate_snippet(self, content, query, language):
-        """生成摘要片段"""
-        max_len = SEARCH_CONFIG['max_snippet_length']
-        query_terms = set(tokenize(query, language))
-
-        if language == 'zh':
-            # 中文摘要
-            sentences = re.split(r'[。！？]', content)
-            for sentence in sentences:
-                if any(term in sentence for term in query_terms):
-                    return self._truncate_text(sentence, max_len)
-        else:
-            # 英文摘要
-            sentences = re.split(r'[.!?]', content)
-            for sentence in sentences:
-                if any(term.lower() in sentence.lower() for term in query_terms):
-                    return self._truncate_text(sentence, max_len)
-
-        return self._truncate_text(content, max_len)
-
-    def _truncate_text(self, text, max_length):
-        """截断文本"""
-        return text[:max_length] + ('...' if len(text) > max_length else '')
+        return [{'text': head + term, 'term': term, 'df': df} for term, df in completions]
 
     def get_processed_query(self, query):
-        """返回查询处理过程信息"""
-        corrected = self.spellchecker.correct(query)
-        expanded = self.synonym_expander.expand(corrected)
+        """返回查询处理过程信息：拼写纠正建议与检索实际使用的扩展查询"""
+        with metrics.timer('spellcheck'):
+            corrected = self.spellchecker.correct(query)
+        expanded = self.synonym_expander.expand(query)
 
         return {
             'corrected': corrected if corrected != query else None,  # 无纠正时返回None
-            'expanded': expanded if expanded != corrected else None  # 无扩展时返回None
+            'expanded': expanded if expanded != query else None  # 无扩展时返回None
         }
+
+    def cache_stats(self):
+        """查询结果缓存的命中/未命中/淘汰计数"""
+        return dict(self.cache.stats(), generation=self.generation)
+
+    def render_metrics(self):
+        """Prometheus 文本格式的各阶段耗时直方图、查询计数与缓存状态"""
+        stats = self.cache.stats()
+        for name in ('entries', 'hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+            metrics.set(f'cache_{name}', stats[name])
+        metrics.set('index_generation', self.generation)
+        metrics.set('draining_generations', sum(1 for g in self._retired if g.draining))
+        return metrics.render()
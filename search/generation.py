@@ -0,0 +1,97 @@
+import threading
+import time
+from config.settings import SEARCH_CONFIG
+from indexer import (IndexReader, SegmentedIndex, TermDictionary, convert_legacy_index, open_docstore,
+                     close_docstore, resolve_generation)
+from indexer.binary_index import SHARDED_FORMAT_VERSION, load_meta
+from utils.metrics import metrics
+from .searcher import IndexSearcher
+from .shards import ShardedSearcher
+
+
+class IndexGeneration:
+    """已加载的一代索引：倒排索引、文档存储与检索器
+
+    查询期间以 acquire / release 计数。被新一代替换（retire）后，等最后一个进行中的
+    查询结束再关闭：停止进程池并移出共享的文档存储，内存映射随最后的引用一起释放。
+    """
+
+    def __init__(self, index_root, docstore_root, documents_path):
+        self.generation, self.index_dir, self.docstore_dir = resolve_generation(index_root, docstore_root)
+
+        # 文档按需从内存映射的文档存储中解压读取（与 RAG 共用）
+        self.documents = open_docstore(self.docstore_dir, documents_path)
+
+        meta = load_meta(self.index_dir)
+        if meta is not None and meta.get('format') == SHARDED_FORMAT_VERSION:
+            # 分片索引：查询分发到进程池，由各工作进程打开分片
+            self.index = None
+            self.searcher = ShardedSearcher.from_meta(self.index_dir, meta, self.docstore_dir,
+                                                      SEARCH_CONFIG['shard_workers'])
+        elif SegmentedIndex.exists(self.index_dir):
+            # 增量写入的分段索引：各段合并为一个视图，在本进程内检索
+            self.index = SegmentedIndex(self.index_dir, meta)
+            self.searcher = IndexSearcher(self.index, self.documents)
+        else:
+            # 旧版 JSON 索引首次加载时转换为二进制格式
+            if not IndexReader.exists(self.index_dir):
+                convert_legacy_index(self.index_dir)
+                meta = load_meta(self.index_dir)
+
+            # 内存映射倒排索引，按词项惰性读取
+            self.index = IndexReader(self.index_dir)
+            self.searcher = IndexSearcher(self.index, self.documents)
+
+        # 词项前缀补全用的词典（分片索引为顶层的全局词典，旧版分片索引没有；分段索引合并各段词典）
+        if isinstance(self.index, SegmentedIndex):
+            self.dictionary = self.index.dictionary()
+        else:
+            self.dictionary = TermDictionary(self.index_dir) if TermDictionary.exists(self.index_dir) else None
+
+        self.avg_doc_length = meta['avg_doc_length']
+        self.total_docs = meta['total_docs']
+        # 写入同义词组倒排时所用同义词词典的摘要，未写入时为 None
+        self.synonyms = meta.get('synonyms')
+        self.batch_pool = None  # 批量检索的进程池，按需创建
+
+        self._active = 0
+        self._retired_at = None
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self._active += 1
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+            drained = self._retired_at is not None and self._active == 0
+        if drained:
+            self.close()
+
+    def retire(self):
+        """标记为已被替换，没有进行中的查询时立即关闭"""
+        with self._lock:
+            self._retired_at = time.perf_counter()
+            drained = self._active == 0
+        if drained:
+            self.close()
+
+    @property
+    def draining(self):
+        return self._retired_at is not None and not self.closed
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+
+        if self.index is None:
+            self.searcher.close()
+        if self.batch_pool is not None:
+            self.batch_pool.close()
+        close_docstore(self.docstore_dir)
+        if self._retired_at is not None:
+            metrics.observe('drain', time.perf_counter() - self._retired_at)
@@ -0,0 +1,123 @@
+import hashlib
+from itertools import combinations
+from pypinyin import lazy_pinyin
+from utils.helpers import load_cached_table, save_cached_table
+
+
+CACHE_FORMAT = 'pinyin-v1'  # 磁盘缓存格式，变化时旧缓存自动失效
+WILDCARD = '*'
+
+
+def _wildcard_keys(word, sequence, mismatches):
+    """sequence 中恰好 mismatches 个位置换成通配符后得到的全部键
+
+    键以词长开头，只有字数与序列长度都相同的词才会共用键。
+    """
+    for positions in combinations(range(len(sequence)), mismatches):
+        parts = [str(len(word))] + list(sequence)
+        for i in positions:
+            parts[i + 1] = WILDCARD
+        yield '\t'.join(parts)
+
+
+class _WildcardTable:
+    """按“至多若干位置不同”查找等长序列的散列表
+
+    每个词按其序列（拼音音节或汉字）在 0..max_mismatches 个位置替换为通配符，
+    每种替换得到一个键，键 -> 按频次降序排列、以换行拼接的词。查找时对输入做同样
+    的替换，按不同位置数从少到多逐层查表，每个桶只取前几个词，代价与词表大小无关。
+    """
+
+    def __init__(self, table, max_mismatches):
+        self.table = table
+        self.max_mismatches = max_mismatches
+
+    @classmethod
+    def build(cls, sequences, counts, max_mismatches):
+        """sequences 为 {词: 序列}，counts 为 {词: 频次}"""
+        buckets = {}
+        for word, sequence in sequences.items():
+            for mismatches in range(min(max_mismatches, len(sequence) // 2) + 1):
+                for key in _wildcard_keys(word, sequence, mismatches):
+                    buckets.setdefault(key, []).append(word)
+
+        table = {key: '\n'.join(sorted(words, key=lambda w: (-counts.get(w, 0), w)))
+                 for key, words in buckets.items()}
+        return cls(table, max_mismatches)
+
+    def lookup(self, word, sequence, limit):
+        """与 word 等长、序列至多一半位置不同的其他词 [(词, 不同位置数)]，按不同位置数升序、频次降序"""
+        found = []
+        seen = {word}
+        for mismatches in range(min(self.max_mismatches, len(sequence) // 2) + 1):
+            level = []
+            for key in _wildcard_keys(word, sequence, mismatches):
+                words = self.table.get(key)
+                if words is None:
+                    continue
+                taken = 0
+                # 桶内已按频次排好序，每个桶至多取 limit 个新词
+                for candidate in words.split('\n'):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    level.append(candidate)
+                    taken += 1
+                    if taken >= limit:
+                        break
+            found.extend((candidate, mismatches) for candidate in level)
+            if len(found) >= limit:
+                break
+        return found
+
+
+class PinyinIndex:
+    """中文拼写建议用的拼音索引
+
+    词表按完整拼音（同音词）与逐音节通配键（近音词，至少一半音节相同）建索引，
+    另按汉字建同样的索引，在没有拼音相近的词时按字形（相同汉字）给出建议。
+    """
+
+    def __init__(self, counts, pinyin_table, char_table):
+        self.counts = counts
+        self.pinyin_table = pinyin_table
+        self.char_table = char_table
+
+    @staticmethod
+    def key(counts, max_mismatches):
+        """由词表、频次与参数算出的摘要，用于判断磁盘缓存是否仍然有效"""
+        digest = hashlib.sha1(f'{CACHE_FORMAT}:{max_mismatches}'.encode('utf-8'))
+        for word in sorted(counts):
+            digest.update(f'\n{word}\t{counts[word]}'.encode('utf-8'))
+        return digest.hexdigest()
+
+    @classmethod
+    def build(cls, counts, max_mismatches=2, cache_path=None):
+        """由 {词: 频次} 建索引
+
+        给出 cache_path 时优先读取其中的拼音键表（词表与参数一致才使用），否则建好后写入；
+        最耗时的是为每个词计算拼音，字形键表直接重建。
+        """
+        counts = dict(counts)
+        char_table = _WildcardTable.build({word: list(word) for word in counts}, counts, max_mismatches)
+
+        key = cls.key(counts, max_mismatches)
+        table = load_cached_table(cache_path, key)
+        if table is not None:
+            return cls(counts, _WildcardTable(table, max_mismatches), char_table)
+
+        sequences = {word: lazy_pinyin(word) for word in counts}
+        pinyin_table = _WildcardTable.build(sequences, counts, max_mismatches)
+        if cache_path is not None:
+            save_cached_table(pinyin_table.table, cache_path, key)
+        return cls(counts, pinyin_table, char_table)
+
+    def __contains__(self, word):
+        return word in self.counts
+
+    def lookup(self, word, limit=3):
+        """与 word 拼音相同或相近的词，没有时退回字形相近的词；返回 [(词, 不同位置数)]"""
+        suggestions = self.pinyin_table.lookup(word, lazy_pinyin(word), limit)
+        if not suggestions:
+            suggestions = self.char_table.lookup(word, list(word), limit)
+        return suggestions[:limit]
@@ -0,0 +1,166 @@
+import numpy as np
+from config.settings import SEARCH_CONFIG
+from indexer.binary_index import bm25_norms
+from utils.tokenizer import tokenize
+from utils.metrics import metrics
+from .boolean import parse_query
+from .bitset import DocSet
+from .topk import TermBlocks, block_max_top_k, term_scores, bm25f_term_scores, select_top_k
+
+
+def query_terms(query, language):
+    """查询中的正向词项（NOT 子句之外，不含操作符），用于计分与摘要高亮"""
+    try:
+        tree = parse_query(query, language)
+    except ValueError:
+        return tokenize(query, language)
+    return tree.positive_terms() if tree is not None else []
+
+
+class IndexSearcher:
+    """单个二进制索引上的布尔检索与 BM25 排序
+
+    documents 为文档存储，用于语言、主题等过滤。分片索引的每个分片也用它检索，
+    分片中的 IDF 与长度归一化按全局统计量写入，得分与不分片时一致；分片内部使用
+    相对 index.doc_base 的文档ID，search 返回的是全局文档ID。
+    """
+
+    def __init__(self, index, documents):
+        self.index = index
+        self.documents = documents
+        self.doc_lengths = index.doc_lengths
+        self.avg_doc_length = index.avg_doc_length
+        self._universe = None
+
+        # 索引按相同 BM25 参数建立时直接使用预计算的长度归一化数组
+        k1, b = SEARCH_CONFIG['bm25']['k1'], SEARCH_CONFIG['bm25']['b']
+        if index.matches_bm25(k1, b, self.avg_doc_length):
+            self.norms = index.norms
+        else:
+            self.norms = bm25_norms(self.doc_lengths, self.avg_doc_length, k1, b).astype(np.float32)
+
+        # BM25F 的各字段长度归一化项（正文长度 = 文档长度 - 标题长度）
+        self.field_norms = None
+        bm25f = SEARCH_CONFIG['bm25f']
+        if bm25f['enabled'] and index.has_fields:
+            title_lengths = index.title_lengths.astype(np.float64)
+            content_lengths = np.maximum(self.doc_lengths - title_lengths, 0)
+            avg_title = max(index.avg_title_length, 1e-9)
+            avg_content = max(self.avg_doc_length - index.avg_title_length, 1e-9)
+            self.field_norms = (
+                (1 - bm25f['b']['title'] + bm25f['b']['title'] * title_lengths / avg_title).astype(np.float32),
+                (1 - bm25f['b']['content'] + bm25f['b']['content'] * content_lengths / avg_content).astype(np.float32)
+            )
+
+    def search(self, query, language, top_n, filters=()):
+        """布尔检索、过滤并排序，返回 (按得分降序的全局文档ID列表, {doc_id: score})"""
+        doc_ids = self.boolean_search(query, language)
+
+        # 语言、主题过滤
+        with metrics.timer('filter'):
+            for field, value in filters:
+                if value is not None and not doc_ids.is_empty():
+                    doc_ids = doc_ids & self.facet(field, value)
+
+        with metrics.timer('rank'):
+            if SEARCH_CONFIG['top_k_pruning'] and self.field_norms is None:
+                ranked, scores = self.rank_top_k(query, doc_ids, language, top_n)
+            else:
+                ranked, scores = self.rank_documents(query, doc_ids, language, top_n)
+
+        base = self.index.doc_base
+        if base:
+            ranked = [doc_id + base for doc_id in ranked]
+            scores = {doc_id + base: score for doc_id, score in scores.items()}
+        return ranked, scores
+
+    def boolean_search(self, query, language):
+        """布尔检索，返回文档集合 DocSet"""
+        try:
+            with metrics.timer('parse'):
+                tree = parse_query(query, language)
+        except ValueError as e:
+            return DocSet.from_array([], len(self.doc_lengths))
+
+        if tree is None:
+            return DocSet.from_array([], len(self.doc_lengths))
+
+        with metrics.timer('boolean'):
+            return tree.evaluate(self.index, self.live_doc_ids)
+
+    def live_doc_ids(self):
+        """全部有效文档的位图（单独的 NOT 查询对其取补）"""
+        if self._universe is None:
+            self._universe = DocSet.from_mask(self.doc_lengths > 0)
+        return self._universe
+
+    def facet(self, field, value):
+        """字段取值为 value 的文档位图（分片时截取本分片的区间，起点按 64 对齐）"""
+        words = self.documents.facet(field, value)
+        if words is None:
+            raise ValueError(f"文档存储未建立 {field} 过滤")
+        return DocSet.from_words(words[self.index.doc_base // 64:], len(self.doc_lengths))
+
+    def rank_documents(self, query, doc_ids, language, top_n=None):
+        """基于BM25（或开启时的 BM25F）的相关性排序（NumPy 批量计分），top_n 为空时返回全部候选"""
+        tokens = query_terms(query, language)
+        if not tokens or doc_ids.is_empty():
+            return [], {}
+
+        # 按整数文档ID散列累加各词得分
+        scores = np.zeros(len(self.norms), dtype=np.float32)
+        touched = np.zeros(len(self.norms), dtype=bool)
+        for term in tokens:
+            term_id = self.index.term_id(term)
+            if term_id < 0:
+                continue
+            term_docs, contribution = self.term_contribution(term_id)
+            scores[term_docs] += contribution
+            touched[term_docs] = True
+
+        # 只保留布尔检索的候选文档
+        ranked = np.flatnonzero(doc_ids.mask() & touched)
+
+        ranked, ranked_scores = select_top_k(ranked, scores[ranked], top_n)
+        ranked = ranked.tolist()
+        return ranked, dict(zip(ranked, ranked_scores.tolist()))
+
+    def term_contribution(self, term_id):
+        """词项对其倒排中每个文档的 BM25（或 BM25F）得分，返回 (doc_ids, scores)"""
+        k1 = SEARCH_CONFIG['bm25']['k1']
+        if self.field_norms is None:
+            term_docs, term_tfs = self.index.postings_by_id(term_id)
+            return term_docs, term_scores(self.index.idf[term_id], term_tfs, self.norms[term_docs], k1)
+
+        # 字段词频与总词频在同一次倒排遍历中取出
+        term_docs, term_tfs, title_tfs = self.index.field_postings_by_id(term_id)
+        title_norms, content_norms = self.field_norms
+        return term_docs, bm25f_term_scores(
+            self.index.idf[term_id], term_tfs, title_tfs, title_norms[term_docs],
+            content_norms[term_docs], SEARCH_CONFIG['bm25f']['weights'], k1)
+
+    def rank_top_k(self, query, doc_ids, language, top_n):
+        """块最大得分剪枝的前 top_n 个 BM25 排序，结果与得分都与 rank_documents 逐位一致"""
+        tokens = query_terms(query, language)
+        if not tokens or doc_ids.is_empty():
+            return [], {}
+
+        k1 = SEARCH_CONFIG['bm25']['k1']
+        b = SEARCH_CONFIG['bm25']['b']
+
+        terms = []
+        for term in tokens:
+            term_id = self.index.term_id(term)
+            if term_id < 0:
+                continue
+            idf = self.index.idf[term_id]
+            if idf <= 0:
+                # 负 IDF 无法给出有效上界，退回完整排序
+                return self.rank_documents(query, doc_ids, language, top_n)
+            terms.append(TermBlocks(self.index, term_id, idf, k1, b, self.avg_doc_length))
+
+        # 布尔检索结果作为候选过滤
+        accept = doc_ids.mask()
+
+        top = block_max_top_k(terms, top_n, self.norms, k1, accept)
+        return [doc_id for doc_id, _ in top], dict(top)
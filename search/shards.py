@@ -0,0 +1,96 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+from indexer import DocStore, open_index
+from utils.metrics import metrics
+from .searcher import IndexSearcher
+from .batch import search_batch
+from .topk import select_top_k
+
+
+# 工作进程内已打开的分片：{分片目录: IndexSearcher}
+_shard_searchers = {}
+
+
+def _shard_searcher(shard_dir, docstore_dir):
+    searcher = _shard_searchers.get(shard_dir)
+    if searcher is None:
+        # 文档存储已由主进程打开并校验，工作进程只读其中的过滤位图
+        searcher = IndexSearcher(open_index(shard_dir), DocStore(docstore_dir))
+        _shard_searchers[shard_dir] = searcher
+    return searcher
+
+
+def _search_shard(shard_dir, docstore_dir, query, language, top_n, filters):
+    """在工作进程中检索一个分片，返回本分片的前 top_n 个 (doc_ids, scores)"""
+    ranked, scores = _shard_searcher(shard_dir, docstore_dir).search(query, language, top_n, filters)
+    return ranked, [scores[doc_id] for doc_id in ranked]
+
+
+def _search_shard_batch(shard_dir, docstore_dir, items, top_n):
+    """在工作进程中对一个分片检索一批 (query, language, filters)，整批共用倒排缓存"""
+    return [(ranked, [scores[doc_id] for doc_id in ranked])
+            for ranked, scores in search_batch(_shard_searcher(shard_dir, docstore_dir), items, top_n)]
+
+
+def _merge(parts, top_n):
+    """归并各分片的 (doc_ids, scores)：各分片文档互不重叠，按文档ID排序后统一取前 top_n 个"""
+    docs = np.concatenate([np.asarray(ranked, dtype=np.int64) for ranked, _ in parts])
+    scores = np.concatenate([np.asarray(scores, dtype=np.float32) for _, scores in parts])
+    order = np.argsort(docs)
+    ranked, scores = select_top_k(docs[order], scores[order], top_n)
+    ranked = ranked.tolist()
+    return ranked, dict(zip(ranked, scores.tolist()))
+
+
+class ShardedSearcher:
+    """按文档划分的分片索引：查询并发分发到进程池，各分片返回本地前 k 个后归并
+
+    分片的 IDF 与长度归一化在建索引时按全局文档数、全局文档频率与全局平均长度
+    写入，因此各分片的得分与不分片时完全相同，归并只需按得分取前 k 个。
+    只有一个分片时（未分片的索引）可用于把批量查询分给多个进程。
+    """
+
+    def __init__(self, shard_dirs, docstore_dir, workers=None):
+        self.shard_dirs = [str(shard_dir) for shard_dir in shard_dirs]
+        self.docstore_dir = str(docstore_dir)
+        self.workers = workers or len(self.shard_dirs)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    @classmethod
+    def from_meta(cls, index_dir, meta, docstore_dir, workers=None):
+        """由分片索引的顶层元数据打开"""
+        return cls([Path(index_dir) / name for name in meta['shards']], docstore_dir, workers)
+
+    def search(self, query, language, top_n, filters=()):
+        """返回 (按得分降序的文档ID列表, {doc_id: score})，同分时文档ID小者在前"""
+        with metrics.timer('shards'):
+            futures = [self.pool.submit(_search_shard, shard_dir, self.docstore_dir,
+                                        query, language, top_n, filters)
+                       for shard_dir in self.shard_dirs]
+            return _merge([future.result() for future in futures], top_n)
+
+    def search_many(self, items, top_n):
+        """批量检索 (query, language, filters)，返回与 items 一一对应的结果
+
+        每个分片一次接收一整批（工作进程多于分片数时再把批次切块），而不是每条
+        查询单独提交。
+        """
+        if not items:
+            return []
+        with metrics.timer('shards'):
+            chunks = max(1, self.workers // len(self.shard_dirs))
+            size = -(-len(items) // chunks)
+            futures = [(start, self.pool.submit(_search_shard_batch, shard_dir, self.docstore_dir,
+                                                items[start:start + size], top_n))
+                       for shard_dir in self.shard_dirs
+                       for start in range(0, len(items), size)]
+
+            parts = [[] for _ in items]
+            for start, future in futures:
+                for i, result in enumerate(future.result()):
+                    parts[start + i].append(result)
+            return [_merge(query_parts, top_n) for query_parts in parts]
+
+    def close(self):
+        self.pool.shutdown()
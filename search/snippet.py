@@ -0,0 +1,53 @@
+import re
+from bisect import bisect_right
+
+
+def compile_highlighter(terms):
+    """把查询词编译成一个正则：英文词按整词匹配，中文词按子串匹配，优先最长匹配"""
+    patterns = []
+    for term in sorted(set(terms), key=len, reverse=True):
+        escaped = re.escape(term)
+        if term.isascii() and term.isalnum():
+            escaped = rf'(?<![A-Za-z0-9]){escaped}(?![A-Za-z0-9])'
+        patterns.append(escaped)
+    if not patterns:
+        return None
+    return re.compile('|'.join(patterns), re.IGNORECASE)
+
+
+def make_snippet(content, highlighter, offsets, max_length):
+    """在首个命中位置所在的句子内截取不超过 max_length 的摘要
+
+    offsets 为建索引时保存的句子起始偏移。返回 (snippet, highlights)，
+    highlights 为命中词在 snippet 中的 [start, end) 偏移列表。
+    """
+    match = highlighter.search(content) if highlighter else None
+    if match is None:
+        return _truncate(content, 0, len(content), max_length)
+
+    # 命中位置所在句子的区间（不含句末标点）
+    i = bisect_right(offsets, match.start()) - 1
+    sentence_start = offsets[i]
+    sentence_end = offsets[i + 1] - 1 if i + 1 < len(offsets) else len(content)
+    while sentence_start < match.start() and content[sentence_start].isspace():
+        sentence_start += 1
+
+    # 默认从句首截取；命中词超出窗口时让窗口包含命中词
+    start = sentence_start
+    if match.end() > start + max_length:
+        start = max(sentence_start, match.start() - max_length // 4)
+    snippet, highlights = _truncate(content, start, sentence_end, max_length)
+
+    prefix = '...' if start > sentence_start else ''
+    end = min(sentence_end, start + max_length)
+    for m in highlighter.finditer(content, start):
+        if m.end() > end:
+            break
+        highlights.append([m.start() - start + len(prefix), m.end() - start + len(prefix)])
+    return prefix + snippet, highlights
+
+
+def _truncate(content, start, end, max_length):
+    """截取 content[start:end] 的前 max_length 个字符，超出时加省略号"""
+    text = content[start:min(end, start + max_length)]
+    return text + ('...' if end - start > max_length else ''), []
@@ -1,26 +1,53 @@
+import re
 from collections import Counter
 import numpy as np
 import jieba
 from pathlib import Path
 from config.settings import SEARCH_CONFIG
 from utils.language import detect_language
+from .symspell import SymSpell
+from .pinyin_index import PinyinIndex
+from .boolean import is_operator
+
+
+# 查询中的词可能带有括号、引号：(word、"word)
+_QUERY_WORD = re.compile(r'^([("]*)(.*?)([)"]*)$')
 
 
 class SpellChecker:
     def __init__(self):
-        # 加载词典
+        config = SEARCH_CONFIG['spellcheck']
+        # 加载词典：{词: 词频}
         self.vocab = {
-            'en': self._load_vocab(SEARCH_CONFIG['spellcheck']['en_dict']),
-            'zh': self._load_vocab(SEARCH_CONFIG['spellcheck']['zh_dict'])
+            'en': self._load_vocab(config['en_dict']),
+            'zh': self._load_vocab(config['zh_dict'])
         }
 
+        # 英文建议用对称删除索引，建一次（或从磁盘缓存读取）后每次查询只需若干次查表
+        # （按小写匹配，返回词典中的原始写法）
+        self._en_words = {w.lower(): w for w in self.vocab['en']}
+        cache_path = Path(config['cache_dir']) / 'symspell_en.json' if config['cache_dir'] else None
+        self.symspell = SymSpell.build({w.lower(): c for w, c in self.vocab['en'].items()},
+                                       config['max_distance'], config['prefix_length'], cache_path)
+
+        # 中文建议用预建的拼音索引，同音、近音词的查找都是查表
+        cache_path = Path(config['cache_dir']) / 'pinyin_zh.json' if config['cache_dir'] else None
+        self.pinyin_index = PinyinIndex.build(self.vocab['zh'], config['max_syllable_mismatches'], cache_path)
+
     def _load_vocab(self, filepath):
-        """加载词典文件"""
+        """加载词典文件，每行为词及可选的词频，# 开头的行为注释"""
         if not Path(filepath).exists():
-            return set()
+            return {}
 
+        vocab = {}
         with open(filepath, 'r', encoding='utf-8') as f:
-            return set(line.strip() for line in f if line.strip())
+            for line in f:
+                parts = line.split()
+                if not parts or parts[0].startswith('#'):
+                    continue
+                count = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+                vocab[parts[0]] = max(vocab.get(parts[0], 0), count)
+        return vocab
 
     def correct(self, text):
         """纠正拼写错误"""
@@ -30,18 +57,19 @@ class SpellChecker:
         return self._correct_english(text)
 
     def _correct_english(self, text):
-        """纠正英文拼写"""
+        """纠正英文拼写（布尔运算符、括号与引号原样保留）"""
         words = text.split()
         corrected = []
 
         for word in words:
-            if word.lower() in self.vocab['en']:
+            prefix, core, suffix = _QUERY_WORD.match(word).groups()
+            if not core or is_operator(core) or core.lower() in self.symspell:
                 corrected.append(word)
                 continue
 
-            # 寻找最相似的词
-            suggestions = self._get_english_suggestions(word)
-            corrected.append(suggestions[0] if suggestions else word)
+            # 寻找最相似的词（不纠正成运算符）
+            suggestions = [s for s in self._get_english_suggestions(core) if not is_operator(s)]
+            corrected.append(prefix + suggestions[0] + suffix if suggestions else word)
 
         return ' '.join(corrected)
 
@@ -51,7 +79,7 @@ class SpellChecker:
         corrected = []
 
         for word in words:
-            if word in self.vocab['zh']:
+            if word in self.vocab['zh'] or is_operator(word):
                 corrected.append(word)
                 continue
 
@@ -62,81 +90,11 @@ class SpellChecker:
         return ''.join(corrected)
 
     def _get_english_suggestions(self, word, max_distance=2):
-        """获取英文拼写建议"""
-        suggestions = []
-        for vocab_word in self.vocab['en']:
-            if abs(len(vocab_word) - len(word)) > max_distance:
-                continue
-
-            distance = self._edit_distance(word.lower(), vocab_word.lower())
-            if distance <= max_distance:
-                suggestions.append((vocab_word, distance))
-
-        suggestions.sort(key=lambda x: x[1])
-        return [s[0] for s in suggestions[:3]]
+        """获取英文拼写建议：按编辑距离升序、词频降序的前 3 个词"""
+        return [self._en_words[s[0]] for s in self.symspell.lookup(word.lower(), max_distance, limit=3)]
 
     def _get_chinese_suggestions(self, word):
-        if not word or not self.vocab['zh']:
-            return []
-            # 如果词汇表中存在该词，认为拼写正确
-        if word in self.vocab['zh']:
+        """获取中文拼写建议：同音词优先，其次近音词（至少一半音节相同），都没有时按相同汉字"""
+        if not word or word in self.pinyin_index:
             return []
-        suggestions = []
-        # 1. 拼音相似性检查
-       
-        from pypinyin import pinyin, Style
-        # 获取输入词的拼音
-        word_pinyin = [item[0] for item in pinyin(word, style=Style.NORMAL)]
-        for vocab_word in self.vocab['zh']:
-            # 跳过长度差异大的词
-            if abs(len(vocab_word) - len(word)) > 1:
-                continue
-            # 获取候选词拼音
-            vocab_pinyin = [item[0] for item in pinyin(vocab_word, style=Style.NORMAL)]
-            # 简单拼音相似度计算
-            if word_pinyin == vocab_pinyin:
-                # 拼音完全相同但字形不同（同音字）
-                suggestions.append((vocab_word, 1))
-            elif len(word_pinyin) == len(vocab_pinyin):
-                # 拼音长度相同，计算相同拼音的数量
-                same_pinyin = sum(1 for w, v in zip(word_pinyin, vocab_pinyin) if w == v)
-                similarity = same_pinyin / len(word_pinyin)
-                if similarity >= 0.5:  # 至少50%拼音相同
-                    suggestions.append((vocab_word, 1 - similarity))
-        
-        # 2. 简单字形相似性检查
-        if not suggestions:
-            for vocab_word in self.vocab['zh']:
-                if len(vocab_word) != len(word):
-                    continue
-
-                # 计算相同字符数
-                same_chars = sum(1 for w, v in zip(word, vocab_word) if w == v)
-                similarity = same_chars / len(word)
-                if similarity >= 0.5:  # 至少50%字符相同
-                    suggestions.append((vocab_word, 1 - similarity))
-
-        # 3. 排序并返回前3个建议
-        suggestions.sort(key=lambda x: x[1])  # 按相似度排序
-        print(f"ZH suggestions{suggestions}")
-        return [s[0] for s in suggestions[:3]]
-
-    def _edit_distance(self, s1, s2):
-        """计算编辑距离"""
-        if len(s1) < len(s2):
-            return self._edit_distance(s2, s1)
-
-        if len(s2) == 0:
-            return len(s1)
-
-        previous_row = range(len(s2) + 1)
-        for i, c1 in enumerate(s1):
-            current_row = [i + 1]
-            for j, c2 in enumerate(s2):
-                insertions = previous_row[j + 1] + 1
-                deletions = current_row[j] + 1
-                substitutions = previous_row[j] + (c1 != c2)
-                current_row.append(min(insertions, deletions, substitutions))
-            previous_row = current_row
-
-        return previous_row[-1]
\ No newline at end of file
+        return [s[0] for s in self.pinyin_index.lookup(word, limit=3)]
@@ -0,0 +1,149 @@
+import hashlib
+from utils.helpers import load_cached_table, save_cached_table
+
+
+CACHE_FORMAT = 'symspell-v2'  # 磁盘缓存格式，变化时旧缓存自动失效
+
+
+def edit_distance(s1, s2, max_distance=None):
+    """计算编辑距离（Levenshtein）
+
+    给出 max_distance 时，一旦整行的最小值已超过它就提前返回 max_distance + 1。
+    """
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+
+    if len(s2) == 0:
+        return len(s1)
+
+    previous_row = range(len(s2) + 1)
+    for i, c1 in enumerate(s1):
+        current_row = [i + 1]
+        for j, c2 in enumerate(s2):
+            insertions = previous_row[j + 1] + 1
+            deletions = current_row[j] + 1
+            substitutions = previous_row[j] + (c1 != c2)
+            current_row.append(min(insertions, deletions, substitutions))
+        if max_distance is not None and min(current_row) > max_distance:
+            return max_distance + 1
+        previous_row = current_row
+
+    return previous_row[-1]
+
+
+def _delete_levels(word, max_distance):
+    """依次生成 word 恰好删去 0, 1, ..., max_distance 个字符得到的字符串集合"""
+    seen = {word}
+    frontier = [word]
+    yield frontier
+    for _ in range(max_distance):
+        next_frontier = []
+        for w in frontier:
+            for i in range(len(w)):
+                delete = w[:i] + w[i + 1:]
+                if delete not in seen:
+                    seen.add(delete)
+                    next_frontier.append(delete)
+        frontier = next_frontier
+        yield frontier
+
+
+def _deletes(word, max_distance):
+    """word 删去至多 max_distance 个字符得到的全部字符串（含 word 本身）"""
+    return [delete for level in _delete_levels(word, max_distance) for delete in level]
+
+
+class SymSpell:
+    """对称删除（SymSpell）拼写建议索引
+
+    建索引时为每个词（只取前 prefix_length 个字符）生成删去至多 max_distance 个字符
+    的所有变体，记录 变体 -> 原词。查询时对输入词做同样的删除，用这些变体查表得到
+    候选词，只对候选词计算真实编辑距离。查询代价只与词长有关，与词表大小无关。
+    删除表的值为以换行拼接的词，比每项一个列表省内存，也便于写入磁盘缓存。
+    """
+
+    def __init__(self, max_distance=2, prefix_length=7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.words = {}    # 词 -> 频次
+        self.deletes = {}  # 删除变体 -> '词1\n词2...'
+
+    def add_word(self, word, count=0):
+        if word in self.words:
+            self.words[word] = max(self.words[word], count)
+            return
+        self.words[word] = count
+        for delete in _deletes(word[:self.prefix_length], self.max_distance):
+            words = self.deletes.get(delete)
+            self.deletes[delete] = word if words is None else words + '\n' + word
+
+    def __contains__(self, word):
+        return word in self.words
+
+    def __len__(self):
+        return len(self.words)
+
+    def lookup(self, word, max_distance=None, limit=None):
+        """编辑距离不超过 max_distance 的词 [(词, 距离, 频次)]，按距离升序、频次降序排列
+
+        按删除层数逐层扩大：删去 d 个字符的变体已能找到全部距离不超过 d 的词，
+        若此时已有 limit 个结果，更远的词不会进入前 limit 个，无需继续。
+        """
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+
+        checked = set()
+        suggestions = []
+        for depth, level in enumerate(_delete_levels(word[:self.prefix_length], max_distance)):
+            for delete in level:
+                words = self.deletes.get(delete)
+                if words is None:
+                    continue
+                for candidate in words.split('\n'):
+                    if candidate in checked:
+                        continue
+                    checked.add(candidate)
+                    if abs(len(candidate) - len(word)) > max_distance:
+                        continue
+                    distance = edit_distance(word, candidate, max_distance)
+                    if distance <= max_distance:
+                        suggestions.append((candidate, distance, self.words[candidate]))
+
+            if limit is not None and sum(1 for s in suggestions if s[1] <= depth) >= limit:
+                suggestions = [s for s in suggestions if s[1] <= depth]
+                break
+
+        suggestions.sort(key=lambda s: (s[1], -s[2], s[0]))
+        return suggestions[:limit]
+
+    def key(self):
+        """由词表、频次与参数算出的摘要，用于判断磁盘缓存是否仍然有效"""
+        digest = hashlib.sha1(f'{CACHE_FORMAT}:{self.max_distance}:{self.prefix_length}'.encode('utf-8'))
+        for word in sorted(self.words):
+            digest.update(f'\n{word}\t{self.words[word]}'.encode('utf-8'))
+        return digest.hexdigest()
+
+    @classmethod
+    def build(cls, counts, max_distance=2, prefix_length=7, cache_path=None):
+        """由 {词: 频次} 建索引
+
+        给出 cache_path 时优先读取其中的删除表（词表与参数一致才使用），否则建好后写入。
+        """
+        index = cls(max_distance, prefix_length)
+        index.words = dict(counts)
+        key = index.key()
+
+        deletes = load_cached_table(cache_path, key)
+        if deletes is not None:
+            index.deletes = deletes
+            return index
+
+        deletes = {}
+        for word in index.words:
+            for delete in _deletes(word[:prefix_length], max_distance):
+                deletes.setdefault(delete, []).append(word)
+        index.deletes = {delete: '\n'.join(words) for delete, words in deletes.items()}
+
+        if cache_path is not None:
+            save_cached_table(index.deletes, cache_path, key)
+        return index
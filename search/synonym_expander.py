@@ -1,81 +1,115 @@
-from collections import defaultdict
-from pathlib import Path
+import re
+from functools import lru_cache
 from config.settings import SEARCH_CONFIG
 from utils.language import detect_language
+from utils.helpers import load_thesaurus
+from utils.phrase_trie import PhraseTrie
+from indexer.synonym_groups import group_term, group_members, phrase_pattern, thesaurus_digest
+from .boolean import is_operator
 import jieba
 
 
 class SynonymExpander:
     def __init__(self):
-        # 加载同义词词典
+        # 加载同义词词典（digest 用于核对索引中的同义词组倒排是否按同一词典建立）
+        self.digest = thesaurus_digest()
         self.thesaurus = {
-            'en': self._load_thesaurus(SEARCH_CONFIG['synonyms']['en']),
-            'zh': self._load_thesaurus(SEARCH_CONFIG['synonyms']['zh'])
+            'en': load_thesaurus(SEARCH_CONFIG['synonyms']['en']),
+            'zh': load_thesaurus(SEARCH_CONFIG['synonyms']['zh'])
         }
 
+        # 词条编译为前缀树：英文按空格分隔的词匹配，中文按分词结果拼接后匹配
+        self.tries = {'en': PhraseTrie(' '), 'zh': PhraseTrie('')}
+        for language, trie in self.tries.items():
+            for phrase in self.thesaurus[language]:
+                trie.add(phrase)
+
         # 定义布尔运算符集合（不区分大小写）
         self.boolean_operators = {'AND', 'OR', 'NOT'}
 
-        # 初始化中文分词
-        jieba.initialize()
+        # 扩展结果按查询缓存（LRU）
+        self._expand_cached = lru_cache(maxsize=SEARCH_CONFIG['synonyms']['cache_size'])(self._expand)
 
-    def _load_thesaurus(self, filepath):
-        """加载同义词词典"""
-        thesaurus = defaultdict(list)
-        if not Path(filepath).exists():
-            return thesaurus
+    def _is_operator(self, token):
+        return token.upper() in self.boolean_operators
 
-        with open(filepath, 'r', encoding='utf-8') as f:
-            for line in f:
-                if ':' in line:
-                    word, synonyms = line.strip().split(':', 1)
-                    thesaurus[word] = [s.strip() for s in synonyms.split(',')]
-        return thesaurus
+    def match(self, tokens, language):
+        """在分好的词中找出同义词词条：[(原文词列表, 词条或 None)]，相邻词按最长词条合并"""
+        trie = self.tries[language]
+        matches = []
+        i = 0
+        while i < len(tokens):
+            phrase, end = trie.longest_match(tokens, i, self._is_operator)
+            if phrase is None:
+                end = i + 1
+            matches.append((tokens[i:end], phrase))
+            i = end
+        return matches
 
-    def expand(self, query):
-        """扩展查询词，同义词用 OR 连接，原运算符保留"""
-        language = detect_language(query)
+    def _tokens(self, query, language):
         if language == 'zh':
-            return self._expand_chinese(query)
-        return self._expand_english(query)
+            # 使用 jieba 分词（注意：jieba 可能拆出空格，需过滤）
+            return [w for w in jieba.cut(query) if w.strip()]
+        return query.split()
 
-    def _expand_english(self, query):
-        """处理英文查询：同义词用 OR 连接，原运算符保留"""
-        tokens = query.split()
-        expanded_tokens = []
+    def _spans(self, query, language):
+        """与 _tokens 相同的分词结果及各词在 query 中的 (起点, 终点)"""
+        if language == 'zh':
+            return [(w, start, end) for w, start, end in jieba.tokenize(query) if w.strip()]
+        return [(m.group(), m.start(), m.end()) for m in re.finditer(r'\S+', query)]
 
-        for token in tokens:
-            # 如果是运算符，直接保留
-            if token.upper() in self.boolean_operators:
-                expanded_tokens.append(token)
-            else:
-                # 获取当前词及其同义词（最多2个）
-                synonyms = [token]
-                if token.lower() in self.thesaurus['en']:
-                    synonyms.extend(self.thesaurus['en'][token.lower()][:2])
-                # 用 OR 连接同义词组
-                expanded_tokens.append(" OR ".join(synonyms))
+    def expand(self, query, group_terms=False):
+        """扩展查询：与同义词词条匹配的词（短语）替换为 (词条 OR 同义词...)，其余原文（含运算符）不变
 
-        return ' '.join(expanded_tokens)
+        同义词与索引中的同义词组一样取每个词条的前 MAX_EXPANSIONS 个，分词后多于一个词的加引号
+        按短语匹配。group_terms 为真（索引写入了同义词组倒排）时每组开头加上组词项，布尔检索只读
+        这一条合并的倒排，计分仍按各同义词，结果与不加时相同。含双引号短语的查询按原文检索。
+        """
+        return self._expand_cached(query, group_terms)
 
-    def _expand_chinese(self, query):
-        """处理中文查询：同义词用 OR 连接，原运算符保留"""
-        # 使用 jieba 分词（注意：jieba 可能拆出空格，需过滤）
-        words = [w for w in jieba.cut(query) if w.strip()]
-        expanded_words = []
+    def _expand(self, query, group_terms):
+        if '"' in query:
+            return query
+        language = detect_language(query)
+        spans = self._spans(query, language)
+        tokens = [token for token, _, _ in spans]
 
-        for word in words:
-            # 如果是运算符，直接保留（统一大写）
-            if word.upper() in self.boolean_operators:
-                expanded_words.append(word.upper())
-            else:
-                # 获取当前词及其同义词（最多2个）
-                synonyms = [word]
-                if word in self.thesaurus['zh']:
-                    synonyms.extend(self.thesaurus['zh'][word][:2])
-                # 用 OR 连接同义词组
-                expanded_words.append(" OR ".join(synonyms))
+        parts = []
+        last = 0
+        i = 0
+        while i < len(tokens):
+            phrase, end = self.tries[language].longest_match(tokens, i, self._is_operator)
+            alternatives = self._alternatives(phrase, language, group_terms) if phrase is not None else None
+            if alternatives is None:
+                i = max(end, i + 1)
+                continue
+            parts.append(query[last:spans[i][1]])
+            parts.append(' ' + alternatives + ' ')
+            last = spans[end - 1][2]
+            i = end
+        parts.append(query[last:])
+        return ' '.join(''.join(parts).split())
 
-        # 中文需重新组合（无空格）
-        return ''.join(expanded_words)
+    def _alternatives(self, phrase, language, group_terms):
+        """词条及其同义词以 OR 连接的括号表达式，没有可检索的成员时返回 None"""
+        members = []
+        for member in group_members(phrase, self.thesaurus[language][phrase]):
+            pattern = phrase_pattern(member, language)
+            if not pattern:
+                continue
+            if len(pattern) > 1 or not re.fullmatch(r'\w+', member) or is_operator(member):
+                member = f'"{member}"'
+            members.append(member)
+        if not members:
+            return None
+        if group_terms:
+            members.insert(0, group_term(phrase))
+        return '(' + ' OR '.join(members) + ')'
 
+    def suggest(self, query, limit=3):
+        """查询中各词（短语）的同义词 [{'word', 'synonyms'}]，每项至多 limit 个"""
+        language = detect_language(query)
+        separator = '' if language == 'zh' else ' '
+        return [{'word': separator.join(words), 'synonyms': self.thesaurus[language][phrase][:limit]}
+                for words, phrase in self.match(self._tokens(query, language), language)
+                if phrase is not None]
@@ -0,0 +1,145 @@
+import heapq
+import numpy as np
+
+
+def term_scores(idf, tfs, norms, k1):
+    """一个词在一组倒排记录上的 BM25 得分（float32 批量计算）
+
+    norms 为这些记录对应文档的 k1 * (1 - b + b * len / avgdl)。
+    """
+    tfs = tfs.astype(np.float32)
+    return np.float32(idf) * (tfs * np.float32(k1 + 1)) / (tfs + norms)
+
+
+def bm25f_term_scores(idf, tfs, title_tfs, title_norms, content_norms, weights, k1):
+    """一个词在一组倒排记录上的 BM25F 得分（float32 批量计算）
+
+    各字段词频先除以本字段的长度归一化 (1 - b_f + b_f * len_f / avglen_f) 再按权重
+    相加，合并后的词频代入 BM25 的饱和函数。title_norms/content_norms 为这些记录对应
+    文档的字段归一化项。
+    """
+    title_tfs = title_tfs.astype(np.float32)
+    content_tfs = tfs.astype(np.float32) - title_tfs
+    tf = (np.float32(weights['title']) * title_tfs / title_norms
+          + np.float32(weights['content']) * content_tfs / content_norms)
+    return np.float32(idf) * (tf * np.float32(k1 + 1)) / (tf + np.float32(k1))
+
+
+def select_top_k(doc_ids, scores, k):
+    """从升序的 doc_ids 及其得分中取前 k 个，按得分降序、同分时文档ID小者在前"""
+    if k is not None and len(scores) > k:
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:k - len(above)]
+        keep = np.concatenate((above, ties))
+        doc_ids, scores = doc_ids[keep], scores[keep]
+    order = np.lexsort((doc_ids, -scores))
+    return doc_ids[order], scores[order]
+
+
+class TermBlocks:
+    """单个查询词的倒排块视图，提供每块的 BM25 得分上界
+
+    索引按相同 BM25 参数建立时使用精确的块最大得分；否则由块内最大词频与
+    最短文档长度推出一个对任意 k1/b/avgdl 都成立的宽松上界。
+    """
+
+    def __init__(self, index, term_id, idf, k1, b, avg_doc_length):
+        self.idf = idf
+        self.index = index
+        self.term_id = term_id
+        self._decoded = {}  # 已解码的块，同一块常跨越多个区间
+        last_docs, max_tfs, min_lens, max_scores = index.blocks_by_id(term_id)
+        self.block_last = np.asarray(last_docs, dtype=np.int64)
+
+        if index.matches_bm25(k1, b, avg_doc_length):
+            block_max = float(idf) * max_scores.astype(np.float64)
+        else:
+            # 宽松上界：tf 取块内最大、文档长度取块内最短
+            max_tfs = max_tfs.astype(np.float64)
+            norms = k1 * (1 - b + b * min_lens / avg_doc_length)
+            block_max = float(idf) * max_tfs * (k1 + 1) / (max_tfs + norms)
+        # 实际得分以 float32 计算，略微放大上界以抵消舍入误差
+        self.block_max = block_max * (1 + 1e-5)
+        self.max_score = float(self.block_max.max()) if len(self.block_max) else 0.0
+
+    def block_postings(self, block):
+        """第 block 块的 (doc_ids, tfs)，只在首次访问时读取（解码）该块"""
+        postings = self._decoded.get(block)
+        if postings is None:
+            postings = self._decoded[block] = self.index.block_postings_by_id(self.term_id, block)
+        return postings
+
+
+def block_max_top_k(terms, k, norms, k1, accept=None):
+    """基于块最大得分剪枝的 BM25 前 k 个文档（Block-Max WAND 的区间化变体）
+
+    所有查询词的块边界把文档ID空间切成若干区间，每个区间内每个词至多落在
+    一个块中，区间上界即这些块上界之和。区间按上界从高到低处理，用有界小
+    顶堆维护前 k 个结果；一旦区间上界低于堆中第 k 名的得分，剩余区间都不可
+    能进入结果，直接结束。区间内的计分用 NumPy 批量完成。
+
+    terms 为 TermBlocks 列表（同一词项出现多次时可重复）；norms 为按文档ID
+    索引的长度归一化数组；accept 为可选的布尔数组，只有 accept[doc] 为真的
+    文档才会进入结果。返回按得分降序的 [(doc_id, score)]，同分时文档ID小者在前；
+    得分与累加顺序都与完整排序相同，结果与对全部候选排序后取前 k 个一致。
+    """
+    terms = [t for t in terms if len(t.block_last)]
+    if not terms or k <= 0:
+        return []
+
+    # 区间右端点为所有块的最后文档ID
+    bounds = np.unique(np.concatenate([t.block_last for t in terms]))
+    lows = np.concatenate(([-1], bounds[:-1]))  # 区间为 (low, high]
+
+    # 每个区间对应各词的块号与区间上界
+    term_blocks = []
+    upper = np.zeros(len(bounds))
+    for t in terms:
+        blocks = np.searchsorted(t.block_last, bounds, side='left')
+        valid = blocks < len(t.block_last)
+        upper[valid] += t.block_max[blocks[valid]]
+        term_blocks.append(np.where(valid, blocks, -1))
+
+    heap = []  # (score, -doc_id) 小顶堆
+    for interval in np.argsort(-upper, kind='stable'):
+        if len(heap) >= k and upper[interval] < heap[0][0]:
+            break
+
+        low, high = lows[interval], bounds[interval]
+        doc_parts, score_parts = [], []
+        for t, blocks in zip(terms, term_blocks):
+            block = blocks[interval]
+            if block < 0:
+                continue
+            docs, tfs = t.block_postings(block)
+            inside = (docs > low) & (docs <= high)
+            docs = docs[inside]
+            if len(docs) == 0:
+                continue
+            doc_parts.append(docs)
+            score_parts.append(term_scores(t.idf, tfs[inside], norms[docs], k1))
+        if not doc_parts:
+            continue
+
+        # 按文档合并各词得分：与完整排序一样按查询词顺序逐词以 float32 累加，得分逐位一致
+        docs = np.unique(np.concatenate(doc_parts))
+        scores = np.zeros(len(docs), dtype=np.float32)
+        for part_docs, part_scores in zip(doc_parts, score_parts):
+            scores[np.searchsorted(docs, part_docs)] += part_scores
+
+        if accept is not None:
+            keep = accept[docs]
+            docs, scores = docs[keep], scores[keep]
+        if len(heap) >= k:
+            keep = scores >= heap[0][0]
+            docs, scores = docs[keep], scores[keep]
+
+        for doc_id, score in zip(docs.tolist(), scores.tolist()):
+            entry = (score, -doc_id)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    return [(-neg_doc, score) for score, neg_doc in sorted(heap, reverse=True)]
@@ -0,0 +1,72 @@
+"""按块位压缩的倒排与未压缩格式解码结果一致"""
+import numpy as np
+import pytest
+from config.settings import INDEX_CONFIG
+from indexer.binary_index import (BLOCK_SIZE, DOC_IDS_FILE, PACK_CHUNK_BLOCKS, POSTINGS_FILE, TFS_FILE,
+                                  TITLE_TFS_FILE, IndexReader, write_index)
+
+
+def _corpus():
+    """小语料的倒排：常见词跨多块且末块不满，稠密词跨多个压缩批次，另有稀疏词与只出现一次的词"""
+    rng = np.random.default_rng(17)
+    num_docs = PACK_CHUNK_BLOCKS * BLOCK_SIZE + 500
+    inverted_index = {
+        'dense': {doc_id: 1 for doc_id in range(num_docs) if doc_id % 97},
+        'common': {doc_id: int(rng.integers(1, 6)) for doc_id in range(num_docs) if doc_id % 3},
+        'long': {doc_id: 1 for doc_id in range(0, 7 * (BLOCK_SIZE + 5), 7)},
+        'rare': {5: 2, 480: 1, num_docs - 1: 40},
+        'single': {42: 3},
+    }
+    title_tfs = {term: {doc_id: tf // 2 for doc_id, tf in postings.items()}
+                 for term, postings in inverted_index.items()}
+    doc_lengths = {doc_id: int(rng.integers(20, 200)) for doc_id in range(num_docs)}
+    title_lengths = {doc_id: 8 for doc_id in range(num_docs)}
+    return inverted_index, title_tfs, doc_lengths, title_lengths
+
+
+def _build(tmp_path, monkeypatch, compression):
+    monkeypatch.setitem(INDEX_CONFIG, 'compression', compression)
+    inverted_index, title_tfs, doc_lengths, title_lengths = _corpus()
+    index_dir = tmp_path / (compression or 'plain')
+    write_index(index_dir, inverted_index, doc_lengths, sum(doc_lengths.values()) / len(doc_lengths),
+                title_tfs=title_tfs, title_lengths=title_lengths)
+    return index_dir
+
+
+@pytest.fixture
+def indexes(tmp_path, monkeypatch):
+    return _build(tmp_path, monkeypatch, None), _build(tmp_path, monkeypatch, 'packed')
+
+
+def test_corpus_covers_partial_blocks():
+    inverted_index = _corpus()[0]
+    for term in ('common', 'dense', 'long'):
+        assert len(inverted_index[term]) > BLOCK_SIZE
+        assert len(inverted_index[term]) % BLOCK_SIZE
+    assert len(inverted_index['dense']) > PACK_CHUNK_BLOCKS * BLOCK_SIZE
+
+
+def test_packed_postings_smaller(indexes):
+    plain_dir, packed_dir = indexes
+    plain_size = sum((plain_dir / name).stat().st_size for name in (DOC_IDS_FILE, TFS_FILE, TITLE_TFS_FILE))
+    assert (packed_dir / POSTINGS_FILE).stat().st_size < plain_size / 4
+
+
+def test_packed_postings_decode_identically(indexes):
+    plain, packed = (IndexReader(index_dir) for index_dir in indexes)
+    assert packed.compression == 'packed' and plain.compression is None
+    assert len(plain) == len(packed)
+
+    for term_id in range(len(plain)):
+        assert plain.term(term_id) == packed.term(term_id)
+        for expected, actual in zip(plain.postings_by_id(term_id), packed.postings_by_id(term_id)):
+            np.testing.assert_array_equal(expected, actual)
+        for expected, actual in zip(plain.field_postings_by_id(term_id), packed.field_postings_by_id(term_id)):
+            np.testing.assert_array_equal(expected, actual)
+
+        num_blocks = len(plain.blocks_by_id(term_id)[0])
+        assert num_blocks == -(-plain.df_by_id(term_id) // BLOCK_SIZE)
+        for block in range(num_blocks):
+            for expected, actual in zip(plain.block_postings_by_id(term_id, block),
+                                        packed.block_postings_by_id(term_id, block)):
+                np.testing.assert_array_equal(expected, actual)
@@ -0,0 +1,39 @@
+"""块最大得分剪枝的前 k 个结果与完整排序一致"""
+import numpy as np
+import pytest
+from config.settings import SEARCH_CONFIG
+from indexer.binary_index import BLOCK_SIZE, IndexReader, write_index
+from search.searcher import IndexSearcher
+
+TERMS = ['alpha', 'bravo', 'charlie', 'delta', 'echo']
+QUERIES = ['alpha', 'alpha bravo', 'alpha OR bravo', 'bravo charlie delta', 'alpha OR charlie OR echo',
+           'delta echo', 'alpha alpha bravo']
+
+
+@pytest.fixture(scope='module')
+def index_dir(tmp_path_factory):
+    """词频小、文档长度取值少的语料，得分大量相同或只差末位，各词跨多块"""
+    rng = np.random.default_rng(2)
+    num_docs = 12 * BLOCK_SIZE + 37
+    inverted_index = {}
+    for i, term in enumerate(TERMS):
+        docs = np.flatnonzero(rng.random(num_docs) < 0.6 / (i + 1))
+        inverted_index[term] = {int(doc_id): int(rng.integers(1, 4)) for doc_id in docs}
+    doc_lengths = {doc_id: int(rng.choice([10, 11, 40, 90])) for doc_id in range(num_docs)}
+    index_dir = tmp_path_factory.mktemp('topk')
+    write_index(index_dir, inverted_index, doc_lengths, sum(doc_lengths.values()) / num_docs)
+    return index_dir
+
+
+@pytest.mark.parametrize('b', [SEARCH_CONFIG['bm25']['b'], 0.4])  # 后者使用宽松的块上界
+def test_pruned_top_k_matches_full_ranking(index_dir, monkeypatch, b):
+    monkeypatch.setitem(SEARCH_CONFIG, 'bm25', dict(SEARCH_CONFIG['bm25'], b=b))
+    searcher = IndexSearcher(IndexReader(index_dir), None)
+    assert searcher.field_norms is None
+
+    for query in QUERIES:
+        doc_ids = searcher.boolean_search(query, 'en')
+        assert not doc_ids.is_empty()
+        for k in (1, 10, 100, 1000):
+            expected = searcher.rank_documents(query, doc_ids, 'en', k)
+            assert searcher.rank_top_k(query, doc_ids, 'en', k) == expected, (query, k)
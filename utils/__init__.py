@@ -2,6 +2,7 @@
 from .helpers import (
     load_stopwords,
     normalize_text,
+    sentence_offsets,
     contains_keywords,
     load_documents,
     save_json
@@ -12,6 +13,7 @@ from .language import detect_language
 __all__ = [
     'load_stopwords',
     'normalize_text',
+    'sentence_offsets',
     'contains_keywords',
     'load_documents',
     'save_json',
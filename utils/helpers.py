@@ -1,3 +1,4 @@
+import hashlib
 import json
 import os
 import re
@@ -19,6 +20,32 @@ def load_stopwords(filepath):
     return stopwords
 
 
+def load_thesaurus(filepath):
+    """加载同义词词典 {词条: [同义词]}，每行为 词条:同义词1,同义词2；词条转小写，多词词条的词间保留一个空格"""
+    thesaurus = {}
+    if not Path(filepath).exists():
+        return thesaurus
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            if ':' in line:
+                word, synonyms = line.strip().split(':', 1)
+                word = ' '.join(word.lower().split())
+                if word:
+                    thesaurus[word] = [s.strip() for s in synonyms.split(',')]
+    return thesaurus
+
+
+def file_digest(paths):
+    """若干文件内容的 sha1 摘要（不存在的文件按空内容计），用于判断词典等是否已变化"""
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(b'\0')
+        if Path(path).exists():
+            digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+
 def normalize_text(text):
     """文本规范化处理"""
     if not text:
@@ -29,6 +56,18 @@ def normalize_text(text):
     return text
 
 
+_SENTENCE_DELIMITERS = {
+    'zh': re.compile(r'[。！？]'),
+    'en': re.compile(r'[.!?]')
+}
+
+
+def sentence_offsets(text, language):
+    """句子起始偏移：第 i 句为 text[offsets[i]:offsets[i + 1] - 1]（不含句末标点）"""
+    pattern = _SENTENCE_DELIMITERS['zh' if language == 'zh' else 'en']
+    return [0] + [m.end() for m in pattern.finditer(text or '')]
+
+
 def contains_keywords(text, keywords):
     """检查文本是否包含关键词"""
     if not text or not keywords:
@@ -50,4 +89,42 @@ def load_documents(filepath):
 def save_json(data, filepath):
     """保存JSON数据"""
     with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+class JsonObjectWriter:
+    """逐项写出一个 JSON 对象，结果与 json.dump(obj, f, ensure_ascii=False, indent=2) 相同，
+    不必先在内存中拼出整个对象
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.count = 0
+
+    def write(self, key, value):
+        item = json.dumps(value, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+        self.f.write(('{\n  ' if self.count == 0 else ',\n  ') + json.dumps(str(key), ensure_ascii=False) + ': ' + item)
+        self.count += 1
+
+    def close(self):
+        self.f.write('\n}' if self.count else '{}')
+
+
+def load_cached_table(cache_path, key):
+    """读取磁盘缓存的查找表 {键: 值}；缓存不存在或其 key 与给定的不一致时返回 None"""
+    if cache_path is None or not Path(cache_path).exists():
+        return None
+
+    with open(cache_path, 'r', encoding='utf-8') as f:
+        cached = json.load(f)
+    if cached.get('key') != key:
+        return None
+    return dict(zip(cached['keys'], cached['values']))
+
+
+def save_cached_table(table, cache_path, key):
+    """把查找表连同 key 写入磁盘缓存（键、值分两个列表存放，读取比嵌套对象快）"""
+    cache_path = Path(cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump({'key': key, 'keys': list(table), 'values': list(table.values())}, f, ensure_ascii=False)
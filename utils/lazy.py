@@ -0,0 +1,84 @@
+import threading
+import time
+
+
+class LazyComponent:
+    """按需初始化的组件：首次 get() 时调用 loader，只加载一次（线程安全）
+
+    加载失败时记录错误，之后的 get() 直接抛出 RuntimeError，不会在每个请求中重试。
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.state = 'pending'  # pending / loading / loaded / failed
+        self.value = None
+        self.error = None
+        self.seconds = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.state != 'loaded':
+            with self._lock:
+                if self.state == 'pending':
+                    self._load()
+        if self.state == 'failed':
+            raise RuntimeError(f"{self.name} 初始化失败: {self.error}")
+        return self.value
+
+    def _load(self):
+        self.state = 'loading'
+        start = time.perf_counter()
+        try:
+            self.value = self.loader()
+            self.state = 'loaded'
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = 'failed'
+            print(f"Failed to initialize {self.name}: {self.error}")
+        self.seconds = time.perf_counter() - start
+
+    @property
+    def loaded(self):
+        return self.state == 'loaded'
+
+    def status(self):
+        status = {'state': self.state}
+        if self.seconds is not None:
+            status['seconds'] = self.seconds
+        if self.error is not None:
+            status['error'] = self.error
+        return status
+
+
+class Components:
+    """按名称注册的惰性组件集合，可在后台线程中依次预热"""
+
+    def __init__(self):
+        self._components = {}
+
+    def register(self, name, loader):
+        self._components[name] = LazyComponent(name, loader)
+
+    def __getitem__(self, name):
+        return self._components[name]
+
+    def get(self, name):
+        return self._components[name].get()
+
+    def status(self):
+        """{name: {'state', 'seconds', 'error'}}"""
+        return {name: component.status() for name, component in self._components.items()}
+
+    def warm_up(self, names):
+        """在后台守护线程中按顺序初始化 names 中的组件，失败只记录不抛出"""
+        def run():
+            for name in names:
+                try:
+                    self._components[name].get()
+                except RuntimeError:
+                    pass
+
+        thread = threading.Thread(target=run, name='warm-up', daemon=True)
+        thread.start()
+        return thread
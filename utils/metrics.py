@@ -0,0 +1,149 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+# 延迟直方图的桶上界（秒）
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """固定桶的延迟直方图，分位数由桶内线性插值估计"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """估计第 q 分位数，无样本时返回 0"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower  # 落在 +Inf 桶中时只能给出下界
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+class Metrics:
+    """搜索各阶段的耗时直方图与计数器，线程安全
+
+    timer(stage) 记录一次阶段耗时；在 trace() 范围内同一线程的各阶段耗时还会
+    汇总到一个字典中，用于单次请求的耗时明细。
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def observe(self, stage, seconds):
+        """记录一次阶段耗时（秒）"""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace[stage] = trace.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    @contextmanager
+    def trace(self):
+        """收集当前线程在此范围内各阶段的耗时 {stage: seconds}"""
+        previous = getattr(self._local, 'trace', None)
+        self._local.trace = timings = {}
+        try:
+            yield timings
+        finally:
+            self._local.trace = previous
+
+    def inc(self, name, value=1):
+        """计数器加 value"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set(self, name, value):
+        """设置仪表值"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def reset(self):
+        """清空全部直方图、计数器与仪表（如基准测试预热之后）"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def snapshot(self):
+        """各阶段的次数、总耗时与分位数（秒）"""
+        with self._lock:
+            return {
+                stage: dict(count=h.count, sum=h.sum,
+                            **{f'p{int(q * 100)}': h.quantile(q) for q in QUANTILES})
+                for stage, h in self._histograms.items()
+            }
+
+    def render(self, prefix='search'):
+        """Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            name = f'{prefix}_stage_duration_seconds'
+            lines.append(f'# HELP {name} Latency of each search pipeline stage.')
+            lines.append(f'# TYPE {name} histogram')
+            for stage, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float('inf'),), h.counts):
+                    cumulative += n
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {h.sum!r}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+
+            name = f'{prefix}_stage_latency_seconds'
+            lines.append(f'# HELP {name} Estimated latency quantiles of each search pipeline stage.')
+            lines.append(f'# TYPE {name} summary')
+            for stage, h in sorted(self._histograms.items()):
+                for q in QUANTILES:
+                    lines.append(f'{name}{{stage="{stage}",quantile="{q}"}} {h.quantile(q)!r}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {h.sum!r}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+
+            for counter, value in sorted(self._counters.items()):
+                lines.append(f'# TYPE {prefix}_{counter} counter')
+                lines.append(f'{prefix}_{counter} {value}')
+            for gauge, value in sorted(self._gauges.items()):
+                lines.append(f'# TYPE {prefix}_{gauge} gauge')
+                lines.append(f'{prefix}_{gauge} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()  # 进程内默认实例
@@ -0,0 +1,44 @@
+_END = ''  # 前缀树中词条结束处的键（字符键长度均为 1，不会冲突），值为词条
+
+
+class PhraseTrie:
+    """词条的字符前缀树，按整词匹配分词结果中的（多词）短语
+
+    词条统一转小写；英文多词词条的词间以一个空格分隔，与按 separator 拼接词后的形式一致。
+    匹配时从某个词开始逐字符沿树前进，只在词的边界处记录命中，
+    因此 "machine learning" 这样的短语与单词一样只需一次遍历。
+    """
+
+    def __init__(self, separator):
+        self.separator = separator
+        self.root = {}
+
+    def add(self, phrase):
+        node = self.root
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[_END] = phrase
+
+    def matches(self, tokens, start, stop=lambda token: False):
+        """从 tokens[start] 开始的全部词条，依次产生 (词条, 结束位置)，结束位置递增
+
+        stop(token) 为真的词（如布尔运算符）不参与匹配。
+        """
+        node = self.root
+        for i in range(start, len(tokens)):
+            if stop(tokens[i]):
+                return
+            chars = tokens[i].lower() if i == start else self.separator + tokens[i].lower()
+            for char in chars:
+                node = node.get(char)
+                if node is None:
+                    return
+            if _END in node:
+                yield node[_END], i + 1
+
+    def longest_match(self, tokens, start, stop=lambda token: False):
+        """从 tokens[start] 开始最长的词条 (词条, 结束位置)，没有时返回 (None, start)"""
+        match, end = None, start
+        for match, end in self.matches(tokens, start, stop):
+            pass
+        return match, end
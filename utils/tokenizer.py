@@ -11,7 +11,7 @@ class Tokenizer:
             'en': load_stopwords(INDEX_CONFIG['stopwords']['en']),
             'zh': load_stopwords(INDEX_CONFIG['stopwords']['zh'])
         }
-        jieba.initialize()
+        # jieba 词典在首次分词时才加载（约 1 秒），Web 应用启动后在后台预热
 
     def tokenize(self, text, language='en'):
         """多语言分词"""